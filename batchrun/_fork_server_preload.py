@@ -0,0 +1,12 @@
+"""
+Module imported by the fork server on its start up.
+
+See `batchrun.fork_server`.
+"""
+import django
+
+django.setup()
+
+from .fork_server import warm_up  # noqa: E402 (must be after setup)
+
+warm_up()
@@ -1,4 +1,6 @@
-from django.contrib import admin
+from typing import Iterable, Tuple
+
+from django.contrib import admin, messages
 from django.db.models import QuerySet
 from django.http import HttpRequest
 from django.utils.html import escape as html_escape
@@ -27,7 +29,13 @@ class CommandAdmin(admin.ModelAdmin):
 
 @admin.register(Job)
 class JobAdmin(admin.ModelAdmin):
-    list_display = ["name", "comment", "command"]
+    list_display = [
+        "name",
+        "comment",
+        "command",
+        "max_concurrent_runs",
+        "exclusive_group",
+    ]
 
 
 @admin.register(JobHistoryRetentionPolicy)
@@ -74,14 +82,22 @@ class JobRunLogEntryAdmin(ReadOnlyAdmin):
 @admin.register(JobRunLog)
 class JobRunLogAdmin(WithDownloadableContent, ReadOnlyAdmin):
     date_hierarchy = "start"
-    list_display = ["run", "start_p", "end_p", "entry_count", "error_count"]
-    list_filter = ["run__job", "run__exit_code"]
+    list_display = [
+        "run",
+        "start_p",
+        "end_p",
+        "entry_count",
+        "error_count",
+        "format_version",
+    ]
+    list_filter = ["run__job", "run__exit_code", "format_version"]
     readonly_fields = [
         "run",
         "start_p",
         "end_p",
         "entry_count",
         "error_count",
+        "format_version",
         "download_content",
         "content_preview",
     ]
@@ -95,24 +111,41 @@ class JobRunLogAdmin(WithDownloadableContent, ReadOnlyAdmin):
         qs = super().get_queryset(request)
         return qs.defer("content", "entry_data")
 
-    def content_preview(self, obj: JobRunLog, max_length: int = 20000) -> str:
-        to_elide = len(obj.content) - max_length
+    def get_search_results(
+        self, request: HttpRequest, queryset: "QuerySet[JobRunLog]", search_term: str
+    ) -> Tuple["QuerySet[JobRunLog]", bool]:
+        if search_term:
+            # The content of the version 2 logs is compressed, so it
+            # cannot be searched in the database
+            messages.warning(
+                request,
+                "The content search finds only the logs compacted to the "
+                "content field (format version 1). The logs stored as "
+                "compressed blocks (format version 2) are not searched.",
+            )
+        return super().get_search_results(request, queryset, search_term)
+
+    def content_preview(self, obj: JobRunLog, max_lines: int = 400) -> str:
+        line_count = obj.get_line_count()
+        to_elide = line_count - max_lines
         if to_elide <= 0:
-            return obj.content
-        half_len = max_length // 2
-        lines1 = obj.content[:half_len].splitlines()
-        lines2 = obj.content[-half_len:].splitlines()
+            return mark_safe(
+                "".join(f"{html_escape(x)}<br>" for x in obj.get_lines(0, line_count))
+            )
+        half_len = max_lines // 2
+        lines1 = obj.get_lines(0, half_len)
+        lines2 = obj.get_lines(line_count - half_len, line_count)
         all_lines = (
             [f"{html_escape(x)}<br>" for x in lines1]
             + ["<br><i>... ELIDED ...</i><br><br>"]
             + [f"{html_escape(x)}<br>" for x in lines2]
-            + [f"<br><b>{to_elide} CHARACTERS ELIDED. DOWNLOAD TO GET ALL</b>"]
+            + [f"<br><b>{to_elide} LINES ELIDED. DOWNLOAD TO GET ALL</b>"]
         )
 
         return mark_safe("".join(all_lines))
 
-    def get_downloadable_content(self, obj: JobRunLog) -> str:
-        return obj.content
+    def get_downloadable_content(self, obj: JobRunLog) -> Iterable[str]:
+        return obj.iterate_content()
 
     def get_downloadable_content_filename(self, obj: JobRunLog) -> str:
         return f"{obj.run.started_at:%Y-%m-%d_%H%M_%s}_run{obj.run.id}_log.txt"
@@ -121,7 +154,13 @@ class JobRunLogAdmin(WithDownloadableContent, ReadOnlyAdmin):
 @admin.register(JobRunQueueItem)
 class JobRunQueueItemAdmin(ReadOnlyAdmin):
     date_hierarchy = "run_at"
-    list_display = ["run_at", "scheduled_job", "assigned_at", "assignee_pid"]
+    list_display = [
+        "run_at",
+        "scheduled_job",
+        "assigned_at",
+        "assignee_pid",
+        "blocked_at",
+    ]
 
 
 @admin.register(ScheduledJob)
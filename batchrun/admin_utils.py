@@ -1,11 +1,17 @@
 from datetime import datetime
 from functools import update_wrapper
-from typing import Any, List, Optional, Type
+from typing import Any, Iterable, List, Optional, Type, Union
 
 from django.contrib import admin
 from django.core.exceptions import ObjectDoesNotExist
 from django.db.models import Model
-from django.http import Http404, HttpRequest, HttpResponse
+from django.http import (
+    Http404,
+    HttpRequest,
+    HttpResponse,
+    HttpResponseBase,
+    StreamingHttpResponse,
+)
 from django.urls import path, reverse
 from django.urls.resolvers import URLPattern
 from django.utils import timezone
@@ -85,18 +91,30 @@ class WithDownloadableContent(admin.ModelAdmin):
 
     def download_content_view(
         self, request: HttpRequest, object_id: int
-    ) -> HttpResponse:
+    ) -> HttpResponseBase:
         try:
             obj = self.model.objects.get(pk=object_id)
         except (ObjectDoesNotExist, ValueError):
             raise Http404
         filename = self.get_downloadable_content_filename(obj)
-        response = HttpResponse(content_type="application/text-plain")
+        content = self.get_downloadable_content(obj)
+        response: HttpResponseBase
+        if isinstance(content, str):
+            response = HttpResponse(content, content_type="application/text-plain")
+        else:
+            response = StreamingHttpResponse(
+                content, content_type="application/text-plain"
+            )
         response["Content-Disposition"] = f'attachment; filename="{filename}"'
-        response.write(self.get_downloadable_content(obj))
         return response
 
-    def get_downloadable_content(self, obj: Any) -> str:
+    def get_downloadable_content(self, obj: Any) -> Union[str, Iterable[str]]:
+        """
+        Get the content to download.
+
+        The content may be returned as an iterable of strings to stream
+        it in parts.
+        """
         return repr(obj)
 
     def get_downloadable_content_filename(self, obj: Any) -> str:
@@ -1,5 +1,10 @@
-from .compact_log import CompactLog
+from .block_log import BlockCompactLog, CompactLogBlock, get_lines_from_blocks
+from .compact_log import CompactLog, LogEntryDatum
 
 __all__ = [
+    "BlockCompactLog",
     "CompactLog",
+    "CompactLogBlock",
+    "LogEntryDatum",
+    "get_lines_from_blocks",
 ]
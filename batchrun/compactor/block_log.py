@@ -0,0 +1,248 @@
+import struct
+import sys
+import zlib
+from array import array
+from dataclasses import dataclass
+from datetime import datetime, timedelta, timezone
+from typing import Iterable, List, Optional, Sequence, Tuple
+
+from ..constants import LINE_END_CHARACTERS
+from ..enums import LogEntryKind
+from .compact_log import LogEntry, LogEntryDatum
+
+#: Amount of text collected to a block before it is compressed.  The
+#: block is cut at the next line end after this, or at the latest when
+#: the block has grown to `BLOCK_SIZE * MAX_BLOCK_SIZE_FACTOR`.
+BLOCK_SIZE = 64 * 1024
+
+MAX_BLOCK_SIZE_FACTOR = 4
+
+EPOCH = datetime(1970, 1, 1, tzinfo=timezone.utc)
+
+MICROSECOND = timedelta(microseconds=1)
+
+# Block header: start time in microseconds since epoch and entry count
+_HEADER = struct.Struct("<qI")
+
+# Type codes of the metadata arrays: time delta, kind and length
+_METADATA_TYPECODES = ["q", "B", "I"]
+
+
+def _to_little_endian(values: array) -> bytes:
+    if sys.byteorder == "big":
+        values = array(values.typecode, values)
+        values.byteswap()
+    return values.tobytes()
+
+
+def _from_little_endian(typecode: str, data: bytes) -> array:
+    values = array(typecode, data)
+    if sys.byteorder == "big":
+        values.byteswap()
+    return values
+
+
+@dataclass(frozen=True)
+class CompactLogBlock:
+    """
+    Compressed block of consecutive log entries.
+
+    The block data is zlib compressed and contains a header, the packed
+    metadata arrays of the entries (time delta from the block start in
+    microseconds, kind, length of the text) and the text of the entries
+    encoded in UTF-8.
+
+    A line that does not fit to a single block is split to several
+    blocks, so the text of a block may start and end in the middle of a
+    line.  The `first_line` is the (0-based) number of the line in which
+    the text of the block starts and the `line_count` is the number of
+    the lines that the text touches, so the line numbers stay exact even
+    though a split line is counted in each of its blocks.  Use
+    `get_lines_from_blocks` to get whole lines.
+    """
+
+    first_entry: int
+    entry_count: int
+    first_line: int
+    line_count: int
+    data: bytes
+
+    @classmethod
+    def pack(
+        cls, first_entry: int, first_line: int, entries: Sequence[LogEntry]
+    ) -> "CompactLogBlock":
+        start = entries[0].time if entries else EPOCH
+        start_us = (start - EPOCH) // MICROSECOND
+        time_deltas = array("q", [(x.time - start) // MICROSECOND for x in entries])
+        kinds = array("B", [x.kind.value for x in entries])
+        lengths = array("I", [len(x.text) for x in entries])
+        text = "".join(x.text for x in entries)
+
+        data = b"".join(
+            [
+                _HEADER.pack(start_us, len(entries)),
+                _to_little_endian(time_deltas),
+                _to_little_endian(kinds),
+                _to_little_endian(lengths),
+                text.encode("utf-8"),
+            ]
+        )
+
+        return cls(
+            first_entry=first_entry,
+            entry_count=len(entries),
+            first_line=first_line,
+            line_count=len(text.splitlines()),
+            data=zlib.compress(data),
+        )
+
+    def unpack(self) -> List[LogEntryDatum]:
+        (start_us, metadata, text) = self._decompress()
+        start = EPOCH + start_us * MICROSECOND
+
+        entries = []
+        position = 0
+        for (delta, kind_value, length) in zip(*metadata):
+            entries.append(
+                LogEntryDatum(
+                    time=start + delta * MICROSECOND,
+                    kind=LogEntryKind(kind_value),
+                    text=text[position : (position + length)],
+                )
+            )
+            position += length
+        return entries
+
+    def get_text(self) -> str:
+        return self._decompress()[2]
+
+    def _decompress(self) -> Tuple[int, List[array], str]:
+        data = zlib.decompress(self.data)
+        (start_us, count) = _HEADER.unpack_from(data)
+        position = _HEADER.size
+
+        metadata = []
+        for typecode in _METADATA_TYPECODES:
+            size = array(typecode).itemsize * count
+            metadata.append(
+                _from_little_endian(typecode, data[position : (position + size)])
+            )
+            position += size
+
+        return (start_us, metadata, data[position:].decode("utf-8"))
+
+
+def get_lines_from_blocks(
+    blocks: Iterable[CompactLogBlock], start: int, stop: int
+) -> List[str]:
+    """
+    Get the lines from start to stop (0-based, exclusive) of the blocks.
+
+    The blocks must be consecutive blocks of a log and include all of
+    the blocks that touch the lines, so that the lines split to several
+    blocks can be joined back together.
+    """
+    first_line: Optional[int] = None
+    texts = []
+    for block in blocks:
+        if first_line is None and block.line_count:
+            first_line = block.first_line
+        texts.append(block.get_text())
+
+    if first_line is None:
+        return []
+
+    lines = "".join(texts).splitlines(keepends=True)
+    return lines[max(start - first_line, 0) : max(stop - first_line, 0)]
+
+
+def _continues_line(previous_text_end: str, text: str) -> bool:
+    """
+    Check if the text continues the last line of the preceding text.
+
+    The preceding text is given by its last character.
+    """
+    if not previous_text_end or not text:
+        return False
+    if previous_text_end == "\r":  # "\r\n" is a single line end
+        return text.startswith("\n")
+    return previous_text_end not in LINE_END_CHARACTERS
+
+
+@dataclass(frozen=True)
+class BlockCompactLog:
+    """
+    Compact log stored as compressed blocks of log entries.
+
+    The blocks can be read independently, so a range of lines or entries
+    can be read by decompressing only the blocks that contain them.
+    """
+
+    blocks: List[CompactLogBlock]
+    first_timestamp: Optional[datetime]
+    last_timestamp: Optional[datetime]
+    entry_count: int
+    error_count: int
+    line_count: int
+
+    @classmethod
+    def from_log_entries(
+        cls, entries: Iterable[LogEntry], block_size: int = BLOCK_SIZE
+    ) -> "BlockCompactLog":
+        blocks: List[CompactLogBlock] = []
+        first_timestamp: Optional[datetime] = None
+        last_timestamp: Optional[datetime] = None
+        (entry_count, error_count, line_count) = (0, 0, 0)
+
+        pending: List[LogEntry] = []
+        pending_size = 0
+        text_end = ""
+
+        def add_block() -> None:
+            nonlocal line_count, pending, pending_size, text_end
+            text = "".join(x.text for x in pending)
+            # A line split to several blocks gets the same line number
+            # in each of them
+            first_line = (
+                line_count - 1 if _continues_line(text_end, text) else line_count
+            )
+            block = CompactLogBlock.pack(
+                entry_count - len(pending), first_line, pending
+            )
+            blocks.append(block)
+            line_count = first_line + block.line_count
+            text_end = text[-1:] or text_end
+            pending = []
+            pending_size = 0
+
+        for entry in entries:
+            if first_timestamp is None:
+                first_timestamp = entry.time
+            last_timestamp = entry.time
+            entry_count += 1
+            if entry.kind == LogEntryKind.STDERR:
+                error_count += 1
+
+            pending.append(entry)
+            pending_size += len(entry.text)
+            if pending_size >= block_size and (
+                entry.text.endswith(LINE_END_CHARACTERS)
+                or pending_size >= block_size * MAX_BLOCK_SIZE_FACTOR
+            ):
+                add_block()
+
+        if pending:
+            add_block()
+
+        return cls(
+            blocks=blocks,
+            first_timestamp=first_timestamp,
+            last_timestamp=last_timestamp,
+            entry_count=entry_count,
+            error_count=error_count,
+            line_count=line_count,
+        )
+
+    def iterate_entries(self) -> Iterable[LogEntryDatum]:
+        for block in self.blocks:
+            yield from block.unpack()
@@ -20,3 +20,27 @@ LINE_END_CHARACTERS = (  # Note: Must be tuple for str.endswith
     "\u2028",  # Line Separator
     "\u2029",  # Paragraph Separator
 )
+
+#: Maximum number of log entries saved to the database in one batch
+LOG_ENTRY_BATCH_SIZE = 500
+
+#: Maximum time a log entry is kept in the buffer before it is saved
+LOG_ENTRY_FLUSH_INTERVAL = timedelta(seconds=1)
+
+#: PostgreSQL notification channel for the job run queue changes
+RUN_QUEUE_NOTIFICATION_CHANNEL = "batchrun_run_queue"
+
+#: Maximum time the event driven scheduler waits without re-reading the
+#: job run queue, in case a notification was missed
+RUN_QUEUE_MAX_WAIT = timedelta(minutes=5)
+
+#: Time after which a job run that has not stopped no longer reserves a
+#: job slot.  Protects the slots from runs whose runner was killed.
+JOB_RUN_SLOT_TIMEOUT = timedelta(hours=24)
+
+#: PostgreSQL advisory lock key for serializing the job slot reservations
+JOB_SLOT_LOCK_KEY = 0x62617463  # "batc"
+
+#: PostgreSQL notification channel for the new log entries of a job run.
+#: Formatted with the id of the job run.
+LOG_ENTRY_NOTIFICATION_CHANNEL = "batchrun_log_{run_id}"
@@ -0,0 +1,162 @@
+"""
+Warm fork server for running the jobs without booting Django per job.
+
+When the `BATCHRUN_FORK_SERVER` setting is enabled, the job runs are
+started from a multiprocessing fork server process, which has set up
+Django and imported the URL configuration and the management commands
+of the jobs beforehand (see `warm_up`).  The executor of the job run is
+then forked from the fork server and the Django management commands of
+the jobs are forked from the executor (see `ForkedManageCommand`), so
+neither of them pay the start up cost of Django.
+
+The forked processes are still separate processes, so a crashing or
+leaking job does not affect the scheduler or the other jobs.
+"""
+import logging
+import multiprocessing
+import os
+import sys
+import traceback
+from functools import lru_cache
+from importlib import import_module
+from multiprocessing import forkserver
+from multiprocessing.context import BaseContext
+from typing import BinaryIO, List, NoReturn, Optional
+
+from django import db
+from django.conf import settings
+from django.core.management import ManagementUtility, get_commands, load_command_class
+
+from .enums import CommandType
+from .models import Command
+
+LOG = logging.getLogger(__name__)
+
+_PRELOAD_MODULE = "batchrun._fork_server_preload"
+
+
+def is_fork_server_enabled() -> bool:
+    return bool(getattr(settings, "BATCHRUN_FORK_SERVER", False))
+
+
+@lru_cache(maxsize=None)
+def get_fork_server_context() -> BaseContext:
+    context = multiprocessing.get_context("forkserver")
+    context.set_forkserver_preload([_PRELOAD_MODULE])
+    return context
+
+
+def start_fork_server() -> None:
+    """
+    Start the fork server if it is not running.
+
+    The server is otherwise started when the first job is launched, which
+    would make the first job pay the start up cost.
+    """
+    get_fork_server_context()
+    forkserver.ensure_running()
+
+
+def warm_up() -> None:
+    """
+    Import the modules the jobs need.
+
+    This is run in the fork server process when it is started.
+    """
+    import_module(settings.ROOT_URLCONF)
+
+    try:
+        commands = Command.objects.filter(type=CommandType.DJANGO_MANAGE)
+        command_names = set(commands.values_list("name", flat=True))
+    except db.Error:
+        LOG.exception("Cannot get the management commands to preload")
+        command_names = set()
+    finally:
+        # The connections must not be shared with the forked processes
+        db.connections.close_all()
+
+    app_names = get_commands()
+    for name in sorted(command_names):
+        app_name = app_names.get(name)
+        if not app_name:
+            continue
+        try:
+            load_command_class(app_name, name)
+        except Exception:
+            LOG.exception("Cannot preload management command %s", name)
+
+
+class ForkedManageCommand:
+    """
+    Django management command run in a process forked from this one.
+
+    Implements the parts of the `subprocess.Popen` interface that are
+    needed to collect the output of the command.  The stdout and stderr
+    of the forked process are connected to pipes and its stdin to
+    /dev/null.
+
+    :param command_line:
+      Command line of the management command starting with the Python
+      executable, i.e. ``[python, manage.py, name, *args]``
+    """
+
+    def __init__(self, command_line: List[str]) -> None:
+        self.returncode: Optional[int] = None
+
+        # The connections must not be shared with the forked process
+        db.connections.close_all()
+        sys.stdout.flush()
+        sys.stderr.flush()
+
+        (stdout_r, stdout_w) = os.pipe()
+        (stderr_r, stderr_w) = os.pipe()
+        self.pid = os.fork()
+        if self.pid == 0:  # child
+            os.close(stdout_r)
+            os.close(stderr_r)
+            _execute_manage_command(command_line[1:], stdout_w, stderr_w)
+
+        os.close(stdout_w)
+        os.close(stderr_w)
+        self.stdout: BinaryIO = os.fdopen(stdout_r, "rb", buffering=0)
+        self.stderr: BinaryIO = os.fdopen(stderr_r, "rb", buffering=0)
+
+    def wait(self) -> int:
+        if self.returncode is None:
+            (_pid, status) = os.waitpid(self.pid, 0)
+            if os.WIFSIGNALED(status):
+                self.returncode = -os.WTERMSIG(status)
+            else:
+                self.returncode = os.WEXITSTATUS(status)
+        return self.returncode
+
+
+def _execute_manage_command(
+    argv: List[str], stdout_fd: int, stderr_fd: int
+) -> NoReturn:
+    exit_code = 1
+    try:
+        devnull = os.open(os.devnull, os.O_RDONLY)
+        os.dup2(devnull, 0)
+        os.dup2(stdout_fd, 1)
+        os.dup2(stderr_fd, 2)
+        for fd in (devnull, stdout_fd, stderr_fd):
+            os.close(fd)
+
+        ManagementUtility(argv).execute()
+        exit_code = 0
+    except SystemExit as exit:
+        if exit.code is None:
+            exit_code = 0
+        elif isinstance(exit.code, int):
+            exit_code = exit.code
+        else:
+            print(exit.code, file=sys.stderr)
+    except BaseException:
+        traceback.print_exc()
+    finally:
+        try:
+            sys.stdout.flush()
+            sys.stderr.flush()
+        finally:
+            os._exit(exit_code)
@@ -1,11 +1,13 @@
 import enum
 import logging
-from typing import Dict, Iterable, Optional, Set
+import time
+from datetime import timedelta
+from typing import Callable, Dict, Iterable, Optional, Set
 
 from django.db import models
 from django.utils import timezone
 
-from .models import JobRun, JobRunQuerySet
+from .models import JobRun, JobRunLog, JobRunLogEntry, JobRunQuerySet
 
 LOG = logging.getLogger(__name__)
 
@@ -18,8 +20,17 @@ class CleanAction(enum.Enum):
 
 ActionsMap = Dict[CleanAction, Set[int]]
 
+#: Amount of job runs handled in a single chunk for each clean action
+CHUNK_SIZES = {
+    CleanAction.DELETE_RUN: 5000,
+    CleanAction.DELETE_LOGS: 5000,
+    CleanAction.COMPACT_LOGS: 100,
+}
 
-def perform_job_run_log_rotate_and_clean_up(dry_run: bool = False) -> None:
+
+def perform_job_run_log_rotate_and_clean_up(
+    dry_run: bool = False, time_limit: Optional[timedelta] = None
+) -> None:
     """
     Perform log rotating and cleaning of information of job runs.
 
@@ -27,8 +38,12 @@ def perform_job_run_log_rotate_and_clean_up(dry_run: bool = False) -> None:
     JobHistoryRetentionPolicy objects which are assigned to the
     history_retention_policy field of the Job objects related to the
     JobRun objects.
+
+    If a time limit is given, the clean-up is stopped after the chunk
+    during which the time limit is exceeded.  The rest is done on the
+    next time.
     """
-    cleaner = JobRunHistoryCleaner(dry_run=dry_run)
+    cleaner = JobRunHistoryCleaner(dry_run=dry_run, time_limit=time_limit)
     try:
         actions = cleaner.clean()
 
@@ -51,99 +66,142 @@ def perform_job_run_log_rotate_and_clean_up(dry_run: bool = False) -> None:
 
 
 class JobRunHistoryCleaner:
-    def __init__(self, dry_run: bool = False) -> None:
+    def __init__(
+        self, dry_run: bool = False, time_limit: Optional[timedelta] = None
+    ) -> None:
         self.clean_time = timezone.now()
         self.dry_run = dry_run
+        self.time_limit = time_limit
         self.runs_deleted = 0
         self.compact_logs_deleted = 0
         self.log_entries_deleted = 0
+        self._deadline: Optional[float] = None
 
     def clean(self, actions: Optional[ActionsMap] = None) -> ActionsMap:
+        if self.time_limit is not None:
+            self._deadline = time.monotonic() + self.time_limit.total_seconds()
         if actions is None:
             actions = self.collect_todo_actions()
-        self._execute_delete_runs(actions.get(CleanAction.DELETE_RUN, []))
-        self._execute_delete_logs(actions.get(CleanAction.DELETE_LOGS, []))
-        self._execute_compact_logs(actions.get(CleanAction.COMPACT_LOGS, []))
+        self._execute_delete_runs(actions.get(CleanAction.DELETE_RUN, set()))
+        self._execute_delete_logs(actions.get(CleanAction.DELETE_LOGS, set()))
+        self._execute_compact_logs(actions.get(CleanAction.COMPACT_LOGS, set()))
         return actions
 
     def collect_todo_actions(self) -> ActionsMap:
-        to_delete = self._filter_runs_by_delay_field("delete_run_delay")
+        """
+        Collect the job runs to clean with a single query.
+
+        The runs are classified by the most thorough action which is due
+        for them, i.e. the logs of a run that is deleted are not deleted
+        or compacted separately.
+        """
+        actions: ActionsMap = {action: set() for action in CleanAction}
 
-        del_logs_pre = self._filter_runs_by_delay_field("delete_logs_delay")
-        to_delete_logs = del_logs_pre.has_logs().exclude(pk__in=to_delete)
+        has_log_entries = models.Exists(
+            JobRunLogEntry.objects.filter(run=models.OuterRef("pk"))
+        )
+        has_compacted_log = models.Exists(
+            JobRunLog.objects.filter(run=models.OuterRef("pk"))
+        )
 
-        to_compact_pre = self._filter_runs_by_delay_field("compact_logs_delay")
-        to_compact = (
-            to_compact_pre.exclude(pk__in=to_delete)
-            .exclude(pk__in=to_delete_logs)
-            .has_log_entries()
+        now = self.clean_time
+        runs = (
+            JobRun.objects.annotate(
+                delete_run_at=self._get_delay_elapsed_at("delete_run_delay"),
+                delete_logs_at=self._get_delay_elapsed_at("delete_logs_delay"),
+                compact_logs_at=self._get_delay_elapsed_at("compact_logs_delay"),
+                has_log_entries=has_log_entries,
+                has_compacted_log=has_compacted_log,
+            )
+            .filter(
+                models.Q(delete_run_at__lte=now)
+                | models.Q(delete_logs_at__lte=now, has_log_entries=True)
+                | models.Q(delete_logs_at__lte=now, has_compacted_log=True)
+                | models.Q(compact_logs_at__lte=now, has_log_entries=True)
+            )
+            .values_list("pk", "delete_run_at", "delete_logs_at", "has_log_entries")
         )
 
-        action_qs_pairs = [
-            (CleanAction.DELETE_RUN, to_delete),
-            (CleanAction.DELETE_LOGS, to_delete_logs),
-            (CleanAction.COMPACT_LOGS, to_compact),
-        ]
+        for (pk, delete_run_at, delete_logs_at, has_entries) in runs.iterator():
+            if delete_run_at <= now:
+                actions[CleanAction.DELETE_RUN].add(pk)
+            elif delete_logs_at <= now:
+                actions[CleanAction.DELETE_LOGS].add(pk)
+            elif has_entries:
+                actions[CleanAction.COMPACT_LOGS].add(pk)
 
-        for (action, qs) in action_qs_pairs:
-            for run in qs:
+        for (action, run_ids) in actions.items():
+            if run_ids:
                 LOG.info(
-                    "Planning clean action %s for run %s (%s + %s -> %s) | %s",
+                    "Planning clean action %s for %s runs (ids %s-%s)",
                     f"{action.name:12}",
-                    f"{run.pk:6}",
-                    run.started_at,
-                    f"{run.delay!s:>20}",  # type: ignore
-                    run.delay_elapsed_at,  # type: ignore
-                    run,
+                    len(run_ids),
+                    min(run_ids),
+                    max(run_ids),
                 )
 
-        return {
-            action: set(qs.values_list("pk", flat=True))
-            for (action, qs) in action_qs_pairs
-        }
-
-    def _filter_runs_by_delay_field(self, field: str) -> JobRunQuerySet:
-        result = (
-            JobRun.objects.all()
-            .annotate(delay=models.F(f"job__history_retention_policy__{field}"))
-            .annotate(
-                delay_elapsed_at=models.ExpressionWrapper(
-                    models.F("started_at") + models.F("delay"),
-                    output_field=models.DateTimeField(),
-                )
-            )
-            .filter(delay_elapsed_at__lte=self.clean_time)
+        return actions
+
+    def _get_delay_elapsed_at(self, field: str) -> models.ExpressionWrapper:
+        return models.ExpressionWrapper(
+            models.F("started_at")
+            + models.F(f"job__history_retention_policy__{field}"),
+            output_field=models.DateTimeField(),
         )
-        return result  # type: ignore
 
     def _execute_delete_runs(self, run_ids: Iterable[int]) -> None:
-        for batch in self._jobrun_batches(run_ids):
-            deleting = "Deleting" if not self.dry_run else "Would delete"
-            batch_run_ids = ", ".join(str(x.id) for x in batch)
-            LOG.info(f"{deleting} information of job runs: %s", batch_run_ids)
-            if not self.dry_run:
-                delete_counts = batch.delete_with_logs()
-                (runs_deleted, logs_deleted, entries_deleted) = delete_counts
-                self.runs_deleted += runs_deleted
-                self.compact_logs_deleted += logs_deleted
-                self.log_entries_deleted += entries_deleted
-
-    def _jobrun_batches(self, ids: Iterable[int]) -> Iterable[JobRunQuerySet]:
-        ids_left = sorted(ids)
-        while ids_left:
-            batch = JobRun.objects.filter(pk__in=ids_left[:10])
-            ids_left = ids_left[10:]
-            yield batch  # type: ignore
+        def delete_runs(runs: JobRunQuerySet) -> None:
+            (runs_deleted, logs_deleted, entries_deleted) = runs.delete_with_logs()
+            self.runs_deleted += runs_deleted
+            self.compact_logs_deleted += logs_deleted
+            self.log_entries_deleted += entries_deleted
+
+        self._execute_in_chunks(CleanAction.DELETE_RUN, run_ids, delete_runs)
 
     def _execute_delete_logs(self, run_ids: Iterable[int]) -> None:
-        runs: JobRunQuerySet = JobRun.objects.filter(pk__in=run_ids)  # type: ignore
-        if not self.dry_run:
+        def delete_logs(runs: JobRunQuerySet) -> None:
             (deleted_logs, deleted_entries) = runs.delete_logs()
             self.compact_logs_deleted += deleted_logs
             self.log_entries_deleted += deleted_entries
 
+        self._execute_in_chunks(CleanAction.DELETE_LOGS, run_ids, delete_logs)
+
     def _execute_compact_logs(self, run_ids: Iterable[int]) -> None:
-        runs: JobRunQuerySet = JobRun.objects.filter(pk__in=run_ids)  # type: ignore
-        if not self.dry_run:
-            entries_deleted = runs.compact_logs()
-            self.log_entries_deleted += entries_deleted
+        def compact_logs(runs: JobRunQuerySet) -> None:
+            self.log_entries_deleted += runs.compact_logs()
+
+        self._execute_in_chunks(CleanAction.COMPACT_LOGS, run_ids, compact_logs)
+
+    def _execute_in_chunks(
+        self,
+        action: CleanAction,
+        run_ids: Iterable[int],
+        execute: Callable[[JobRunQuerySet], None],
+    ) -> None:
+        run_ids = sorted(run_ids)
+        chunk_size = CHUNK_SIZES[action]
+        performing = "Performing" if not self.dry_run else "Would perform"
+
+        for start in range(0, len(run_ids), chunk_size):
+            if self._is_time_limit_exceeded():
+                LOG.info(
+                    "Time limit exceeded. Skipping %s for %s runs",
+                    action.name,
+                    len(run_ids) - start,
+                )
+                return
+
+            chunk = run_ids[start : (start + chunk_size)]
+            if not self.dry_run:
+                execute(JobRun.objects.filter(pk__in=chunk))  # type: ignore
+            LOG.info(
+                f"{performing} %s: %s/%s runs (ids %s-%s)",
+                action.name,
+                start + len(chunk),
+                len(run_ids),
+                chunk[0],
+                chunk[-1],
+            )
+
+    def _is_time_limit_exceeded(self) -> bool:
+        return self._deadline is not None and time.monotonic() >= self._deadline
@@ -68,6 +68,25 @@ specifier string and range:
     ...  IntegerSetSpecifier('1-10', 0, 100))
     False
 
+The smallest value in the set which is larger or equal to a given
+value can be found with the ``get_next`` method:
+
+    >>> IntegerSetSpecifier('5-30/3', 0, 59).get_next(12)
+    14
+
+    >>> IntegerSetSpecifier('5-30/3', 0, 59).get_next(30) is None
+    True
+
+    >>> IntegerSetSpecifier('42-100000000/3', 0, 10**8).get_next(1000)
+    1002
+
+Sets with a small enough value range are stored as a bitmask, where
+the bit number N is set if the value N is in the set.  The bitmask is
+available from the ``bitmask`` property:
+
+    >>> bin(IntegerSetSpecifier('1-3,6', 0, 10).bitmask)
+    '0b1001110'
+
 It is also possible to simplify the specifier:
 
     >>> IntegerSetSpecifier('1-2,3-4,6-8/2,6-20/2,5-30/3', 1, 30).simplify()
@@ -79,7 +98,7 @@ It is also possible to simplify the specifier:
 
 import re
 from itertools import chain
-from typing import Any, Iterable, Iterator, List
+from typing import Any, Iterable, Iterator, List, Optional
 
 _SPEC_PART_RX = r"""
     (\d+)                # a number
@@ -98,6 +117,9 @@ _SPECIFIER_RX = re.compile(
     r"^(" + _SPEC_PART_RX + r")(,(" + _SPEC_PART_RX + r"))*$", re.VERBOSE
 )
 
+#: Sets with larger values than this are not stored as a bitmask
+_MAX_BITMASK_VALUE = 4096
+
 
 class IntegerSetSpecifier:
     def __init__(self, spec: str, min_value: int, max_value: int) -> None:
@@ -114,10 +136,48 @@ class IntegerSetSpecifier:
         self._ranges: List[range] = _combine_ranges(parsed_ranges)
         self._separated: bool = _range_limits_are_separate(self._ranges)
         self._total_range: range = range(min_value, max_value + 1)
+        self._bitmask: Optional[int] = (
+            _ranges_to_bitmask(self._ranges)
+            if max_value <= _MAX_BITMASK_VALUE
+            else None
+        )
+
+    @property
+    def bitmask(self) -> int:
+        """
+        Get the values of the set as a bitmask.
+
+        Bit number N of the bitmask is set if the value N is in the set.
+
+        :raises ValueError: if the value range is too large for a bitmask
+        """
+        if self._bitmask is None:
+            raise ValueError("Value range is too large for a bitmask")
+        return self._bitmask
+
+    def get_next(self, value: int) -> Optional[int]:
+        """
+        Get the smallest value in the set which is >= given value.
+
+        :return: the value or None if there is no such value
+        """
+        if self._bitmask is not None:
+            if value > self.max_value:
+                return None
+            value = max(value, 0)
+            bits_from_value = self._bitmask >> value
+            if not bits_from_value:
+                return None
+            return value + _get_lowest_bit_number(bits_from_value)
+
+        candidates = (_get_next_in_range(x, value) for x in self._ranges)
+        return min((x for x in candidates if x is not None), default=None)
 
     def is_total(self) -> bool:
         if self.spec == "*" or self._ranges == [self._total_range]:
             return True
+        elif self._bitmask is not None:
+            return self._bitmask == _ranges_to_bitmask([self._total_range])
         elif self._separated:
             # There must be holes between the ranges, because otherwise
             # _combine_ranges would have combined all ranges to one.
@@ -142,10 +202,19 @@ class IntegerSetSpecifier:
         return type(self)(simplified_spec, self.min_value, self.max_value)
 
     def __iter__(self) -> Iterator[int]:
-        if self._separated:
+        if self._bitmask is not None:
+            return self._iter_by_bitmask()
+        elif self._separated:
             return iter(chain(*self._ranges))
         return self._iter_by_contains()
 
+    def _iter_by_bitmask(self) -> Iterator[int]:
+        bits = self._bitmask or 0
+        while bits:
+            lowest_bit = bits & -bits
+            yield lowest_bit.bit_length() - 1
+            bits ^= lowest_bit
+
     def _iter_by_contains(self) -> Iterator[int]:
         min_start = min(x.start for x in self._ranges)
         max_stop = max(x.stop for x in self._ranges)
@@ -154,11 +223,15 @@ class IntegerSetSpecifier:
                 yield value
 
     def __len__(self) -> int:
-        if self._separated:
+        if self._bitmask is not None:
+            return bin(self._bitmask).count("1")
+        elif self._separated:
             return sum(len(x) for x in self._ranges)
         return sum(1 for _ in self)
 
     def __contains__(self, value: Any) -> bool:
+        if self._bitmask is not None and isinstance(value, int):
+            return value >= 0 and bool((self._bitmask >> value) & 1)
         return any(value in x for x in self._ranges)
 
     def __eq__(self, other: Any) -> bool:
@@ -282,6 +355,45 @@ def _combine_ranges(ranges: Iterable[range]) -> List[range]:
     return result
 
 
+def _ranges_to_bitmask(ranges: Iterable[range]) -> int:
+    """
+    Convert ranges to a bitmask.
+
+        >>> bin(_ranges_to_bitmask([range(1, 4), range(6, 12, 2)]))
+        '0b10101001110'
+    """
+    bitmask = 0
+    for rng in ranges:
+        if rng.step == 1:
+            bitmask |= ((1 << len(rng)) - 1) << rng.start
+        else:
+            for value in rng:
+                bitmask |= 1 << value
+    return bitmask
+
+
+def _get_lowest_bit_number(bits: int) -> int:
+    return (bits & -bits).bit_length() - 1
+
+
+def _get_next_in_range(rng: range, value: int) -> Optional[int]:
+    """
+    Get the smallest value in the range which is >= given value.
+
+        >>> _get_next_in_range(range(5, 31, 3), 12)
+        14
+        >>> _get_next_in_range(range(5, 31, 3), 2)
+        5
+        >>> _get_next_in_range(range(5, 31, 3), 30) is None
+        True
+    """
+    if value <= rng.start:
+        return rng.start if rng else None
+    steps = -(-(value - rng.start) // rng.step)  # Rounded up
+    result = rng.start + steps * rng.step
+    return result if result < rng.stop else None
+
+
 def _range_limits_are_separate(ranges: Iterable[range]) -> bool:
     max_stop: int = 0
     for rng in sorted(ranges, key=(lambda x: (x.start, -x.stop))):
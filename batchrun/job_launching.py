@@ -4,6 +4,8 @@ import sys
 
 import daemon
 
+from .fork_server import get_fork_server_context, is_fork_server_enabled
+from .job_running import execute_job_run
 from .management.commands import batchrun_execute_job_run
 from .models import Job, JobRun
 from .utils import get_django_manage_py
@@ -27,10 +29,23 @@ def run_job(job: Job) -> JobRun:
     :return: JobRun object of the stared job.
     """
     job_run: JobRun = JobRun.objects.create(job=job)
-    launcher = JobRunLauncher(job_run)
+    launch_job_run(job_run)
+    return job_run
+
+
+def launch_job_run(job_run: JobRun) -> None:
+    """
+    Run the job of given JobRun object as a detached process.
+
+    See `run_job` for details.
+    """
+    if is_fork_server_enabled():
+        context = get_fork_server_context()
+        launcher = context.Process(target=_execute_job_run, args=(job_run.pk,))
+    else:
+        launcher = JobRunLauncher(job_run)
     launcher.start()
     launcher.join()
-    return job_run
 
 
 class JobRunLauncher(multiprocessing.Process):
@@ -46,3 +61,14 @@ class JobRunLauncher(multiprocessing.Process):
             subprocess.run(
                 command, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
             )
+
+
+def _execute_job_run(job_run_id: int) -> None:
+    """
+    Execute the job run in daemon context.
+
+    This is run in a process forked from the fork server, which has
+    Django already set up.  See `fork_server`.
+    """
+    with daemon.DaemonContext(umask=0o022, detach_process=True):
+        execute_job_run(JobRun.objects.get(pk=job_run_id))
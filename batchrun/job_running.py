@@ -1,26 +1,42 @@
 import codecs
+import os
+import select
 import subprocess
 import threading
-from shutil import copyfileobj
-from typing import BinaryIO, cast
+from datetime import datetime, timedelta
+from typing import BinaryIO, List, Optional, Union, cast
 
 from django import db
 
 from ._times import utc_now
-from .constants import LINE_END_CHARACTERS
-from .enums import LogEntryKind
+from .constants import (
+    LINE_END_CHARACTERS,
+    LOG_ENTRY_BATCH_SIZE,
+    LOG_ENTRY_FLUSH_INTERVAL,
+)
+from .enums import CommandType, LogEntryKind
+from .fork_server import ForkedManageCommand, is_fork_server_enabled
+from .log_tailing import notify_log_entries_added
 from .models import JobRun, JobRunLogEntry
+from .run_queue_notifying import notify_run_queue_changed
 
 
 def execute_job_run(job_run: JobRun) -> None:
     command = job_run.job.get_command_line()
-    pipe = subprocess.Popen(
-        command,
-        bufsize=0,  # unbuffered
-        stdin=subprocess.DEVNULL,
-        stdout=subprocess.PIPE,
-        stderr=subprocess.PIPE,
-    )
+    pipe: Union[subprocess.Popen, ForkedManageCommand]
+    if (
+        is_fork_server_enabled()
+        and job_run.job.command.type == CommandType.DJANGO_MANAGE
+    ):
+        pipe = ForkedManageCommand(command)
+    else:
+        pipe = subprocess.Popen(
+            command,
+            bufsize=0,  # unbuffered
+            stdin=subprocess.DEVNULL,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE,
+        )
 
     job_run.pid = pipe.pid
     job_run.save(update_fields=["pid"])
@@ -35,13 +51,21 @@ def execute_job_run(job_run: JobRun) -> None:
     stderr_collector_thread.start()
 
     pipe.wait()
+    stopped_at = utc_now()
+
+    # Mark the run stopped only after all of the output is saved, so
+    # that the log tail readers know when they have got everything
+    stdout_collector_thread.join()
+    stderr_collector_thread.join()
 
-    job_run.stopped_at = utc_now()
+    job_run.stopped_at = stopped_at
     job_run.exit_code = pipe.returncode
     job_run.save(update_fields=["stopped_at", "exit_code"])
 
-    stdout_collector_thread.join()
-    stderr_collector_thread.join()
+    # Wake up the schedulers, since a job slot was freed, and the log
+    # tail readers to notice the stopping
+    notify_run_queue_changed()
+    notify_log_entries_added(job_run.pk)
 
 
 class OutputCollectorThread(threading.Thread):
@@ -53,20 +77,61 @@ class OutputCollectorThread(threading.Thread):
 
     def run(self) -> None:
         try:
-            copyfileobj(self.stream, self.log_writer, self._chunk_size)
+            try:
+                self._collect_output()
+            finally:
+                self.log_writer.flush()
         finally:
             # Close the database connection to free up resources.  See
             # the comments from JobRunnerAndFollower.run.
             db.connection.close()
 
+    def _collect_output(self) -> None:
+        fd = self.stream.fileno()
+        while True:
+            # Wait for more output only until the buffered log entries
+            # should be saved, so that quiet periods in the output don't
+            # leave the entries unsaved
+            (readable, _, _) = select.select(
+                [fd], [], [], self.log_writer.get_seconds_until_flush()
+            )
+            if not readable:
+                self.log_writer.flush()
+                continue
+
+            data = os.read(fd, self._chunk_size)
+            if not data:  # EOF
+                return
+            self.log_writer.write(data)
+
 
 class LogWriter:
-    def __init__(self, job_run: JobRun, kind: LogEntryKind) -> None:
+    """
+    Writer that stores the written output as log entries.
+
+    The entries are buffered and saved to the database in batches.  A
+    batch is saved when it has grown to the batch size or when its first
+    entry has been in the buffer for the flush interval.  The buffered
+    entries are saved also by calling the `flush` method, which must be
+    called when the writing is done.
+    """
+
+    def __init__(
+        self,
+        job_run: JobRun,
+        kind: LogEntryKind,
+        batch_size: int = LOG_ENTRY_BATCH_SIZE,
+        flush_interval: timedelta = LOG_ENTRY_FLUSH_INTERVAL,
+    ) -> None:
         self.job_run = job_run
         self.kind = kind
         self.coding = "utf-8"
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
         self._line_number = 1
         self._number_within_line = 1
+        self._entries: List[JobRunLogEntry] = []
+        self._flush_deadline: Optional[datetime] = None
         decoder_class = codecs.getincrementaldecoder(self.coding)
         self._decoder = decoder_class(errors="backslashreplace")
 
@@ -76,13 +141,15 @@ class LogWriter:
 
         # Split the text to lines and store each in a separate record
         for line in text.splitlines(keepends=True):
-            JobRunLogEntry.objects.create(
-                run=self.job_run,
-                kind=self.kind.value,
-                line_number=self._line_number,
-                number=self._number_within_line,
-                time=timestamp,
-                text=line,
+            self._entries.append(
+                JobRunLogEntry(
+                    run=self.job_run,
+                    kind=self.kind.value,
+                    line_number=self._line_number,
+                    number=self._number_within_line,
+                    time=timestamp,
+                    text=line,
+                )
             )
             if line.endswith(LINE_END_CHARACTERS):
                 self._line_number += 1
@@ -90,4 +157,29 @@ class LogWriter:
             else:
                 self._number_within_line += 1
 
+        if self._entries and self._flush_deadline is None:
+            self._flush_deadline = timestamp + self.flush_interval
+
+        if len(self._entries) >= self.batch_size or (
+            self._flush_deadline is not None and timestamp >= self._flush_deadline
+        ):
+            self.flush()
+
         return len(data)
+
+    def get_seconds_until_flush(self) -> Optional[float]:
+        """
+        Get the number of seconds until the buffered entries should be saved.
+
+        Returns None if there are no buffered entries.
+        """
+        if self._flush_deadline is None:
+            return None
+        return max((self._flush_deadline - utc_now()).total_seconds(), 0)
+
+    def flush(self) -> None:
+        if self._entries:
+            JobRunLogEntry.objects.bulk_create(self._entries)
+            notify_log_entries_added(self.job_run.pk)
+        self._entries = []
+        self._flush_deadline = None
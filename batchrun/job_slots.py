@@ -0,0 +1,57 @@
+from typing import Optional
+
+from django.conf import settings
+from django.db import connections
+
+from .constants import JOB_SLOT_LOCK_KEY
+from .models import Job, JobRun
+
+
+def get_max_concurrent_runs() -> Optional[int]:
+    """
+    Get the maximum number of job runs running at the same time.
+
+    Configured with the BATCHRUN_MAX_CONCURRENT_RUNS setting.  None or 0
+    means no limit.
+    """
+    return getattr(settings, "BATCHRUN_MAX_CONCURRENT_RUNS", None) or None
+
+
+def lock_job_slots(using: str = "default") -> None:
+    """
+    Serialize the job slot reservations between the schedulers.
+
+    Must be called inside a transaction.  The lock is held until the end
+    of the transaction, so the run reserving the slot should be created
+    in the same transaction.
+    """
+    connection = connections[using]
+    if connection.vendor != "postgresql":
+        return
+
+    with connection.cursor() as cursor:
+        cursor.execute("SELECT pg_advisory_xact_lock(%s)", [JOB_SLOT_LOCK_KEY])
+
+
+def has_free_slot(job: Job) -> bool:
+    """
+    Check if given job can be run without exceeding the concurrency limits.
+
+    The limits are the global maximum, the maximum of the job and the
+    exclusive group of the job.
+    """
+    running = JobRun.objects.running()  # type: ignore
+
+    max_concurrent_runs = get_max_concurrent_runs()
+    if max_concurrent_runs and running.count() >= max_concurrent_runs:
+        return False
+
+    if job.max_concurrent_runs is not None:
+        if running.filter(job=job).count() >= job.max_concurrent_runs:
+            return False
+
+    if job.exclusive_group:
+        if running.filter(job__exclusive_group=job.exclusive_group).exists():
+            return False
+
+    return True
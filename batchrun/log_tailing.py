@@ -0,0 +1,87 @@
+import time
+from typing import List, NamedTuple
+
+from django.db.models import Q
+
+from .constants import LOG_ENTRY_NOTIFICATION_CHANNEL
+from .enums import LogEntryKind
+from .models import JobRun, JobRunLogEntry
+from .notifications import (
+    listen,
+    notify,
+    supports_notifications,
+    unlisten,
+    wait_for_notification,
+)
+
+
+class LogTail(NamedTuple):
+    entries: List[JobRunLogEntry]
+    #: Cursor for the next call, i.e. the line number and the number
+    #: within the line of the last returned entry
+    line_number: int
+    number: int
+    #: True if the job run has stopped and all of its entries are read
+    finished: bool
+
+
+def get_log_entry_notification_channel(run_id: int) -> str:
+    return LOG_ENTRY_NOTIFICATION_CHANNEL.format(run_id=run_id)
+
+
+def notify_log_entries_added(run_id: int) -> None:
+    notify(get_log_entry_notification_channel(run_id))
+
+
+def tail_log(
+    job_run: JobRun,
+    kind: LogEntryKind,
+    since_line: int = 0,
+    since_number: int = 0,
+    timeout: float = 0.0,
+    limit: int = 1000,
+) -> LogTail:
+    """
+    Get the log entries of a job run after given cursor.
+
+    The cursor is the line number and the number within the line of the
+    last entry the caller has already got, so that also the rest of a
+    partially written line is returned.  If there are no new entries,
+    wait for them at most `timeout` seconds.  The LogWriter notifies the
+    waiters when it saves new entries.
+    """
+    new_entries = JobRunLogEntry.objects.filter(run=job_run, kind=kind).filter(
+        Q(line_number__gt=since_line)
+        | Q(line_number=since_line, number__gt=since_number)
+    )
+    stopped = JobRun.objects.filter(pk=job_run.pk, stopped_at__isnull=False)
+
+    channel = get_log_entry_notification_channel(job_run.pk)
+    deadline = time.monotonic() + timeout
+    waiting = timeout > 0 and supports_notifications()
+
+    if waiting:
+        # Listen before querying, so that no notification is missed
+        listen(channel)
+    try:
+        while True:
+            # The stopping is checked first, since the entries are all
+            # saved when the run is marked stopped
+            finished = stopped.exists()
+            entries = list(new_entries.order_by("line_number", "number")[:limit])
+            if len(entries) == limit:
+                finished = False
+
+            remaining = deadline - time.monotonic()
+            if entries or finished or not waiting or remaining <= 0:
+                break
+
+            wait_for_notification(remaining)
+    finally:
+        if waiting:
+            unlisten(channel)
+
+    if entries:
+        (since_line, since_number) = (entries[-1].line_number, entries[-1].number)
+
+    return LogTail(entries, since_line, since_number, finished)
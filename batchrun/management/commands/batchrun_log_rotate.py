@@ -1,7 +1,8 @@
 import argparse
 import logging
 import sys
-from typing import Any
+from datetime import timedelta
+from typing import Any, Optional
 
 from django.core.management.base import BaseCommand
 
@@ -14,9 +15,27 @@ class Command(BaseCommand):
     @classmethod
     def add_arguments(cls, parser: argparse.ArgumentParser) -> None:
         parser.add_argument("--dry-run", action="store_true")
+        parser.add_argument(
+            "--time-limit",
+            type=int,
+            default=None,
+            help=(
+                "Stop the clean-up after this many seconds. "
+                "The rest is cleaned up on the next run."
+            ),
+        )
 
-    def handle(self, dry_run: bool = False, *args: Any, **kwargs: Any) -> None:
+    def handle(
+        self,
+        dry_run: bool = False,
+        time_limit: Optional[int] = None,
+        *args: Any,
+        **kwargs: Any
+    ) -> None:
         logging.basicConfig(
             level=logging.INFO, format="%(message)s", stream=sys.stdout,
         )
-        perform_job_run_log_rotate_and_clean_up(dry_run=dry_run)
+        perform_job_run_log_rotate_and_clean_up(
+            dry_run=dry_run,
+            time_limit=(timedelta(seconds=time_limit) if time_limit else None),
+        )
@@ -1,12 +1,33 @@
 from typing import Any
 
-from django.core.management.base import BaseCommand
+from django.core.management.base import BaseCommand, CommandError, CommandParser
 
-from ...scheduler import run_scheduler_loop
+from ...fork_server import is_fork_server_enabled, start_fork_server
+from ...run_queue_notifying import supports_run_queue_notifications
+from ...scheduler import run_event_driven_scheduler_loop, run_scheduler_loop
 
 
 class Command(BaseCommand):
     help = "Batch Run Scheduler"
 
+    def add_arguments(self, parser: CommandParser) -> None:
+        parser.add_argument(
+            "--event-driven",
+            action="store_true",
+            help=(
+                "Wake up only when the next job is due or the job run queue "
+                "changes instead of polling the queue. Requires PostgreSQL."
+            ),
+        )
+
     def handle(self, *args: Any, **options: Any) -> None:
-        run_scheduler_loop()
+        if is_fork_server_enabled():
+            start_fork_server()
+
+        if not options["event_driven"]:
+            run_scheduler_loop()
+
+        if not supports_run_queue_notifications():
+            raise CommandError("The event driven scheduler requires PostgreSQL")
+
+        run_event_driven_scheduler_loop()
@@ -0,0 +1,25 @@
+# Generated by Django 3.2.13 on 2026-10-17 12:05
+
+from django.db import migrations, models
+
+import batchrun._times
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("batchrun", "0012_alter_jsonfields_to_new_jsonfields"),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name="jobrunlogentry",
+            name="time",
+            field=models.DateTimeField(
+                db_index=True,
+                default=batchrun._times.utc_now,
+                editable=False,
+                verbose_name="time",
+            ),
+        ),
+    ]
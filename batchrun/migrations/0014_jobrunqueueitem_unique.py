@@ -0,0 +1,33 @@
+# Generated by Django 3.2.13 on 2026-10-17 13:20
+
+from django.db import migrations
+
+
+def remove_duplicate_queue_items(apps, schema_editor):
+    JobRunQueueItem = apps.get_model("batchrun", "JobRunQueueItem")
+
+    seen = set()
+    duplicate_ids = []
+    # Keep the assigned items, since they are ordered first
+    for (pk, scheduled_job_id, run_at) in JobRunQueueItem.objects.order_by(
+        "assigned_at", "pk"
+    ).values_list("pk", "scheduled_job", "run_at"):
+        if (scheduled_job_id, run_at) in seen:
+            duplicate_ids.append(pk)
+        seen.add((scheduled_job_id, run_at))
+
+    JobRunQueueItem.objects.filter(pk__in=duplicate_ids).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("batchrun", "0013_logentry_time_default"),
+    ]
+
+    operations = [
+        migrations.RunPython(remove_duplicate_queue_items, migrations.RunPython.noop),
+        migrations.AlterUniqueTogether(
+            name="jobrunqueueitem", unique_together={("scheduled_job", "run_at")},
+        ),
+    ]
@@ -0,0 +1,44 @@
+# Generated by Django 3.2.13 on 2026-10-17 14:02
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("batchrun", "0014_jobrunqueueitem_unique"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="job",
+            name="exclusive_group",
+            field=models.CharField(
+                blank=True,
+                db_index=True,
+                help_text='Jobs with the same exclusive group are never run at the same time, e.g. "invoicing" for the jobs that create invoices and the jobs that send them.',
+                max_length=100,
+                verbose_name="exclusive group",
+            ),
+        ),
+        migrations.AddField(
+            model_name="job",
+            name="max_concurrent_runs",
+            field=models.PositiveIntegerField(
+                blank=True,
+                help_text="Maximum number of runs of this job that may be running at the same time. Leave empty for no limit.",
+                null=True,
+                verbose_name="maximum concurrent runs",
+            ),
+        ),
+        migrations.AddField(
+            model_name="jobrunqueueitem",
+            name="blocked_at",
+            field=models.DateTimeField(
+                blank=True,
+                help_text="Time when the job was due but could not be run, because there was no free job slot. Blocked items are kept in the queue until a slot is freed.",
+                null=True,
+                verbose_name="blocking time",
+            ),
+        ),
+    ]
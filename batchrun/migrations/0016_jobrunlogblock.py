@@ -0,0 +1,77 @@
+# Generated by Django 3.2.13 on 2026-10-17 14:40
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("batchrun", "0015_job_slots"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="jobrunlog",
+            name="format_version",
+            field=models.PositiveSmallIntegerField(
+                default=1,
+                help_text="1 = the log is stored to the content and entry_data fields, 2 = the log is stored as compressed blocks",
+                verbose_name="format version",
+            ),
+        ),
+        migrations.AddField(
+            model_name="jobrunlog",
+            name="line_count",
+            field=models.IntegerField(
+                blank=True, null=True, verbose_name="count of lines"
+            ),
+        ),
+        migrations.CreateModel(
+            name="JobRunLogBlock",
+            fields=[
+                (
+                    "id",
+                    models.AutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("number", models.IntegerField(verbose_name="number")),
+                (
+                    "first_entry",
+                    models.IntegerField(verbose_name="number of the first entry"),
+                ),
+                ("entry_count", models.IntegerField(verbose_name="count of entries")),
+                (
+                    "first_line",
+                    models.IntegerField(verbose_name="number of the first line"),
+                ),
+                ("line_count", models.IntegerField(verbose_name="count of lines")),
+                ("data", models.BinaryField(verbose_name="data")),
+                (
+                    "log",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="blocks",
+                        to="batchrun.jobrunlog",
+                        verbose_name="log",
+                    ),
+                ),
+            ],
+            options={
+                "verbose_name": "log block",
+                "verbose_name_plural": "log blocks",
+                "ordering": ("log", "number"),
+                "unique_together": {("log", "number")},
+            },
+        ),
+        migrations.AddIndex(
+            model_name="jobrunlogblock",
+            index=models.Index(
+                fields=["log", "first_line"], name="batchrun_jo_log_id_58341e_idx"
+            ),
+        ),
+    ]
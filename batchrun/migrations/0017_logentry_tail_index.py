@@ -0,0 +1,20 @@
+# Generated by Django 3.2.13 on 2026-10-17 15:10
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("batchrun", "0016_jobrunlogblock"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="jobrunlogentry",
+            index=models.Index(
+                fields=["run", "kind", "line_number", "number"],
+                name="batchrun_jo_run_id_6be584_idx",
+            ),
+        ),
+    ]
@@ -1,3 +1,4 @@
+import itertools
 import logging
 import shlex
 import sys
@@ -7,7 +8,7 @@ from typing import TYPE_CHECKING, Any, Dict, Iterable, List, Optional, Tuple
 
 import pytz
 from django.core.exceptions import ValidationError
-from django.db import connections, models, transaction
+from django.db import models, transaction
 from django.db.models.fields.json import JSONField  # type: ignore
 from django.utils.translation import ugettext
 from django.utils.translation import ugettext_lazy as _
@@ -15,11 +16,18 @@ from enumfields import EnumField, EnumIntegerField
 from safedelete.models import SafeDeleteModel
 
 from ._times import utc_now
-from .compactor import CompactLog
-from .constants import GRACE_PERIOD_LENGTH, LINE_END_CHARACTERS
+from .compactor import (
+    BlockCompactLog,
+    CompactLog,
+    CompactLogBlock,
+    LogEntryDatum,
+    get_lines_from_blocks,
+)
+from .constants import GRACE_PERIOD_LENGTH, JOB_RUN_SLOT_TIMEOUT, LINE_END_CHARACTERS
 from .enums import CommandType, LogEntryKind
 from .fields import IntegerSetSpecifierField, TextJSONField
 from .model_mixins import CleansOnSave, TimeStampedModel, TimeStampedSafeDeleteModel
+from .run_queue_notifying import notify_run_queue_changed
 from .scheduling import RecurrenceRule
 from .utils import get_django_manage_py
 
@@ -193,6 +201,26 @@ class Job(TimeStampedSafeDeleteModel):
             "completed runs is preserved."
         ),
     )
+    max_concurrent_runs = models.PositiveIntegerField(
+        null=True,
+        blank=True,
+        verbose_name=_("maximum concurrent runs"),
+        help_text=_(
+            "Maximum number of runs of this job that may be running at "
+            "the same time. Leave empty for no limit."
+        ),
+    )
+    exclusive_group = models.CharField(
+        max_length=100,
+        blank=True,
+        db_index=True,
+        verbose_name=_("exclusive group"),
+        help_text=_(
+            "Jobs with the same exclusive group are never run at the same "
+            'time, e.g. "invoicing" for the jobs that create invoices and '
+            "the jobs that send them."
+        ),
+    )
 
     class Meta:
         verbose_name = _("job")
@@ -306,47 +334,77 @@ class ScheduledJob(TimeStampedModel):
         super().save(*args, **kwargs)
         self.update_run_queue()
 
-    def update_run_queue(self, max_items_to_create: int = 10) -> None:
-        items: models.Manager = self.run_queue_items  # type: ignore
-        start_from = utc_now() - GRACE_PERIOD_LENGTH
+    def delete(self, *args: Any, **kwargs: Any) -> Any:
+        result = super().delete(*args, **kwargs)
+        notify_run_queue_changed()
+        return result
 
-        fresh_ids = []
+    def get_run_queue_times(self, max_items: int = 10) -> List[datetime]:
+        """
+        Get the run times that should be in the job run queue.
+        """
+        if not self.enabled:
+            return []
 
-        if self.enabled:
-            events = self.recurrence_rule.get_next_events(start_from)
-            for (number, time) in enumerate(events):
-                if number >= max_items_to_create:
-                    break
-                item = items.get_or_create(run_at=time, scheduled_job=self)[0]
-                fresh_ids.append(item.pk)
+        start_from = utc_now() - GRACE_PERIOD_LENGTH
+        events = self.recurrence_rule.get_next_events(start_from)
+        return list(itertools.islice(events, max_items))
 
-        # Delete old items
-        items.exclude(pk__in=fresh_ids).delete()
+    def update_run_queue(self, max_items_to_create: int = 10) -> None:
+        JobRunQueueItem.objects.update_items(  # type: ignore
+            {self.pk: self.get_run_queue_times(max_items_to_create)}
+        )
+        notify_run_queue_changed()
 
 
 class JobRunQuerySet(QuerySet["JobRun"]):
+    def running(self) -> "JobRunQuerySet":
+        """
+        Filter to the runs that are reserving a job slot.
+
+        Runs that have not stopped in `JOB_RUN_SLOT_TIMEOUT` are not
+        counted, since their runner has probably been killed.
+        """
+        return self.filter(
+            stopped_at=None, started_at__gte=utc_now() - JOB_RUN_SLOT_TIMEOUT
+        )
+
     def has_logs(self) -> "JobRunQuerySet":
-        has_compacted_log = models.Q(pk__in=self.has_compacted_log())
-        has_log_entries = models.Q(pk__in=self.has_log_entries())
-        return self.filter(has_compacted_log | has_log_entries)
+        return self.annotate(
+            _has_compacted_log=models.Exists(
+                JobRunLog.objects.filter(run=models.OuterRef("pk"))
+            ),
+            _has_log_entries=models.Exists(
+                JobRunLogEntry.objects.filter(run=models.OuterRef("pk"))
+            ),
+        ).filter(models.Q(_has_compacted_log=True) | models.Q(_has_log_entries=True))
 
     def has_compacted_log(self) -> "JobRunQuerySet":
         return self.exclude(log=None)
 
     def has_log_entries(self) -> "JobRunQuerySet":
         # Note: The self.exclude(log_entries=None) is very slow!
-        return self.filter(pk__in=JobRunLogEntry.objects.values("run_id"))
+        return self.annotate(
+            _has_log_entries=models.Exists(
+                JobRunLogEntry.objects.filter(run=models.OuterRef("pk"))
+            )
+        ).filter(_has_log_entries=True)
 
     def compact_logs(self) -> int:
         """
         Compact logs of all job runs in the queryset.
 
+        The logs are compacted and the entries deleted with a few
+        queries for all of the runs, so the queryset should be limited
+        to a reasonable amount of runs.
+
         Return the amount of log entries that were compacted.
         """
-        deleted_log_entries = 0
-        for run in self.iterator(chunk_size=1000):
-            deleted_log_entries += run.compact_logs()
-        return deleted_log_entries
+        with transaction.atomic():
+            JobRunLog.create_for_runs_if_not_exist(self)
+            log_entries = JobRunLogEntry.objects.filter(run__in=self.values("pk"))
+            (deleted_entries, _delete_map) = log_entries.delete()
+        return deleted_entries
 
     def delete_logs(self) -> Tuple[int, int]:
         """
@@ -354,12 +412,13 @@ class JobRunQuerySet(QuerySet["JobRun"]):
 
         Return the amounts of deleted compacted logs and log entries.
         """
-        (total_deleted_logs, total_deleted_entries) = (0, 0)
-        for run in self:
-            (deleted_logs, deleted_entries) = run.delete_logs()
-            total_deleted_logs += deleted_logs
-            total_deleted_entries += deleted_entries
-        return (total_deleted_logs, total_deleted_entries)
+        run_ids = self.values("pk")
+        log_entries = JobRunLogEntry.objects.filter(run__in=run_ids)
+        (deleted_entries, _delete_info1) = log_entries.delete()
+        logs = JobRunLog.objects.filter(run__in=run_ids)
+        (_deleted_objects, delete_info2) = logs.delete()
+        deleted_logs = delete_info2.get(JobRunLog._meta.label, 0)
+        return (deleted_logs, deleted_entries)
 
     def delete_with_logs(self) -> Tuple[int, int, int]:
         """
@@ -375,8 +434,10 @@ class JobRunQuerySet(QuerySet["JobRun"]):
         log_entries = JobRunLogEntry.objects.filter(run_id__in=self)
         (entries_deleted, _delete_info1) = log_entries.delete()
         logs = JobRunLog.objects.filter(run_id__in=self)
-        (logs_deleted, _delete_info2) = logs.delete()
-        (runs_deleted, _delete_info3) = self.delete()
+        (_deleted_objects, delete_info2) = logs.delete()
+        logs_deleted = delete_info2.get(JobRunLog._meta.label, 0)
+        (_deleted_objects, delete_info3) = self.delete()
+        runs_deleted = delete_info3.get(JobRun._meta.label, 0)
         return (runs_deleted, logs_deleted, entries_deleted)
 
 
@@ -457,13 +518,16 @@ class JobRunLogEntry(models.Model):
     kind = EnumIntegerField(LogEntryKind, verbose_name=_("kind"))
     line_number = models.IntegerField(verbose_name=_("line number"))
     number = models.IntegerField(verbose_name=_("number"))  # within line
+    # The time is set by the LogWriter when the output is read, since the
+    # entries are saved in batches
     time = models.DateTimeField(
-        auto_now_add=True, db_index=True, verbose_name=_("time")
+        default=utc_now, editable=False, db_index=True, verbose_name=_("time")
     )
     text = models.TextField(null=False, blank=True, verbose_name=_("text"))
 
     class Meta:
         ordering = ("-run", "time", "id")
+        indexes = [models.Index(fields=["run", "kind", "line_number", "number"])]
         verbose_name = _("log entry")
         verbose_name_plural = _("log entries")
 
@@ -499,6 +563,17 @@ class JobRunLog(models.Model):
     )
     entry_count = models.IntegerField(verbose_name=_("total count of entries"))
     error_count = models.IntegerField(verbose_name=_("count of error entries"))
+    line_count = models.IntegerField(
+        null=True, blank=True, verbose_name=_("count of lines")
+    )
+    format_version = models.PositiveSmallIntegerField(
+        default=1,
+        verbose_name=_("format version"),
+        help_text=(
+            "1 = the log is stored to the content and entry_data fields, "
+            "2 = the log is stored as compressed blocks"
+        ),
+    )
 
     class Meta:
         ordering = ("-start",)
@@ -507,33 +582,80 @@ class JobRunLog(models.Model):
 
     @classmethod
     def create_for_run_if_not_exists(cls, run: JobRun) -> Tuple[int, bool]:
-        (job_run_log, created) = cls.objects.get_or_create(
-            run=run,
-            defaults=dict(
-                start=run.started_at,
-                end=(run.stopped_at or run.started_at),
-                entry_count=0,
-                error_count=0,
-            ),
-        )
-        if not created:
-            # Was already there, just return the pk and False
-            return (job_run_log.pk, False)
+        runs = JobRun.objects.filter(pk=run.pk)
+        created = cls.create_for_runs_if_not_exist(runs) > 0  # type: ignore
+        return (cls.objects.values_list("pk", flat=True).get(run=run), created)
 
-        if not run.log_entries.exists():
-            # No entries.  Nothing more to do
-            return (job_run_log.pk, True)
+    @classmethod
+    def create_for_runs_if_not_exist(cls, runs: "JobRunQuerySet") -> int:
+        """
+        Create compacted logs for the runs which do not have one yet.
+
+        The log entries of all of the runs are read with a single query.
+        The entries are not deleted.
 
-        with connections[cls.objects.db].cursor() as cursor:
-            cursor.execute("SELECT batchrun_compact_log_entries(%s)", (run.pk,))
+        Return the amount of created logs.
+        """
+        runs_without_log = list(runs.filter(log=None).order_by("pk"))
+        if not runs_without_log:
+            return 0
+
+        entries = (
+            JobRunLogEntry.objects.filter(run__in=runs_without_log)
+            .order_by("run_id", "time", "id")
+            .iterator(chunk_size=5000)
+        )
+        compact_logs = {
+            run_id: BlockCompactLog.from_log_entries(run_entries)
+            for (run_id, run_entries) in itertools.groupby(
+                entries, key=(lambda x: x.run_id)
+            )
+        }
+
+        logs = []
+        for run in runs_without_log:
+            compact_log = compact_logs.get(run.pk)
+            if compact_log is None:
+                compact_log = BlockCompactLog.from_log_entries([])
+            logs.append(
+                cls(
+                    run=run,
+                    start=(compact_log.first_timestamp or run.started_at),
+                    end=(
+                        compact_log.last_timestamp or run.stopped_at or run.started_at
+                    ),
+                    entry_count=compact_log.entry_count,
+                    error_count=compact_log.error_count,
+                    line_count=compact_log.line_count,
+                    format_version=2,
+                )
+            )
+        cls.objects.bulk_create(logs)
+
+        JobRunLogBlock.objects.bulk_create(
+            [
+                JobRunLogBlock(
+                    log_id=log.pk,
+                    number=number,
+                    first_entry=block.first_entry,
+                    entry_count=block.entry_count,
+                    first_line=block.first_line,
+                    line_count=block.line_count,
+                    data=block.data,
+                )
+                for log in logs
+                for (number, block) in enumerate(compact_logs[log.run_id].blocks)
+                if log.run_id in compact_logs
+            ],
+            batch_size=100,
+        )
 
-        return (job_run_log.pk, True)
+        return len(logs)
 
     def __iter__(self) -> Iterable[JobRunLogEntry]:
-        compact_log = self.to_compact_log()
         line_number: Dict[LogEntryKind, int] = defaultdict(lambda: 1)
         number_within_line: Dict[LogEntryKind, int] = defaultdict(lambda: 1)
-        for entry_datum in compact_log.iterate_entries():
+        for entry_datum in self.iterate_entry_data():
             kind = entry_datum.kind
             yield JobRunLogEntry(
                 run=self.run,
@@ -550,6 +672,61 @@ class JobRunLog(models.Model):
             else:
                 number_within_line[kind] += 1
 
+    def iterate_entry_data(self) -> Iterable[LogEntryDatum]:
+        if self.format_version == 1:
+            return self.to_compact_log().iterate_entries()
+        return (
+            entry_datum
+            for block in self.iterate_blocks()
+            for entry_datum in block.unpack()
+        )
+
+    def iterate_content(self) -> Iterable[str]:
+        """
+        Iterate the content of the log in parts.
+        """
+        if self.format_version == 1:
+            yield self.content
+        else:
+            for block in self.iterate_blocks():
+                yield block.get_text()
+
+    def iterate_blocks(
+        self, first_line: int = 0, last_line: Optional[int] = None
+    ) -> Iterable[CompactLogBlock]:
+        """
+        Iterate the blocks of a version 2 log.
+
+        Only the blocks containing lines from the given (0-based) line
+        range are fetched from the database.
+        """
+        blocks = self.blocks.annotate(  # type: ignore
+            end_line=models.F("first_line") + models.F("line_count")
+        ).filter(end_line__gt=first_line)
+        if last_line is not None:
+            blocks = blocks.filter(first_line__lte=last_line)
+        for block in blocks.order_by("number").iterator(chunk_size=10):
+            yield block.to_compact_log_block()
+
+    def get_line_count(self) -> int:
+        if self.format_version == 1:
+            return len(self.content.splitlines())
+        return self.line_count or 0
+
+    def get_lines(self, start: int, stop: int) -> List[str]:
+        """
+        Get the lines of the log from start to stop (0-based, exclusive).
+
+        Only the blocks containing the lines are decompressed.
+        """
+        if stop <= start:
+            return []
+
+        if self.format_version == 1:
+            return self.content.splitlines(keepends=True)[start:stop]
+
+        return get_lines_from_blocks(self.iterate_blocks(start, stop - 1), start, stop)
+
     def to_compact_log(self) -> CompactLog:
         return CompactLog(
             content=self.content,
@@ -561,6 +738,45 @@ class JobRunLog(models.Model):
         )
 
 
+class JobRunLogBlock(models.Model):
+    """
+    Compressed block of log entries in a compacted log.
+
+    The block data contains the packed metadata and the text of the
+    entries, see `compactor.CompactLogBlock`.  The line and entry ranges
+    of the blocks work as an index for reading a part of the log.
+    """
+
+    log = models.ForeignKey(
+        JobRunLog,
+        on_delete=models.CASCADE,
+        related_name="blocks",
+        verbose_name=_("log"),
+    )
+    number = models.IntegerField(verbose_name=_("number"))
+    first_entry = models.IntegerField(verbose_name=_("number of the first entry"))
+    entry_count = models.IntegerField(verbose_name=_("count of entries"))
+    first_line = models.IntegerField(verbose_name=_("number of the first line"))
+    line_count = models.IntegerField(verbose_name=_("count of lines"))
+    data = models.BinaryField(verbose_name=_("data"))
+
+    class Meta:
+        ordering = ("log", "number")
+        unique_together = [("log", "number")]
+        indexes = [models.Index(fields=["log", "first_line"])]
+        verbose_name = _("log block")
+        verbose_name_plural = _("log blocks")
+
+    def to_compact_log_block(self) -> CompactLogBlock:
+        return CompactLogBlock(
+            first_entry=self.first_entry,
+            entry_count=self.entry_count,
+            first_line=self.first_line,
+            line_count=self.line_count,
+            data=bytes(self.data),
+        )
+
+
 class JobRunQueueItemQuerySet(QuerySet["JobRunQueueItem"]):
     def to_run(self) -> "models.QuerySet[JobRunQueueItem]":
         return self.filter(scheduled_job__enabled=True, assigned_at=None)
@@ -568,14 +784,84 @@ class JobRunQueueItemQuerySet(QuerySet["JobRunQueueItem"]):
     def remove_old_items(self, limit: Optional[datetime] = None) -> None:
         if limit is None:
             limit = utc_now() - GRACE_PERIOD_LENGTH
-        self.filter(run_at__lt=limit).delete()
+        self.filter(run_at__lt=limit).exclude(
+            blocked_at__isnull=False, assigned_at=None
+        ).delete()
+
+    def remove_older_blocked_items(self, item: "JobRunQueueItem") -> None:
+        """
+        Remove the blocked items of the scheduled job before given item.
+
+        Keeps at most one blocked item per scheduled job, so that a job
+        that stays blocked over several of its run times is run only once
+        when a slot is freed.  Must be called inside a transaction.  The
+        items locked by another scheduler are skipped.
+        """
+        older_item_pks = list(
+            self.filter(
+                scheduled_job=item.scheduled_job_id,
+                run_at__lt=item.run_at,
+                assigned_at=None,
+            )
+            .exclude(blocked_at=None)
+            .select_for_update(skip_locked=True)
+            .values_list("pk", flat=True)
+        )
+        self.filter(pk__in=older_item_pks).delete()
 
     def refresh(self) -> None:
         self.remove_old_items()
 
-        for scheduled_job in ScheduledJob.objects.all():
-            assert isinstance(scheduled_job, ScheduledJob)
-            scheduled_job.update_run_queue()
+        scheduled_jobs = ScheduledJob.objects.select_related("timezone")
+        self.update_items(
+            {
+                scheduled_job.pk: scheduled_job.get_run_queue_times()
+                for scheduled_job in scheduled_jobs
+            }
+        )
+        notify_run_queue_changed()
+
+    def update_items(self, run_times: Dict[int, List[datetime]]) -> None:
+        """
+        Update the queue items of the scheduled jobs to match given run times.
+
+        Missing items are created and the items of other run times are
+        deleted with a few queries regardless of the number of the items.
+        Items that already exist are kept as they are, so that their
+        assignment is preserved.
+
+        :param run_times: Run times by scheduled job id
+        """
+        wanted = {
+            (scheduled_job_id, run_at)
+            for (scheduled_job_id, times) in run_times.items()
+            for run_at in times
+        }
+        existing = {
+            (scheduled_job_id, run_at): pk
+            for (pk, scheduled_job_id, run_at) in self.filter(
+                scheduled_job__in=run_times.keys()
+            ).values_list("pk", "scheduled_job", "run_at")
+        }
+
+        # Items waiting for a free job slot are kept even though their
+        # run time is already past
+        self.filter(
+            pk__in=[pk for (key, pk) in existing.items() if key not in wanted]
+        ).exclude(
+            blocked_at__isnull=False, assigned_at=None, scheduled_job__enabled=True
+        ).delete()
+
+        # Conflicts are ignored, since another scheduler may have
+        # created the same items meanwhile
+        self.bulk_create(
+            [
+                JobRunQueueItem(scheduled_job_id=scheduled_job_id, run_at=run_at)
+                for (scheduled_job_id, run_at) in wanted
+                if (scheduled_job_id, run_at) not in existing
+            ],
+            ignore_conflicts=True,
+        )
 
 
 class JobRunQueueItem(models.Model):
@@ -593,11 +879,22 @@ class JobRunQueueItem(models.Model):
     assignee_pid = models.IntegerField(
         null=True, blank=True, verbose_name=_("assignee process id (PID)")
     )
+    blocked_at = models.DateTimeField(
+        null=True,
+        blank=True,
+        verbose_name=_("blocking time"),
+        help_text=_(
+            "Time when the job was due but could not be run, because "
+            "there was no free job slot. Blocked items are kept in the "
+            "queue until a slot is freed."
+        ),
+    )
 
     objects = JobRunQueueItemQuerySet.as_manager()
 
     class Meta:
         ordering = ["run_at"]
+        unique_together = [("scheduled_job", "run_at")]
 
     def __str__(self) -> str:
         return f"{self.run_at}: {self.scheduled_job}"
@@ -0,0 +1,60 @@
+import select
+
+from django.db import connections
+
+
+def supports_notifications(using: str = "default") -> bool:
+    return connections[using].vendor == "postgresql"
+
+
+def notify(channel: str, using: str = "default") -> None:
+    """
+    Send a PostgreSQL notification to given channel.
+
+    The notification is delivered when the current transaction commits,
+    or immediately if there is no transaction.  Does nothing if the
+    database does not support notifications.
+    """
+    if not supports_notifications(using):
+        return
+
+    with connections[using].cursor() as cursor:
+        cursor.execute("SELECT pg_notify(%s, '')", [channel])
+
+
+def listen(channel: str, using: str = "default") -> None:
+    """
+    Start listening to the notifications of given channel.
+
+    The connection must be in autocommit mode, since the notifications
+    are not delivered while a transaction is open.
+    """
+    with connections[using].cursor() as cursor:
+        cursor.execute(f"LISTEN {channel}")
+
+
+def unlisten(channel: str, using: str = "default") -> None:
+    with connections[using].cursor() as cursor:
+        cursor.execute(f"UNLISTEN {channel}")
+
+
+def wait_for_notification(timeout: float, using: str = "default") -> bool:
+    """
+    Wait until a notification is received or the timeout elapses.
+
+    The received notifications are discarded.
+
+    :return: True if a notification was received.
+    """
+    pg_connection = connections[using].connection
+
+    if not pg_connection.notifies:
+        (readable, _writable, _errored) = select.select(
+            [pg_connection], [], [], max(timeout, 0.0)
+        )
+        if readable:
+            pg_connection.poll()
+
+    received = bool(pg_connection.notifies)
+    del pg_connection.notifies[:]
+    return received
@@ -0,0 +1,29 @@
+from .constants import RUN_QUEUE_NOTIFICATION_CHANNEL
+from .notifications import listen, notify, supports_notifications, wait_for_notification
+
+
+def supports_run_queue_notifications(using: str = "default") -> bool:
+    return supports_notifications(using)
+
+
+def notify_run_queue_changed(using: str = "default") -> None:
+    """
+    Notify the listening schedulers that the job run queue has changed.
+    """
+    notify(RUN_QUEUE_NOTIFICATION_CHANNEL, using)
+
+
+def listen_run_queue_changes(using: str = "default") -> None:
+    """
+    Start listening to the job run queue change notifications.
+    """
+    listen(RUN_QUEUE_NOTIFICATION_CHANNEL, using)
+
+
+def wait_for_run_queue_change(timeout: float, using: str = "default") -> bool:
+    """
+    Wait until the job run queue changes or the timeout elapses.
+
+    :return: True if a change notification was received.
+    """
+    return wait_for_notification(timeout, using)
@@ -1,12 +1,17 @@
+import heapq
 import os
 import time
-from typing import NoReturn
+from datetime import datetime
+from typing import Iterable, List, NoReturn, Optional, Tuple
 
 from django.db import transaction
 
 from ._times import utc_now
-from .job_launching import run_job
-from .models import JobRunQueueItem
+from .constants import RUN_QUEUE_MAX_WAIT
+from .job_launching import launch_job_run
+from .job_slots import has_free_slot, lock_job_slots
+from .models import JobRun, JobRunQueueItem
+from .run_queue_notifying import listen_run_queue_changes, wait_for_run_queue_change
 
 POLL_INTERVAL = 10.0  # seconds
 
@@ -19,39 +24,133 @@ def run_scheduler_loop() -> NoReturn:
     queue_items = JobRunQueueItem.objects.to_run().order_by("run_at")  # type: ignore
 
     while True:
-        first_item = queue_items.first()
-        if not first_item:
+        now = utc_now()
+
+        # Run the due items.  Items that are waiting for a free job slot
+        # stay in the queue and are tried again on the next round.
+        for item_pk in queue_items.filter(run_at__lte=now).values_list("pk", flat=True):
+            run_queue_item(item_pk)
+
+        next_item = queue_items.filter(run_at__gt=now).first()
+        if not next_item:
             # Nothing in the queue, check again after poll interval
             time.sleep(POLL_INTERVAL)
             continue
 
-        secs_to_first = (first_item.run_at - utc_now()).total_seconds()
+        # Check the queue again after poll interval at the latest, since
+        # a new first item could be added or a job slot freed mean while
+        secs_to_next = (next_item.run_at - utc_now()).total_seconds()
+        time.sleep(min(max(secs_to_next, 0.0), POLL_INTERVAL))
 
-        if secs_to_first > POLL_INTERVAL:
-            # Let's check the queue again after poll interval, since a
-            # new first item could be added mean while
-            time.sleep(POLL_INTERVAL)
-            continue
 
-        time.sleep(max(secs_to_first, 0.0))
+def run_event_driven_scheduler_loop() -> NoReturn:
+    """
+    Run the scheduler by waking up only when the next job is due.
+
+    The runnable queue items are kept in a heap ordered by the run time.
+    The heap is re-read from the database when a job run queue change
+    notification is received (see `run_queue_notifying`), when an item
+    is due, or after `RUN_QUEUE_MAX_WAIT` at the latest.
+
+    Several schedulers may run at the same time, since an item is
+    assigned to a single scheduler before its job is run.  Items that
+    are waiting for a free job slot are tried again when the scheduler
+    wakes up next time, e.g. when a job run stops.
+    """
+    listen_run_queue_changes()
+
+    # Make sure that the job run queue is up to date
+    JobRunQueueItem.objects.refresh()  # type: ignore
+
+    queue_items = JobRunQueueItem.objects.to_run()  # type: ignore
+    upcoming = RunQueueHeap()
+    max_wait = RUN_QUEUE_MAX_WAIT.total_seconds()
+
+    while True:
+        upcoming.reset(queue_items.values_list("run_at", "pk"))
+
+        for item_pk in upcoming.pop_due(utc_now()):
+            run_queue_item(item_pk)
+
+        secs_to_next = upcoming.get_seconds_until_next(utc_now())
+        timeout = min(secs_to_next, max_wait) if secs_to_next is not None else max_wait
+        wait_for_run_queue_change(timeout)
+
+
+def run_queue_item(item_pk: int) -> None:
+    """
+    Run the job of given queue item unless someone else picked it up.
+
+    If the job cannot be run now because of the concurrency limits (see
+    `job_slots`), the item is marked blocked and left in the queue.  The
+    older blocked items of the same scheduled job are removed.
+    """
+    queue_items = JobRunQueueItem.objects.to_run()  # type: ignore
+
+    with transaction.atomic():
+        locked_item = (
+            queue_items.filter(pk=item_pk)
+            .select_for_update(skip_locked=True)
+            .select_related("scheduled_job__job")
+            .first()
+        )
+
+        if not locked_item:
+            # Someone else picked it up already
+            return
+
+        job = locked_item.scheduled_job.job
+
+        lock_job_slots()
+        if not has_free_slot(job):
+            if not locked_item.blocked_at:
+                locked_item.blocked_at = utc_now()
+                locked_item.save(update_fields=["blocked_at"])
+            queue_items.remove_older_blocked_items(locked_item)
+            return
+
+        # Assign the item for us and reserve a job slot with the run
+        locked_item.assigned_at = utc_now()
+        locked_item.assignee_pid = os.getpid()
+        locked_item.save(update_fields=["assigned_at", "assignee_pid"])
+        job_run = JobRun.objects.create(job=job)
+
+    launch_job_run(job_run)
+
+    locked_item.scheduled_job.update_run_queue()
+    queue_items.remove_old_items()
+
+
+class RunQueueHeap:
+    """
+    Heap of upcoming job run queue items ordered by their run time.
+    """
+
+    def __init__(self) -> None:
+        self._heap: List[Tuple[datetime, int]] = []
 
-        with transaction.atomic():
-            locked_item = (
-                queue_items.filter(pk=first_item.pk)
-                .select_for_update(skip_locked=True)
-                .first()
-            )
+    def __len__(self) -> int:
+        return len(self._heap)
 
-            if not locked_item:
-                # Someone else picked it up already
-                continue
+    def reset(self, items: Iterable[Tuple[datetime, int]]) -> None:
+        """
+        Replace the content of the heap.
 
-            # Assign the item for us
-            locked_item.assigned_at = utc_now()
-            locked_item.assignee_pid = os.getpid()
-            locked_item.save(update_fields=["assigned_at", "assignee_pid"])
+        :param items: Pairs of run time and queue item id
+        """
+        self._heap = list(items)
+        heapq.heapify(self._heap)
 
-        run_job(first_item.scheduled_job.job)
+    def get_seconds_until_next(self, now: datetime) -> Optional[float]:
+        if not self._heap:
+            return None
+        return max((self._heap[0][0] - now).total_seconds(), 0.0)
 
-        first_item.scheduled_job.update_run_queue()
-        queue_items.remove_old_items()
+    def pop_due(self, now: datetime) -> List[int]:
+        """
+        Remove the items that are due and return their ids in run order.
+        """
+        due = []
+        while self._heap and self._heap[0][0] <= now:
+            due.append(heapq.heappop(self._heap)[1])
+        return due
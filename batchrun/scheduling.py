@@ -1,6 +1,8 @@
+import calendar
 from dataclasses import dataclass
 from datetime import date, datetime, time, tzinfo
-from typing import Iterable, Set, Union
+from functools import lru_cache
+from typing import Iterable, Optional, Set, Union
 
 import pytz
 
@@ -71,11 +73,18 @@ def get_next_events(
     check_is_aware(start_time)
 
     tz = rule.timezone
+    local_start = start_time.astimezone(tz)
     last_timestamps: Set[AwareDateTime] = set()
 
-    for d in _iter_dates_from(rule, start_time.astimezone(tz).date()):
+    # Skip the hours of the start date which are surely before the
+    # start time.  Leave a margin of few hours, since a local time might
+    # map to an earlier timestamp on a DST change.
+    start_date = local_start.date()
+    start_hour = max(local_start.hour - 3, 0)
+
+    for d in _iter_dates_from(rule, start_date):
         timestamps: Set[AwareDateTime] = set()
-        for t in _iter_times(rule):
+        for t in _iter_times(rule, start_hour if d == start_date else 0):
             dt = datetime.combine(d, t)
             for timestamp in _get_possible_times(rule, dt, tz):
                 if timestamp >= start_time:
@@ -92,28 +101,73 @@ def get_next_events(
 
 
 def _iter_dates_from(rule: RecurrenceRule, start_date: date) -> Iterable[date]:
-    for year in rule.years:
-        if year < start_date.year:
+    d: Optional[date] = _find_next_date(rule, start_date)
+    while d is not None:
+        yield d
+        d = _find_next_date(rule, date.fromordinal(d.toordinal() + 1))
+
+
+def _find_next_date(rule: RecurrenceRule, start_date: date) -> Optional[date]:
+    """
+    Find the first date matching the rule on or after the start date.
+
+    Jumps directly to the next matching year and month and finds the
+    matching day of the month from the bitmasks of the specifiers, so
+    the non-matching dates are never iterated.
+    """
+    (year, month, day) = (start_date.year, start_date.month, start_date.day)
+
+    while True:
+        next_year = rule.years.get_next(year)
+        if next_year is None:
+            return None
+        elif next_year != year:
+            (year, month, day) = (next_year, 1, 1)
+
+        next_month = rule.months.get_next(month)
+        if next_month is None:
+            (year, month, day) = (year + 1, 1, 1)
             continue
-
-        for month in rule.months:
-            if (year, month) < (start_date.year, start_date.month):
-                continue
-
-            for day in rule.days_of_month:
-                try:
-                    d = date(year, month, day)
-                except ValueError:  # day out of range for month
-                    continue  # Skip non-existing dates
-
-                if d >= start_date and rule.matches_weekday(d):
-                    yield d
-
-
-def _iter_times(rule: RecurrenceRule) -> Iterable[time]:
-    for hour in rule.hours:
+        elif next_month != month:
+            (month, day) = (next_month, 1)
+
+        (first_weekday, days_in_month) = calendar.monthrange(year, month)
+        day_bits = (
+            rule.days_of_month.bitmask
+            & _get_weekday_day_bitmask(rule.weekdays.bitmask, first_weekday)
+            & ((1 << (days_in_month + 1)) - 1)
+        ) >> day
+        if day_bits:
+            return date(year, month, day + (day_bits & -day_bits).bit_length() - 1)
+
+        (year, month, day) = (year + 1, 1, 1) if month == 12 else (year, month + 1, 1)
+
+
+@lru_cache(maxsize=None)
+def _get_weekday_day_bitmask(weekday_bitmask: int, first_weekday: int) -> int:
+    """
+    Get bitmask of the days of a month which are on the given weekdays.
+
+    :param weekday_bitmask:
+      Bitmask of the weekdays, where Sunday = 0, Monday = 1, etc.
+    :param first_weekday:
+      Weekday of the first day of the month in Python's convention,
+      i.e. Monday = 0, Sunday = 6
+    """
+    bitmask = 0
+    for day in range(1, 32):
+        weekday = (first_weekday + day - 1 + 1) % 7  # Monday = 1, Sunday = 0
+        if (weekday_bitmask >> weekday) & 1:
+            bitmask |= 1 << day
+    return bitmask
+
+
+def _iter_times(rule: RecurrenceRule, start_hour: int = 0) -> Iterable[time]:
+    hour = rule.hours.get_next(start_hour)
+    while hour is not None:
         for minute in rule.minutes:
             yield time(hour, minute)
+        hour = rule.hours.get_next(hour + 1)
 
 
 def _get_possible_times(
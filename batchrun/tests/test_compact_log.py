@@ -0,0 +1,93 @@
+from datetime import datetime, timedelta
+
+import pytz
+
+from ..compactor import BlockCompactLog, LogEntryDatum, get_lines_from_blocks
+from ..enums import LogEntryKind
+
+START = datetime(2020, 6, 1, 12, 0, tzinfo=pytz.UTC)
+
+
+def get_entries(count):
+    return [
+        LogEntryDatum(
+            time=START + timedelta(microseconds=1234 * i),
+            kind=LogEntryKind.STDERR if i % 7 == 0 else LogEntryKind.STDOUT,
+            text=f"entry {i} ä" + ("\n" if i % 3 else ""),
+        )
+        for i in range(count)
+    ]
+
+
+def test_block_compact_log_round_trip():
+    entries = get_entries(1000)
+
+    compact_log = BlockCompactLog.from_log_entries(entries, block_size=1000)
+
+    assert len(compact_log.blocks) > 1
+    assert list(compact_log.iterate_entries()) == entries
+    assert compact_log.first_timestamp == entries[0].time
+    assert compact_log.last_timestamp == entries[-1].time
+    assert compact_log.entry_count == 1000
+    assert compact_log.error_count == 143
+
+
+def test_block_compact_log_lines():
+    entries = get_entries(1000)
+    content = "".join(entry.text for entry in entries)
+
+    compact_log = BlockCompactLog.from_log_entries(entries, block_size=1000)
+
+    assert compact_log.line_count == len(content.splitlines())
+
+    line_number = 0
+    entry_number = 0
+    for block in compact_log.blocks:
+        assert block.first_line == line_number
+        assert block.first_entry == entry_number
+        line_number += block.line_count
+        entry_number += block.entry_count
+
+    lines = get_lines_from_blocks(compact_log.blocks, 0, compact_log.line_count)
+    assert lines == content.splitlines(keepends=True)
+
+
+def test_block_compact_log_lines_split_between_blocks():
+    entries = [
+        LogEntryDatum(
+            time=START + timedelta(microseconds=1234 * i),
+            kind=LogEntryKind.STDOUT,
+            text=text,
+        )
+        for (i, text) in enumerate(
+            ["first\n"] + ["x" * 300] * 34 + ["\r", "\nthird\n", "y" * 3000, "\r"]
+        )
+    ]
+    content = "".join(entry.text for entry in entries)
+    lines = content.splitlines(keepends=True)
+
+    compact_log = BlockCompactLog.from_log_entries(entries, block_size=1000)
+
+    assert len(compact_log.blocks) > 3
+    assert compact_log.line_count == len(lines) == 4
+    for block in compact_log.blocks:
+        block_lines = get_lines_from_blocks(
+            compact_log.blocks, block.first_line, block.first_line + block.line_count
+        )
+        assert (
+            block_lines
+            == lines[block.first_line : (block.first_line + block.line_count)]
+        )
+    for start in range(len(lines)):
+        for stop in range(start, len(lines) + 1):
+            assert get_lines_from_blocks(compact_log.blocks, start, stop) == (
+                lines[start:stop]
+            )
+
+
+def test_block_compact_log_without_entries():
+    compact_log = BlockCompactLog.from_log_entries([])
+
+    assert compact_log.blocks == []
+    assert compact_log.entry_count == 0
+    assert compact_log.first_timestamp is None
@@ -0,0 +1,34 @@
+import sys
+
+import django
+
+from ..fork_server import ForkedManageCommand
+
+
+def read_output(forked_command):
+    stdout = forked_command.stdout.read()
+    stderr = forked_command.stderr.read()
+    return (forked_command.wait(), stdout, stderr)
+
+
+def test_forked_manage_command_output_is_captured():
+    forked_command = ForkedManageCommand([sys.executable, "manage.py", "version"])
+
+    (exit_code, stdout, stderr) = read_output(forked_command)
+
+    assert forked_command.pid > 0
+    assert exit_code == 0
+    assert stdout == (django.get_version() + "\n").encode()
+    assert stderr == b""
+
+
+def test_forked_manage_command_exit_code_is_returned():
+    forked_command = ForkedManageCommand(
+        [sys.executable, "manage.py", "no_such_command"]
+    )
+
+    (exit_code, stdout, stderr) = read_output(forked_command)
+
+    assert exit_code == 1
+    assert stdout == b""
+    assert b"Unknown command: 'no_such_command'" in stderr
@@ -0,0 +1,110 @@
+from datetime import timedelta
+
+import pytest
+
+from .._times import utc_now
+from ..enums import CommandType, LogEntryKind
+from ..history_cleaning import CleanAction, JobRunHistoryCleaner
+from ..models import (
+    Command,
+    Job,
+    JobHistoryRetentionPolicy,
+    JobRun,
+    JobRunLog,
+    JobRunLogEntry,
+)
+
+
+@pytest.fixture
+def job():
+    command = Command.objects.create(type=CommandType.EXECUTABLE, name="echo")
+    policy = JobHistoryRetentionPolicy.objects.create(
+        identifier="test",
+        compact_logs_delay=timedelta(days=1),
+        delete_logs_delay=timedelta(days=10),
+        delete_run_delay=timedelta(days=100),
+    )
+    return Job.objects.create(
+        name="Echo", command=command, history_retention_policy=policy
+    )
+
+
+def create_run(job, age_in_days, with_entries=True):
+    job_run = JobRun.objects.create(job=job)
+    JobRun.objects.filter(pk=job_run.pk).update(
+        started_at=utc_now() - timedelta(days=age_in_days)
+    )
+    if with_entries:
+        JobRunLogEntry.objects.bulk_create(
+            [
+                JobRunLogEntry(
+                    run=job_run,
+                    kind=LogEntryKind.STDOUT,
+                    line_number=number,
+                    number=1,
+                    text=f"line {number}\n",
+                )
+                for number in range(1, 4)
+            ]
+        )
+    return job_run
+
+
+@pytest.mark.django_db
+def test_collect_todo_actions(job):
+    new_run = create_run(job, 0)
+    compact_run = create_run(job, 2)
+    compact_run_without_entries = create_run(job, 2, with_entries=False)
+    delete_logs_run = create_run(job, 20)
+    delete_logs_run_without_logs = create_run(job, 20, with_entries=False)
+    delete_run = create_run(job, 200)
+    delete_run_without_logs = create_run(job, 200, with_entries=False)
+
+    actions = JobRunHistoryCleaner().collect_todo_actions()
+
+    assert actions == {
+        CleanAction.DELETE_RUN: {delete_run.pk, delete_run_without_logs.pk},
+        CleanAction.DELETE_LOGS: {delete_logs_run.pk},
+        CleanAction.COMPACT_LOGS: {compact_run.pk},
+    }
+    assert new_run.pk not in actions[CleanAction.COMPACT_LOGS]
+    assert compact_run_without_entries.pk not in actions[CleanAction.COMPACT_LOGS]
+    assert delete_logs_run_without_logs.pk not in actions[CleanAction.DELETE_LOGS]
+
+
+@pytest.mark.django_db
+def test_clean(job):
+    new_run = create_run(job, 0)
+    compact_runs = [create_run(job, 2) for _ in range(3)]
+    delete_logs_run = create_run(job, 20)
+    delete_run = create_run(job, 200)
+
+    cleaner = JobRunHistoryCleaner()
+    cleaner.clean()
+
+    assert not JobRun.objects.filter(pk=delete_run.pk).exists()
+    assert not delete_logs_run.log_entries.exists()
+    assert new_run.log_entries.count() == 3
+    for compact_run in compact_runs:
+        assert not compact_run.log_entries.exists()
+        assert compact_run.log.get_lines(0, 3) == [
+            "line 1\n",
+            "line 2\n",
+            "line 3\n",
+        ]
+    assert JobRunLog.objects.count() == 3
+    assert cleaner.runs_deleted == 1
+    assert cleaner.log_entries_deleted == 15
+
+
+@pytest.mark.django_db
+def test_clean_with_dry_run(job):
+    create_run(job, 2)
+    create_run(job, 200)
+
+    cleaner = JobRunHistoryCleaner(dry_run=True)
+    cleaner.clean()
+
+    assert JobRun.objects.count() == 2
+    assert JobRunLogEntry.objects.count() == 6
+    assert not JobRunLog.objects.exists()
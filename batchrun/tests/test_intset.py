@@ -277,3 +277,43 @@ def test_repr():
     instance = IntegerSetSpecifier("5-30/3", 2, 42)
 
     assert repr(instance) == "IntegerSetSpecifier('5-30/3', 2, 42)"
+
+
+@pytest.mark.parametrize(
+    "spec,minval,maxval,expected_values", SPECS_WITH_EXPECTED_VALUES
+)
+def test_get_next(spec, minval, maxval, expected_values):
+    instance = IntegerSetSpecifier(spec, minval, maxval)
+
+    for value in range(minval - 2, maxval + 3):
+        expected = min((x for x in expected_values if x >= value), default=None)
+
+        assert instance.get_next(value) == expected
+
+
+def test_get_next_of_large_ranges():
+    instance = IntegerSetSpecifier("42-100000000/3,7", 0, 10 ** 8)
+
+    assert instance.get_next(0) == 7
+    assert instance.get_next(8) == 42
+    assert instance.get_next(43) == 45
+    assert instance.get_next(99999999) == 99999999
+    assert instance.get_next(100000000) is None
+
+
+@pytest.mark.parametrize(
+    "spec,minval,maxval,expected_values", SPECS_WITH_EXPECTED_VALUES
+)
+def test_bitmask(spec, minval, maxval, expected_values):
+    instance = IntegerSetSpecifier(spec, minval, maxval)
+
+    result = instance.bitmask
+
+    assert result == sum(1 << x for x in expected_values)
+
+
+def test_bitmask_of_large_range_is_not_available():
+    instance = IntegerSetSpecifier("*", 0, 10 ** 8)
+
+    with pytest.raises(ValueError):
+        instance.bitmask
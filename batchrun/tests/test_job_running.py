@@ -0,0 +1,59 @@
+from datetime import timedelta
+
+import pytest
+
+from ..enums import CommandType, LogEntryKind
+from ..job_running import LogWriter
+from ..models import Command, Job, JobRun, JobRunLogEntry
+
+
+@pytest.fixture
+def job_run():
+    command = Command.objects.create(type=CommandType.EXECUTABLE, name="echo")
+    job = Job.objects.create(name="Echo", command=command)
+    return JobRun.objects.create(job=job)
+
+
+def get_entries(job_run):
+    return [
+        (entry.line_number, entry.number, entry.text)
+        for entry in JobRunLogEntry.objects.filter(run=job_run).order_by("time", "id")
+    ]
+
+
+@pytest.mark.django_db
+def test_log_writer_saves_entries_in_batches(job_run):
+    log_writer = LogWriter(
+        job_run, LogEntryKind.STDOUT, batch_size=3, flush_interval=timedelta(hours=1)
+    )
+    assert log_writer.get_seconds_until_flush() is None
+
+    log_writer.write(b"first line\nsecond ")
+    assert get_entries(job_run) == []
+    assert 0 < log_writer.get_seconds_until_flush() <= 3600
+
+    log_writer.write(b"line\nthird line\n")
+    assert len(get_entries(job_run)) == 4
+    assert log_writer.get_seconds_until_flush() is None
+
+    log_writer.write(b"fourth")
+    log_writer.flush()
+
+    assert get_entries(job_run) == [
+        (1, 1, "first line\n"),
+        (2, 1, "second "),
+        (2, 2, "line\n"),
+        (3, 1, "third line\n"),
+        (4, 1, "fourth"),
+    ]
+
+
+@pytest.mark.django_db
+def test_log_writer_saves_entries_after_flush_interval(job_run):
+    log_writer = LogWriter(
+        job_run, LogEntryKind.STDERR, batch_size=100, flush_interval=timedelta(0)
+    )
+
+    log_writer.write(b"error\n")
+
+    assert get_entries(job_run) == [(1, 1, "error\n")]
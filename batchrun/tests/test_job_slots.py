@@ -0,0 +1,72 @@
+from datetime import timedelta
+
+import pytest
+
+from .._times import utc_now
+from ..enums import CommandType
+from ..job_slots import has_free_slot
+from ..models import Command, Job, JobRun
+
+
+@pytest.fixture
+def command():
+    return Command.objects.create(type=CommandType.EXECUTABLE, name="echo")
+
+
+@pytest.mark.django_db
+def test_has_free_slot_with_job_maximum(command):
+    job = Job.objects.create(name="Echo", command=command, max_concurrent_runs=2)
+    assert has_free_slot(job)
+
+    JobRun.objects.create(job=job)
+    assert has_free_slot(job)
+
+    job_run = JobRun.objects.create(job=job)
+    assert not has_free_slot(job)
+
+    job_run.stopped_at = utc_now()
+    job_run.save()
+    assert has_free_slot(job)
+
+
+@pytest.mark.django_db
+def test_has_free_slot_with_exclusive_group(command):
+    create_job = Job.objects.create(
+        name="Create invoices", command=command, exclusive_group="invoicing"
+    )
+    send_job = Job.objects.create(
+        name="Send invoices", command=command, exclusive_group="invoicing"
+    )
+    other_job = Job.objects.create(name="Other", command=command)
+
+    JobRun.objects.create(job=create_job)
+
+    assert not has_free_slot(create_job)
+    assert not has_free_slot(send_job)
+    assert has_free_slot(other_job)
+
+
+@pytest.mark.django_db
+def test_has_free_slot_with_global_maximum(command, settings):
+    settings.BATCHRUN_MAX_CONCURRENT_RUNS = 1
+    job = Job.objects.create(name="Echo", command=command)
+    other_job = Job.objects.create(name="Other", command=command)
+    assert has_free_slot(job)
+
+    JobRun.objects.create(job=job)
+    assert not has_free_slot(other_job)
+
+    settings.BATCHRUN_MAX_CONCURRENT_RUNS = 0
+    assert has_free_slot(other_job)
+
+
+@pytest.mark.django_db
+def test_stale_job_run_does_not_reserve_slot(command):
+    job = Job.objects.create(name="Echo", command=command, max_concurrent_runs=1)
+    job_run = JobRun.objects.create(job=job)
+    assert not has_free_slot(job)
+
+    JobRun.objects.filter(pk=job_run.pk).update(
+        started_at=utc_now() - timedelta(days=2)
+    )
+    assert has_free_slot(job)
@@ -0,0 +1,71 @@
+import pytest
+
+from .._times import utc_now
+from ..enums import CommandType, LogEntryKind
+from ..log_tailing import tail_log
+from ..models import Command, Job, JobRun, JobRunLogEntry
+
+
+@pytest.fixture
+def job_run():
+    command = Command.objects.create(type=CommandType.EXECUTABLE, name="echo")
+    job = Job.objects.create(name="Echo", command=command)
+    return JobRun.objects.create(job=job)
+
+
+def create_entries(job_run, kind, entries):
+    JobRunLogEntry.objects.bulk_create(
+        [
+            JobRunLogEntry(
+                run=job_run,
+                kind=kind,
+                line_number=line_number,
+                number=number,
+                text=text,
+            )
+            for (line_number, number, text) in entries
+        ]
+    )
+
+
+def get_texts(log_tail):
+    return [entry.text for entry in log_tail.entries]
+
+
+@pytest.mark.django_db
+def test_tail_log(job_run):
+    create_entries(job_run, LogEntryKind.STDOUT, [(1, 1, "first\n"), (2, 1, "second ")])
+    create_entries(job_run, LogEntryKind.STDERR, [(1, 1, "error\n")])
+
+    log_tail = tail_log(job_run, LogEntryKind.STDOUT)
+    assert get_texts(log_tail) == ["first\n", "second "]
+    assert (log_tail.line_number, log_tail.number) == (2, 1)
+    assert not log_tail.finished
+
+    log_tail = tail_log(job_run, LogEntryKind.STDOUT, 2, 1)
+    assert log_tail.entries == []
+    assert (log_tail.line_number, log_tail.number) == (2, 1)
+
+    create_entries(job_run, LogEntryKind.STDOUT, [(2, 2, "line\n"), (3, 1, "third")])
+
+    log_tail = tail_log(job_run, LogEntryKind.STDOUT, 2, 1)
+    assert get_texts(log_tail) == ["line\n", "third"]
+    assert (log_tail.line_number, log_tail.number) == (3, 1)
+
+
+@pytest.mark.django_db
+def test_tail_log_finished(job_run):
+    create_entries(job_run, LogEntryKind.STDOUT, [(1, 1, "first\n"), (2, 1, "last\n")])
+    job_run.stopped_at = utc_now()
+    job_run.save()
+
+    log_tail = tail_log(job_run, LogEntryKind.STDOUT, limit=1)
+    assert get_texts(log_tail) == ["first\n"]
+    assert not log_tail.finished
+
+    log_tail = tail_log(job_run, LogEntryKind.STDOUT, 1, 1, limit=1)
+    assert get_texts(log_tail) == ["last\n"]
+
+    log_tail = tail_log(job_run, LogEntryKind.STDOUT, 2, 1, timeout=10)
+    assert log_tail.entries == []
+    assert log_tail.finished
@@ -0,0 +1,137 @@
+from datetime import datetime, timedelta
+
+import pytest
+import pytz
+
+from .._times import utc_now
+from ..enums import CommandType
+from ..models import Command, Job, JobRun, JobRunQueueItem, ScheduledJob, Timezone
+from ..scheduler import RunQueueHeap, run_queue_item
+
+NOW = datetime(2020, 6, 1, 12, 0, tzinfo=pytz.UTC)
+
+
+def test_run_queue_heap():
+    upcoming = RunQueueHeap()
+    assert upcoming.get_seconds_until_next(NOW) is None
+    assert upcoming.pop_due(NOW) == []
+
+    upcoming.reset(
+        [
+            (NOW + timedelta(minutes=2), 3),
+            (NOW - timedelta(minutes=1), 2),
+            (NOW + timedelta(seconds=30), 4),
+            (NOW - timedelta(minutes=2), 1),
+        ]
+    )
+
+    assert upcoming.get_seconds_until_next(NOW) == 0.0
+    assert upcoming.pop_due(NOW) == [1, 2]
+    assert len(upcoming) == 2
+    assert upcoming.get_seconds_until_next(NOW) == 30.0
+    assert upcoming.pop_due(NOW + timedelta(minutes=2)) == [4, 3]
+    assert len(upcoming) == 0
+
+
+@pytest.fixture
+def scheduled_job():
+    command = Command.objects.create(type=CommandType.EXECUTABLE, name="echo")
+    job = Job.objects.create(name="Echo", command=command)
+    timezone = Timezone.objects.create(name="UTC")
+    return ScheduledJob.objects.create(
+        job=job,
+        timezone=timezone,
+        years="*",
+        months="*",
+        days_of_month="*",
+        weekdays="*",
+        hours="*",
+        minutes="0",
+    )
+
+
+@pytest.mark.django_db
+def test_update_run_queue_keeps_existing_items(scheduled_job):
+    run_times = scheduled_job.get_run_queue_times()
+    assert len(run_times) == 10
+
+    items = scheduled_job.run_queue_items.order_by("run_at")
+    assert [item.run_at for item in items] == run_times
+
+    first_item = items.first()
+    first_item.assigned_at = first_item.run_at
+    first_item.save()
+
+    scheduled_job.update_run_queue()
+
+    assert items.count() == 10
+    assert items.first().pk == first_item.pk
+    assert items.first().assigned_at == first_item.run_at
+
+
+@pytest.mark.django_db
+def test_update_run_queue_removes_items_of_disabled_job(scheduled_job):
+    scheduled_job.enabled = False
+    scheduled_job.save()
+
+    assert not scheduled_job.run_queue_items.exists()
+
+
+@pytest.mark.django_db
+def test_refresh_run_queue(scheduled_job):
+    JobRunQueueItem.objects.all().delete()
+
+    JobRunQueueItem.objects.refresh()
+    JobRunQueueItem.objects.refresh()
+
+    assert [item.run_at for item in scheduled_job.run_queue_items.all()] == (
+        scheduled_job.get_run_queue_times()
+    )
+
+
+@pytest.mark.django_db
+def test_remove_old_items_keeps_blocked_items(scheduled_job):
+    old_time = NOW - timedelta(days=1)
+    old_item = JobRunQueueItem.objects.create(
+        scheduled_job=scheduled_job, run_at=old_time
+    )
+    blocked_item = JobRunQueueItem.objects.create(
+        scheduled_job=scheduled_job,
+        run_at=old_time + timedelta(hours=1),
+        blocked_at=old_time + timedelta(hours=1),
+    )
+
+    JobRunQueueItem.objects.remove_old_items()
+    scheduled_job.update_run_queue()
+
+    assert not JobRunQueueItem.objects.filter(pk=old_item.pk).exists()
+    assert JobRunQueueItem.objects.filter(pk=blocked_item.pk).exists()
+
+
+@pytest.mark.django_db
+def test_job_blocked_over_several_run_times_is_queued_once(scheduled_job):
+    job = scheduled_job.job
+    job.max_concurrent_runs = 1
+    job.save()
+    JobRun.objects.create(job=job)
+
+    first_run_at = utc_now().replace(minute=0, second=0, microsecond=0)
+    items = [
+        JobRunQueueItem.objects.create(
+            scheduled_job=scheduled_job, run_at=first_run_at - timedelta(hours=hours)
+        )
+        for hours in [3, 2, 1]
+    ]
+
+    for item in items:
+        run_queue_item(item.pk)
+
+        blocked_items = JobRunQueueItem.objects.exclude(blocked_at=None)
+        assert [blocked_item.pk for blocked_item in blocked_items] == [item.pk]
+
+    assert JobRun.objects.filter(job=job).count() == 1
+
+    JobRunQueueItem.objects.remove_old_items()
+    scheduled_job.update_run_queue()
+
+    assert JobRunQueueItem.objects.filter(pk=items[-1].pk).exists()
@@ -1,4 +1,6 @@
+import time
 from datetime import timedelta
+from itertools import islice
 
 import pytest
 from dateutil.parser import parse as parse_datetime
@@ -264,3 +266,34 @@ def test_get_next_events_iterating():
     assert next(iterator) == start + timedelta(days=0, hours=12, minutes=45)
     assert next(iterator) == start + timedelta(days=1, hours=12, minutes=45)
     assert next(iterator) == start + timedelta(days=2, hours=12, minutes=45)
+
+
+@pytest.mark.parametrize(
+    "rule,weekdays,expected_first",
+    [
+        ("* 02 29 12 0", "1", "2044-02-29 12:00:00+02:00"),
+        ("2150 12 31 23 59", "*", "2150-12-31 23:59:00+02:00"),
+        ("* 31 4 0", "5", "2020-01-31 04:00:00+02:00"),
+        ("* 13 0 0", "0", "2020-09-13 00:00:00+03:00"),
+    ],
+)
+def test_get_next_events_of_sparse_rules_is_fast(rule, weekdays, expected_first):
+    start = parse_datetime("2020-01-01 00:00 EET")
+
+    start_time = time.process_time()
+    result = list(islice(get_next_events(rr(rule, weekdays), start), 5))
+    consumed_cpu_time = time.process_time() - start_time
+
+    assert consumed_cpu_time <= 0.05  # seconds
+    assert str(result[0]) == expected_first
+
+
+def test_get_next_events_of_never_matching_rule_is_fast():
+    start = parse_datetime("1970-01-01 00:00 UTC")
+
+    start_time = time.process_time()
+    result = list(get_next_events(rr("02 30 0 0"), start))
+    consumed_cpu_time = time.process_time() - start_time
+
+    assert consumed_cpu_time <= 0.05  # seconds
+    assert result == []
@@ -1,8 +1,10 @@
 import inspect
 from collections import OrderedDict
 from collections.abc import Iterable
+from types import MappingProxyType
 
 from django.core.exceptions import ValidationError
+from django.core.validators import MaxLengthValidator
 from django.utils.translation import ugettext_lazy as _
 from lxml import etree
 
@@ -80,95 +82,185 @@ class Field:
         return True
 
 
+class CompiledField:
+    """A Field of a FieldGroup class prepared for fast validation
+
+    The checks of the field are done with plain Python when possible.
+    When a value fails them, Field.is_valid is used to get the result and
+    the validation errors."""
+
+    __slots__ = (
+        "name",
+        "field",
+        "element_name",
+        "many",
+        "is_string",
+        "is_group",
+        "max_lengths",
+        "other_validators",
+    )
+
+    def __init__(self, name, field):
+        self.name = name
+        self.field = field
+        self.element_name = field.element_name
+        self.many = field.many
+        self.is_string = field.field_type == "string"
+        self.is_group = inspect.isclass(field.field_type) and issubclass(
+            field.field_type, FieldGroup
+        )
+
+        max_lengths = []
+        other_validators = []
+        for validator in field.validators or []:
+            if type(validator) is MaxLengthValidator and not callable(
+                validator.limit_value
+            ):
+                max_lengths.append(validator.limit_value)
+            else:
+                other_validators.append(validator)
+
+        self.max_lengths = tuple(max_lengths)
+        self.other_validators = tuple(other_validators)
+
+    def is_valid(self, value):
+        if self._is_valid(value):
+            return True
+
+        return self.field.is_valid(value)
+
+    def _is_valid(self, value):
+        if not value:
+            return True
+
+        if self.many:
+            if isinstance(value, str) or not isinstance(value, Iterable):
+                return False
+            values = value
+        else:
+            values = (value,)
+
+        return all(self._is_valid_value(one_value) for one_value in values)
+
+    def _is_valid_value(self, value):
+        if self.is_string:
+            if not isinstance(value, str):
+                return False
+        elif not isinstance(value, self.field.field_type):
+            return False
+
+        for max_length in self.max_lengths:
+            if len(value) > max_length:
+                return False
+
+        for validator in self.other_validators:
+            try:
+                validator(value)
+            except ValidationError:
+                return False
+
+        return True
+
+
+class FieldGroupSchema:
+    """Field layout of a FieldGroup class
+
+    The schema is compiled once per class (see FieldGroup.get_schema) so
+    that creating, validating and serialising the instances doesn't need
+    to inspect the class."""
+
+    def __init__(self, field_group_class):
+        members = inspect.getmembers(field_group_class, lambda o: isinstance(o, Field))
+        # inspect.getmembers returns members in alphabetical order, reorder them
+        # in the declaration order. (__dict__ is in order in Python 3.6+)
+        class_members_order = recursive_members(field_group_class)
+        members.sort(key=lambda o: class_members_order.index(o[0]))
+
+        self.fields = MappingProxyType(OrderedDict(members))
+        self.compiled_fields = tuple(
+            CompiledField(name, field) for (name, field) in members
+        )
+        self.initial_values = MappingProxyType({name: None for name in self.fields})
+
+
 class FieldGroup:
     def __init__(self):
-        self._fields = self.get_fields()
+        schema = self.get_schema()
+        self.__dict__.update(schema.initial_values)
+        self._fields = schema.fields
         self.validation_errors = []
 
+    @classmethod
+    def get_schema(cls):
+        # Look only in the class itself, the subclasses have their own schemas
+        schema = cls.__dict__.get("_schema")
+        if schema is None:
+            schema = FieldGroupSchema(cls)
+            cls._schema = schema
+
+        return schema
+
     def _validate_fields(self):
         self.validation_errors = []
         error_list = {}
 
-        for field_name, field in self.get_fields().items():
-            field_value = getattr(self, field_name)
-
-            if not field.is_valid(field_value):
-                error_list[field_name] = field.validation_errors
+        for compiled_field in self.get_schema().compiled_fields:
+            field_value = getattr(self, compiled_field.name)
 
             if not field_value:
                 continue
 
-            if not field.many:
+            if not compiled_field.is_valid(field_value):
+                error_list[compiled_field.name] = compiled_field.field.validation_errors
+
+            if not compiled_field.is_group:
+                continue
+
+            if not compiled_field.many:
                 field_value = [field_value]
 
             for one_value in field_value:
-                if field.field_type == "string":
-                    continue
-                elif issubclass(field.field_type, FieldGroup):
-                    one_value.validate()
+                one_value.validate()
 
         if len(error_list) > 0:
             raise ValidationError(error_list)
 
     def get_fields(self):
-        if hasattr(self, "_fields"):
-            return self._fields
-
-        fields = OrderedDict()
-
-        members = inspect.getmembers(self, lambda o: isinstance(o, Field))
-        # inspect.getmembers returns members in alphabetical order, reorder them
-        # in the declaration order. (__dict__ is in order in Python 3.6+)
-        class_members_order = recursive_members(self.__class__)
-
-        members.sort(key=lambda o: class_members_order.index(o[0]))
-
-        for i in members:
-            fields[i[0]] = i[1]
-            setattr(self, i[0], None)
-
-        return fields
+        return self.get_schema().fields
 
     def get_fields_as_elements(self):
-        elements = []
+        return list(self.to_etree())
 
-        for field_name, field in self.get_fields().items():
-            field_value = getattr(self, field_name)
+    def to_etree(self):
+        root = etree.Element(self.Meta.element_name)
 
-            if not field.is_valid(field_value):
+        for compiled_field in self.get_schema().compiled_fields:
+            field_value = getattr(self, compiled_field.name)
+
+            if not compiled_field.is_valid(field_value):
                 raise FieldError(
                     "Value ({}) of field {} is not valid".format(
-                        field_value, field_name
+                        field_value, compiled_field.name
                     )
                 )
 
             if not field_value:
-                el = etree.Element(field.element_name)
-                elements.append(el)
+                etree.SubElement(root, compiled_field.element_name)
                 continue
 
-            if not field.many:
+            if not compiled_field.many:
                 field_value = [field_value]
 
             for one_value in field_value:
-                if field.field_type == "string":
-                    el = etree.Element(field.element_name)
+                if compiled_field.is_string:
+                    el = etree.SubElement(root, compiled_field.element_name)
                     el.text = one_value
-                    elements.append(el)
-                elif issubclass(field.field_type, FieldGroup):
-                    elements.append(one_value.to_etree())
+                elif compiled_field.is_group:
+                    root.append(one_value.to_etree())
                 else:
                     # TODO: error
                     pass
 
-        return elements
-
-    def to_etree(self):
-        elements = self.get_fields_as_elements()
-        root = etree.Element(self.Meta.element_name)
-        for el in elements:
-            root.append(el)
-
         return root
 
     def to_xml_string(self, encoding="utf-8"):
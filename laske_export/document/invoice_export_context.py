@@ -0,0 +1,106 @@
+from leasing.models import Invoice
+from leasing.models.yearly_rent_amount import get_yearly_rent_amount_totals
+
+INVOICE_EXPORT_SELECT_RELATED = (
+    "credited_invoice",
+    "recipient",
+    "lease__district",
+    "lease__identifier__district",
+    "lease__identifier__municipality",
+    "lease__identifier__type",
+    "lease__intended_use",
+    "lease__lessor",
+    "lease__municipality",
+    "lease__type",
+)
+
+INVOICE_EXPORT_PREFETCH_RELATED = (
+    "lease__lease_areas__addresses",
+    "lease__rents",
+    "rows__receivable_type",
+    "rows__tenant__tenantcontact_set__contact",
+)
+
+
+class InvoiceExportContext:
+    """Data of a batch of invoices that are exported to Laske
+
+    The invoices are loaded with the related objects that are needed to
+    create the sales orders in a fixed number of queries, and the yearly
+    rents of the leases of the invoices are calculated only once per lease
+    and year. See InvoiceSalesOrderAdapter for how these are used."""
+
+    def __init__(self):
+        self.yearly_rents = {}
+
+    def load_invoices(self, invoices):
+        """Returns the invoices reloaded with their related objects
+
+        The invoices are returned in the same order. The objects that are
+        not Invoices (e.g. LandUseAgreementInvoices) are returned as is."""
+        invoice_ids = [
+            invoice.id for invoice in invoices if isinstance(invoice, Invoice)
+        ]
+        loaded_invoices = {
+            invoice.id: invoice
+            for invoice in Invoice.objects.filter(id__in=invoice_ids)
+            .select_related(*INVOICE_EXPORT_SELECT_RELATED)
+            .prefetch_related(*INVOICE_EXPORT_PREFETCH_RELATED)
+        }
+
+        invoices = [
+            loaded_invoices.get(invoice.id, invoice)
+            if isinstance(invoice, Invoice)
+            else invoice
+            for invoice in invoices
+        ]
+
+        self.load_yearly_rents(invoices)
+
+        return invoices
+
+    def load_yearly_rents(self, invoices):
+        """Loads the precalculated yearly rents of the leases of the invoices
+
+        The yearly rents that haven't been precalculated are calculated
+        when they are needed. See get_yearly_rent_amount_totals."""
+        lease_ids = set()
+        years = set()
+        for invoice in invoices:
+            if not isinstance(invoice, Invoice) or not invoice.lease_id:
+                continue
+
+            year = get_invoice_year(invoice)
+            if year:
+                lease_ids.add(invoice.lease_id)
+                years.add(year)
+
+        if not lease_ids:
+            return
+
+        totals = get_yearly_rent_amount_totals(list(lease_ids), sorted(years))
+        for lease_id, year_totals in totals.items():
+            for year, total in year_totals.items():
+                self.yearly_rents[(lease_id, year)] = total
+
+    def get_yearly_rent(self, lease, year):
+        key = (lease.id, year)
+        if key not in self.yearly_rents:
+            self.yearly_rents[key] = calculate_yearly_rent(lease, year)
+
+        return self.yearly_rents[key]
+
+
+def get_invoice_year(invoice):
+    """Returns the year which the bill text of the invoice is about"""
+    if invoice.billing_period_start_date and invoice.billing_period_end_date:
+        return invoice.billing_period_start_date.year
+
+    if invoice.invoicing_date:
+        return invoice.invoicing_date.year
+
+    return None
+
+
+def calculate_yearly_rent(lease, year):
+    return lease.calculate_rent_amount_for_year(year).get_total_amount()
@@ -3,58 +3,112 @@ from decimal import ROUND_HALF_UP, Decimal
 from dateutil.relativedelta import relativedelta
 from django.conf import settings
 
-from leasing.enums import InvoiceType, RentCycle
+from leasing.enums import InvoiceType, RentCycle, TenantContactType
 from leasing.models.utils import get_next_business_day, is_business_day
 
+from .invoice_export_context import calculate_yearly_rent, get_invoice_year
 from .sales_order import BillingParty1, LineItem, OrderParty
 
 
+def _get_first_by_id(objects):
+    return min(objects, key=lambda x: x.id, default=None)
+
+
+def _get_first_tenantcontact(tenant, contact_type, start_date, end_date):
+    """Returns the same tenant contact as
+    tenant.get_tenantcontacts_for_period(...).first() but uses the
+    prefetched tenant contacts if there are any"""
+    tenantcontacts = [
+        tenantcontact
+        for tenantcontact in tenant.tenantcontact_set.all()
+        if tenantcontact.type == contact_type
+        and (
+            tenantcontact.end_date is None
+            or (start_date is not None and tenantcontact.end_date >= start_date)
+        )
+        and (
+            not end_date
+            or tenantcontact.start_date is None
+            or tenantcontact.start_date <= end_date
+        )
+    ]
+
+    # Ordered by the start date descending with the nulls first like in
+    # PostgreSQL
+    return min(
+        tenantcontacts,
+        key=lambda x: (
+            x.start_date is not None,
+            -x.start_date.toordinal() if x.start_date else 0,
+            x.id,
+        ),
+        default=None,
+    )
+
+
 class InvoiceSalesOrderAdapter:
+    """Sets the values of a SalesOrder from an Invoice
+
+    The related objects of the invoice are accessed with .all() so that
+    the objects prefetched by InvoiceExportContext are used if the invoice
+    was loaded with it."""
+
     def __init__(
         self,
         invoice=None,
         sales_order=None,
         receivable_type_rent=None,
         receivable_type_collateral=None,
+        export_context=None,
     ):
         self.invoice = invoice
         self.sales_order = sales_order
         self.receivable_type_rent = receivable_type_rent
         self.receivable_type_collateral = receivable_type_collateral
+        self.export_context = export_context
 
-    def get_bill_text(self):
+    def get_active_rent(self):
         if (
             self.invoice.billing_period_start_date
             and self.invoice.billing_period_end_date
         ):
-            invoice_year = self.invoice.billing_period_start_date.year
-
             # TODO: Which rent
-            rent = self.invoice.lease.get_active_rents_on_period(
+            (start_date, end_date) = (
                 self.invoice.billing_period_start_date,
                 self.invoice.billing_period_end_date,
-            ).first()
+            )
         else:
-            invoice_year = self.invoice.invoicing_date.year
-
-            rent = self.invoice.lease.get_active_rents_on_period(
-                self.invoice.invoicing_date, self.invoice.invoicing_date
-            ).first()
+            start_date = end_date = self.invoice.invoicing_date
 
-        rent_calculation = self.invoice.lease.calculate_rent_amount_for_year(
-            invoice_year
+        return _get_first_by_id(
+            rent
+            for rent in self.invoice.lease.rents.all()
+            if rent.is_active_on_period(start_date, end_date)
         )
-        year_rent = rent_calculation.get_total_amount()
+
+    def get_year_rent(self):
+        invoice_year = get_invoice_year(self.invoice)
+
+        if self.export_context:
+            return self.export_context.get_yearly_rent(self.invoice.lease, invoice_year)
+
+        return calculate_yearly_rent(self.invoice.lease, invoice_year)
+
+    def get_bill_text(self):
+        rent = self.get_active_rent()
+        year_rent = self.get_year_rent()
 
         real_property_identifier = ""
         address = ""
 
-        first_lease_area = self.invoice.lease.lease_areas.first()
+        first_lease_area = _get_first_by_id(self.invoice.lease.lease_areas.all())
         if first_lease_area:
             real_property_identifier = first_lease_area.identifier
-            lease_area_address = first_lease_area.addresses.order_by(
-                "-is_primary"
-            ).first()
+            lease_area_address = min(
+                first_lease_area.addresses.all(),
+                key=lambda x: (not x.is_primary, x.id),
+                default=None,
+            )
 
             if lease_area_address:
                 address = lease_area_address.address
@@ -118,8 +172,11 @@ class InvoiceSalesOrderAdapter:
 
         return "\n".join(bill_texts)
 
+    def get_invoice_rows(self):
+        return sorted(self.invoice.rows.all(), key=lambda x: x.id)
+
     def get_first_tenant(self):
-        for invoice_row in self.invoice.rows.all():
+        for invoice_row in self.get_invoice_rows():
             if not invoice_row.tenant:
                 continue
 
@@ -131,10 +188,19 @@ class InvoiceSalesOrderAdapter:
         if not tenant or not self.invoice.billing_period_start_date:
             return self.invoice.recipient
 
-        # This method returns the TENANT contact if there's no BILLING contact
-        tenant_billingcontact = tenant.get_billing_tenantcontacts(
-            self.invoice.billing_period_start_date, self.invoice.billing_period_end_date
-        ).first()
+        # Use the TENANT contact if there's no BILLING contact like
+        # Tenant.get_billing_tenantcontacts does
+        tenant_billingcontact = _get_first_tenantcontact(
+            tenant,
+            TenantContactType.BILLING,
+            self.invoice.billing_period_start_date,
+            self.invoice.billing_period_end_date,
+        ) or _get_first_tenantcontact(
+            tenant,
+            TenantContactType.TENANT,
+            self.invoice.billing_period_start_date,
+            self.invoice.billing_period_end_date,
+        )
 
         if not tenant_billingcontact:
             return self.invoice.recipient
@@ -142,8 +208,8 @@ class InvoiceSalesOrderAdapter:
 
     def get_po_number(self):
         # Simply return the first reference ("viite") we come across
-        for invoice_row in self.invoice.rows.filter(tenant__isnull=False):
-            if invoice_row.tenant.reference:
+        for invoice_row in self.get_invoice_rows():
+            if invoice_row.tenant and invoice_row.tenant.reference:
                 return invoice_row.tenant.reference[:35]
 
     def set_dates(self):
@@ -166,7 +232,7 @@ class InvoiceSalesOrderAdapter:
     def get_line_items(self):
         line_items = []
 
-        invoice_rows = self.invoice.rows.all()
+        invoice_rows = self.get_invoice_rows()
         for i, invoice_row in enumerate(invoice_rows):
             line_item = LineItem()
 
@@ -222,9 +288,9 @@ class InvoiceSalesOrderAdapter:
                 if not start_date and not end_date:
                     start_date = end_date = self.invoice.invoicing_date
 
-                tenant_contact = invoice_row.tenant.get_tenant_tenantcontacts(
-                    start_date, end_date
-                ).first()
+                tenant_contact = _get_first_tenantcontact(
+                    invoice_row.tenant, TenantContactType.TENANT, start_date, end_date
+                )
 
                 if tenant_contact and tenant_contact.contact:
                     line_item.line_text_l2 = "{}  ".format(
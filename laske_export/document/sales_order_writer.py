@@ -0,0 +1,101 @@
+import os
+from contextlib import ExitStack
+
+from lxml import etree
+
+from .sales_order import SalesOrderContainer
+
+
+class SalesOrderContainerWriter:
+    """Writes sales orders to SalesOrderContainer XML files one at a time
+
+    The sales orders are written to the file as soon as they are added, so
+    the whole document is never in memory. The files are identical to the
+    ones created with SalesOrderContainer.to_xml_string.
+
+    If max_file_size (in bytes) is given, a new file is started when the
+    file has grown over it. The first file is named by the filename and the
+    next ones by adding a number to it, e.g. "export_2.xml". The written
+    files are listed in the filenames attribute.
+
+    If an exception is raised inside the with block, the written files are
+    removed."""
+
+    def __init__(self, directory, filename, max_file_size=None):
+        self.directory = directory
+        self.filename = filename
+        self.max_file_size = max_file_size
+        self.filenames = []
+        self._file = None
+        self._xml_file = None
+        self._exit_stack = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        try:
+            self.close()
+        finally:
+            if exc_type is not None:
+                self.remove_files()
+
+    def write(self, sales_order):
+        """Validates the sales order and writes it to the current file"""
+        sales_order.validate()
+        element = sales_order.to_etree()
+        # Indent the element as if it was pretty printed in the container
+        etree.indent(element, level=1)
+
+        if self._file and self.max_file_size:
+            if self._file.tell() >= self.max_file_size:
+                self.close()
+
+        if not self._file:
+            self._open_next_file()
+
+        self._xml_file.write("\n  ", element)
+
+    def close(self):
+        if not self._exit_stack:
+            return
+
+        self._xml_file.write("\n")
+        (exit_stack, self._exit_stack) = (self._exit_stack, None)
+        self._file = None
+        self._xml_file = None
+        exit_stack.close()
+
+    def remove_files(self):
+        for filename in self.filenames:
+            path = os.path.join(self.directory, filename)
+            if os.path.exists(path):
+                os.remove(path)
+
+    def _get_next_filename(self):
+        if not self.filenames:
+            return self.filename
+
+        (name, extension) = os.path.splitext(self.filename)
+        return "{}_{}{}".format(name, len(self.filenames) + 1, extension)
+
+    def _open_next_file(self):
+        filename = self._get_next_filename()
+        self.filenames.append(filename)
+
+        exit_stack = ExitStack()
+        with exit_stack:
+            self._file = exit_stack.enter_context(
+                open(os.path.join(self.directory, filename), "wb")
+            )
+            # etree.tostring(pretty_print=True) ends the document with a
+            # newline, which xmlfile doesn't write
+            exit_stack.callback(self._file.write, b"\n")
+            self._xml_file = exit_stack.enter_context(
+                etree.xmlfile(self._file, encoding="utf-8", buffered=False)
+            )
+            self._xml_file.write_declaration()
+            exit_stack.enter_context(
+                self._xml_file.element(SalesOrderContainer.Meta.element_name)
+            )
+            self._exit_stack = exit_stack.pop_all()
@@ -3,19 +3,18 @@ import logging
 import os
 import tempfile
 
-import paramiko
-import pysftp
 from django.conf import settings
 from django.core.exceptions import ValidationError
 from django.utils import timezone
 from django.utils.translation import ugettext_lazy as _
-from paramiko.py3compat import decodebytes
 
+from laske_export.document.invoice_export_context import InvoiceExportContext
 from laske_export.document.invoice_sales_order_adapter import InvoiceSalesOrderAdapter
 from laske_export.document.land_use_agreement_invoice_sales_order_adapter import (
     LandUseAgreementInvoiceSalesOrderAdapter,
 )
-from laske_export.document.sales_order import SalesOrder, SalesOrderContainer
+from laske_export.document.sales_order import SalesOrder
+from laske_export.document.sales_order_writer import SalesOrderContainerWriter
 from laske_export.enums import LaskeExportLogInvoiceStatus
 from laske_export.models import LaskeExportLog, LaskeExportLogInvoiceItem
 from leasing.enums import InvoiceType
@@ -34,6 +33,15 @@ class LaskeExporterException(Exception):
     pass
 
 
+def get_sftp_exception_classes():
+    """Returns the exception classes that sending the export file may raise
+    in addition to LaskeExporterException"""
+    from paramiko import SSHException
+    from pysftp import ConnectionException, CredentialException, HostKeysException
+
+    return (ConnectionException, CredentialException, SSHException, HostKeysException)
+
+
 class LaskeExporter:
     def __init__(self):
         self.message_output = None
@@ -69,13 +77,32 @@ class LaskeExporter:
         ):
             raise LaskeExporterException(_('LASKE_SERVERS["export"] settings missing'))
 
-    def save_to_file(self, xml_string, filename):
-        full_path = os.path.join(settings.LASKE_EXPORT_ROOT, filename)
+    def get_export_file_writer(self, laske_export_log_entry):
+        export_filename = "MTIL_IN_{}_{:08}.xml".format(
+            settings.LASKE_VALUES["sender_id"], laske_export_log_entry.id
+        )
 
-        with open(full_path, "wb") as fp:
-            fp.write(xml_string)
+        return SalesOrderContainerWriter(
+            settings.LASKE_EXPORT_ROOT,
+            export_filename,
+            max_file_size=getattr(settings, "LASKE_EXPORT_MAX_FILE_SIZE", None),
+        )
+
+    def send_files(self, filenames):
+        for filename in filenames:
+            self.write_to_output("Export filename: {}".format(filename))
+            self.write_to_output("Sending...")
+
+            self.send(filename)
+
+            self.write_to_output("Done.")
 
     def send(self, filename):
+        # paramiko and pysftp are slow to import, so import them only here
+        import paramiko
+        import pysftp
+        from paramiko.py3compat import decodebytes
+
         # Add destination server host key
         if settings.LASKE_SERVERS["export"]["key_type"] == "ssh-ed25519":
             key = paramiko.ed25519key.Ed25519Key(
@@ -132,111 +159,98 @@ class LaskeExporter:
         receivable_type_rent = ReceivableType.objects.get(pk=1)
         receivable_type_collateral = ReceivableType.objects.get(pk=8)
 
+        # Load the related objects of all of the invoices at once
+        export_context = InvoiceExportContext()
+        invoices = export_context.load_invoices(invoices)
+
         now = timezone.now()
         laske_export_log_entry = LaskeExportLog.objects.create(started_at=now)
 
-        sales_orders = []
         log_invoices = []
         invoice_count = 0
 
         self.write_to_output("Going through {} invoices".format(len(invoices)))
 
-        for invoice in invoices:
-            invoice_log_item = LaskeExportLogInvoiceItem(
-                invoice=invoice, laskeexportlog=laske_export_log_entry
-            )
-            log_invoices.append(invoice_log_item)
-
-            try:
-                self.write_to_output(" Invoice id {}".format(invoice.id))
-
-                # If this invoice is a credit note, but the credited invoice has
-                # not been sent to SAP, don't send the credit invoice either.
-                # TODO This doesn't check if the credited invoice would be sent
-                #   in this same export. Need to check if the SAP can handle it.
-                if invoice.type == InvoiceType.CREDIT_NOTE and (
-                    not invoice.credited_invoice
-                    or not invoice.credited_invoice.sent_to_sap_at
-                ):
-                    if invoice.credited_invoice:
-                        self.write_to_output(
-                            " Not sending invoice id {} because the credited invoice (id {}) "
-                            "has not been sent to SAP.".format(
-                                invoice.id, invoice.credited_invoice.id
+        with self.get_export_file_writer(laske_export_log_entry) as writer:
+            for invoice in invoices:
+                invoice_log_item = LaskeExportLogInvoiceItem(
+                    invoice=invoice, laskeexportlog=laske_export_log_entry
+                )
+                log_invoices.append(invoice_log_item)
+
+                try:
+                    self.write_to_output(" Invoice id {}".format(invoice.id))
+
+                    # If this invoice is a credit note, but the credited invoice has
+                    # not been sent to SAP, don't send the credit invoice either.
+                    # TODO This doesn't check if the credited invoice would be sent
+                    #   in this same export. Need to check if the SAP can handle it.
+                    if invoice.type == InvoiceType.CREDIT_NOTE and (
+                        not invoice.credited_invoice
+                        or not invoice.credited_invoice.sent_to_sap_at
+                    ):
+                        if invoice.credited_invoice:
+                            self.write_to_output(
+                                " Not sending invoice id {} because the credited invoice (id {}) "
+                                "has not been sent to SAP.".format(
+                                    invoice.id, invoice.credited_invoice.id
+                                )
                             )
-                        )
-                    else:
-                        self.write_to_output(
-                            " Not sending invoice id {} because the credited invoice is unknown.".format(
-                                invoice.id
+                        else:
+                            self.write_to_output(
+                                " Not sending invoice id {} because the credited invoice is unknown.".format(
+                                    invoice.id
+                                )
                             )
-                        )
 
-                    continue
+                        continue
 
-                if not invoice.invoicing_date:
-                    invoice.invoicing_date = now.date()
-                    invoice.save()
+                    if not invoice.invoicing_date:
+                        invoice.invoicing_date = now.date()
+                        invoice.save()
 
-                sales_order = SalesOrder()
-                set_constant_laske_values(sales_order)
-
-                adapter = InvoiceSalesOrderAdapter(
-                    invoice=invoice,
-                    sales_order=sales_order,
-                    receivable_type_rent=receivable_type_rent,
-                    receivable_type_collateral=receivable_type_collateral,
-                )
-                adapter.set_values()
+                    sales_order = SalesOrder()
+                    set_constant_laske_values(sales_order)
 
-                sales_order.validate()
+                    adapter = InvoiceSalesOrderAdapter(
+                        invoice=invoice,
+                        sales_order=sales_order,
+                        receivable_type_rent=receivable_type_rent,
+                        receivable_type_collateral=receivable_type_collateral,
+                        export_context=export_context,
+                    )
+                    adapter.set_values()
 
-                sales_orders.append(sales_order)
+                    # Validates the sales order and writes it to the export file
+                    writer.write(sales_order)
 
-                invoice_count += 1
+                    invoice_count += 1
 
-                self.write_to_output(
-                    " Added invoice id {} as invoice number {}".format(
-                        invoice.id, invoice.number
+                    self.write_to_output(
+                        " Added invoice id {} as invoice number {}".format(
+                            invoice.id, invoice.number
+                        )
                     )
-                )
 
-                invoice_log_item.status = LaskeExportLogInvoiceStatus.SENT
-            except ValidationError as err:
-                self.write_to_output(
-                    "Validation error occurred in #{} ({}) invoice. Errors: {}".format(
-                        invoice.number, invoice.id, "; ".join(err.messages)
+                    invoice_log_item.status = LaskeExportLogInvoiceStatus.SENT
+                except ValidationError as err:
+                    self.write_to_output(
+                        "Validation error occurred in #{} ({}) invoice. Errors: {}".format(
+                            invoice.number, invoice.id, "; ".join(err.messages)
+                        )
                     )
-                )
-                logger.warning(err, exc_info=True)
-                invoice_log_item.status = LaskeExportLogInvoiceStatus.FAILED
-                invoice_log_item.information = json.dumps(err.message_dict)
-            finally:
-                invoice_log_item.save()
+                    logger.warning(err, exc_info=True)
+                    invoice_log_item.status = LaskeExportLogInvoiceStatus.FAILED
+                    invoice_log_item.information = json.dumps(err.message_dict)
+                finally:
+                    invoice_log_item.save()
 
         if invoice_count > 0:
             self.write_to_output(
                 "Added {} invoices to the export".format(invoice_count)
             )
 
-            sales_order_container = SalesOrderContainer()
-            sales_order_container.sales_orders = sales_orders
-
-            export_filename = "MTIL_IN_{}_{:08}.xml".format(
-                settings.LASKE_VALUES["sender_id"], laske_export_log_entry.id
-            )
-
-            self.write_to_output("Export filename: {}".format(export_filename))
-
-            xml_string = sales_order_container.to_xml_string()
-
-            self.save_to_file(xml_string, export_filename)
-
-            self.write_to_output("Sending...")
-
-            self.send(export_filename)
-
-            self.write_to_output("Done.")
+            self.send_files(writer.filenames)
 
             Invoice.objects.filter(id__in=[o.id for o in invoices]).update(
                 sent_to_sap_at=now
@@ -260,7 +274,6 @@ class LaskeExporter:
         now = timezone.now()
         laske_export_log_entry = LaskeExportLog.objects.create(started_at=now)
 
-        sales_orders = []
         log_invoices = []
         invoice_count = 0
 
@@ -268,53 +281,39 @@ class LaskeExporter:
             "Going through {} land use agreement invoices".format(len(invoices))
         )
 
-        for invoice in invoices:
-            self.write_to_output(" Land use agreement invoice id {}".format(invoice.id))
+        with self.get_export_file_writer(laske_export_log_entry) as writer:
+            for invoice in invoices:
+                self.write_to_output(
+                    " Land use agreement invoice id {}".format(invoice.id)
+                )
 
-            sales_order = SalesOrder()
-            set_constant_laske_values(sales_order)
+                sales_order = SalesOrder()
+                set_constant_laske_values(sales_order)
 
-            adapter = LandUseAgreementInvoiceSalesOrderAdapter(
-                invoice=invoice, sales_order=sales_order,
-            )
-            adapter.set_values()
+                adapter = LandUseAgreementInvoiceSalesOrderAdapter(
+                    invoice=invoice, sales_order=sales_order,
+                )
+                adapter.set_values()
 
-            sales_orders.append(sales_order)
-            log_invoices.append(invoice)
+                writer.write(sales_order)
+                log_invoices.append(invoice)
 
-            invoice_count += 1
+                invoice_count += 1
 
-            self.write_to_output(
-                " Added invoice id {} as invoice number {}".format(
-                    invoice.id, invoice.number
+                self.write_to_output(
+                    " Added invoice id {} as invoice number {}".format(
+                        invoice.id, invoice.number
+                    )
                 )
-            )
 
         if invoice_count > 0:
             self.write_to_output(
                 "Added {} invoices to the export".format(invoice_count)
             )
 
-            sales_order_container = SalesOrderContainer()
-            sales_order_container.sales_orders = sales_orders
-
             laske_export_log_entry.land_use_agreement_invoices.set(log_invoices)
 
-            export_filename = "MTIL_IN_{}_{:08}.xml".format(
-                settings.LASKE_VALUES["sender_id"], laske_export_log_entry.id
-            )
-
-            self.write_to_output("Export filename: {}".format(export_filename))
-
-            xml_string = sales_order_container.to_xml_string()
-
-            self.save_to_file(xml_string, export_filename)
-
-            self.write_to_output("Sending...")
-
-            self.send(export_filename)
-
-            self.write_to_output("Done.")
+            self.send_files(writer.filenames)
 
             LandUseAgreementInvoice.objects.filter(
                 id__in=[o.id for o in invoices]
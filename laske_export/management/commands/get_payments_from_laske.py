@@ -3,22 +3,103 @@ import glob
 import os
 import sys
 import tempfile
+from collections import namedtuple
+from concurrent.futures import ProcessPoolExecutor
 from decimal import ROUND_HALF_UP, Decimal
 from pathlib import Path
 
+from auditlog.diff import model_instance_diff
+from auditlog.models import LogEntry
 from django.conf import settings
 from django.core.management.base import BaseCommand
+from django.db import connections, transaction
 from django.utils import timezone
 
 from laske_export.models import LaskePaymentsLog
 from leasing.models import Invoice, Vat
 from leasing.models.invoice import InvoicePayment
+from leasing.models.utils import bulk_create_log_entries
 
 
 def get_import_dir():
     return os.path.join(settings.LASKE_EXPORT_ROOT, "payments")
 
 
+# A payment row of a Laske payments file
+PaymentRow = namedtuple(
+    "PaymentRow", ["filing_code", "invoice_number", "amount", "payment_date"]
+)
+
+
+def get_payment_lines_from_file(filename):
+    result = []
+
+    with open(filename, "rt", encoding="latin-1") as fp:
+        lines = fp.readlines()
+
+    for line in lines:
+        line = line.strip("\n")
+        if len(line) != 90:
+            continue
+        if line[0] not in ["3", "5", "7"]:
+            continue
+
+        result.append(line)
+
+    return result
+
+
+def parse_payment_line(line):
+    """Returns the PaymentRow of the line or the reason why it was skipped"""
+    filing_code = line[27:43].strip()
+    if filing_code[:3] != "288":
+        return "  Skipped row: filing code ({}) should start with 288".format(
+            filing_code
+        )
+
+    try:
+        invoice_number = int(line[43:63])
+    except ValueError:
+        return "  Skipped row: no invoice number provided in payment row"
+
+    amount = Decimal("{}.{}".format(line[77:85], line[85:87]))
+    try:
+        payment_date = datetime.date(
+            year=2000 + int(line[21:23]), month=int(line[23:25]), day=int(line[25:27]),
+        )
+    except ValueError:
+        return "  Skipped row: malformed date in payment row: {}.".format(
+            invoice_number, line[21:27]
+        )
+
+    return PaymentRow(filing_code, invoice_number, amount, payment_date)
+
+
+def read_payment_file(filename):
+    """Returns the filename, the parsed rows and the read error of the file
+
+    This is run in the worker processes, so it must not use the database."""
+    try:
+        lines = get_payment_lines_from_file(filename)
+    except UnicodeDecodeError as e:
+        return (filename, [], str(e))
+
+    return (filename, [parse_payment_line(line) for line in lines], None)
+
+
+def get_vat_for_date(vats, the_date):
+    """Returns the VAT for the date like Vat.objects.get_for_date does
+
+    The vats must be ordered by start date descending."""
+    for vat in vats:
+        if vat.start_date <= the_date and (
+            vat.end_date is None or vat.end_date >= the_date
+        ):
+            return vat
+
+    return None
+
+
 class Command(BaseCommand):
     help = "Get payments from Laske"
 
@@ -160,24 +241,31 @@ class Command(BaseCommand):
             if Path(filename).name not in already_imported_filenames
         ]
 
-    def get_payment_lines_from_file(self, filename):
-        result = []
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--processes",
+            type=int,
+            default=0,
+            help="Read the files using this many worker processes. "
+            "By default the files are read in this process.",
+        )
 
-        with open(filename, "rt", encoding="latin-1") as fp:
-            lines = fp.readlines()
+    def read_files(self, filenames, processes):
+        """Reads and parses the payment rows of the files
 
-        for line in lines:
-            line = line.strip("\n")
-            if len(line) != 90:
-                continue
-            if line[0] not in ["3", "5", "7"]:
-                continue
+        Returns a list of (filename, rows, error) tuples in the order of the
+        filenames. The error is set if the file could not be read."""
+        if processes > 1 and len(filenames) > 1:
+            # The worker processes must not share the database connections
+            # of this process.
+            connections.close_all()
 
-            result.append(line)
+            with ProcessPoolExecutor(max_workers=processes) as executor:
+                return list(executor.map(read_payment_file, filenames))
 
-        return result
+        return [read_payment_file(filename) for filename in filenames]
 
-    def handle(self, *args, **options):  # NOQA C901 'Command.handle' is too complex
+    def handle(self, *args, **options):
         self.check_import_directory()
 
         self.stdout.write(
@@ -196,120 +284,144 @@ class Command(BaseCommand):
 
         self.stdout.write("Reading files...")
 
-        for filename in filenames:
-            filepath = Path(filename)
+        files = self.read_files(filenames, options.get("processes") or 0)
+
+        # Fetch everything that is needed to import the payments of all of
+        # the files at once
+        invoice_numbers = {
+            row.invoice_number
+            for (_filename, rows, _error) in files
+            for row in rows
+            if isinstance(row, PaymentRow)
+        }
+        invoices_by_number = {
+            invoice.number: invoice
+            for invoice in Invoice.objects.filter(
+                number__in=invoice_numbers
+            ).select_related("lease")
+        }
+        vats = list(Vat.objects.order_by("-start_date"))
+        existing_payments = set(
+            InvoicePayment.objects.filter(
+                invoice__in=[invoice.id for invoice in invoices_by_number.values()]
+            ).values_list("invoice_id", "paid_amount", "paid_date")
+        )
 
+        for (filename, rows, error) in files:
             self.stdout.write("Filename: {}".format(filename))
             (
                 laske_payments_log_entry,
                 created,
             ) = LaskePaymentsLog.objects.get_or_create(
-                filename=filepath.name, defaults={"started_at": timezone.now()}
+                filename=Path(filename).name, defaults={"started_at": timezone.now()}
             )
 
-            try:
-                lines = self.get_payment_lines_from_file(filename)
-            except UnicodeDecodeError as e:
+            if error:
                 self.stderr.write(
-                    "Error: failed to read file {}! Error {}".format(filename, str(e))
+                    "Error: failed to read file {}! Error {}".format(filename, error)
                 )
                 continue
 
-            for line in lines:
-                filing_code = line[27:43].strip()
-                if filing_code[:3] != "288":
-                    self.stderr.write(
-                        "  Skipped row: filing code ({}) should start with 288".format(
-                            filing_code
-                        )
-                    )
-                    continue
+            invoice_payments = self.get_new_invoice_payments(
+                rows, invoices_by_number, vats, existing_payments
+            )
 
-                try:
-                    invoice_number = int(line[43:63])
-                except ValueError:
-                    self.stderr.write(
-                        "  Skipped row: no invoice number provided in payment row"
-                    )
-                    continue
+            with transaction.atomic():
+                InvoicePayment.objects.bulk_create(invoice_payments)
+                bulk_create_log_entries(
+                    LogEntry.Action.CREATE,
+                    [
+                        (payment, model_instance_diff(None, payment))
+                        for payment in invoice_payments
+                    ],
+                )
+                laske_payments_log_entry.payments.add(*invoice_payments)
 
-                amount = Decimal("{}.{}".format(line[77:85], line[85:87]))
-                try:
-                    payment_date = datetime.date(
-                        year=2000 + int(line[21:23]),
-                        month=int(line[23:25]),
-                        day=int(line[25:27]),
-                    )
-                except ValueError:
-                    self.stderr.write(
-                        "  Skipped row: malformed date in payment row: {}.".format(
-                            invoice_number, line[21:27]
-                        )
-                    )
-                    continue
+                Invoice.objects.recalculate_amounts(
+                    {payment.invoice.id for payment in invoice_payments}
+                )
 
-                self.stdout.write(
-                    " Invoice #{} amount: {} date: {} filing code: {}".format(
-                        invoice_number, amount, payment_date, filing_code
+                laske_payments_log_entry.ended_at = timezone.now()
+                laske_payments_log_entry.is_finished = True
+                laske_payments_log_entry.save()
+
+        self.stdout.write("Done.")
+
+    def get_new_invoice_payments(
+        self, rows, invoices_by_number, vats, existing_payments
+    ):
+        """Returns the unsaved InvoicePayments of the payment rows
+
+        The payments that are already in existing_payments are skipped and
+        the new payments are added to it."""
+        invoice_payments = []
+
+        for row in rows:
+            if not isinstance(row, PaymentRow):
+                # The row was skipped when the file was parsed
+                self.stderr.write(row)
+                continue
+
+            amount = row.amount
+            payment_date = row.payment_date
+
+            self.stdout.write(
+                " Invoice #{} amount: {} date: {} filing code: {}".format(
+                    row.invoice_number, amount, payment_date, row.filing_code
+                )
+            )
+
+            invoice = invoices_by_number.get(row.invoice_number)
+            if not invoice:
+                self.stderr.write(
+                    '  Skipped row: invoice number "{}" does not exist.'.format(
+                        row.invoice_number
                     )
                 )
+                continue
 
-                try:
-                    invoice = Invoice.objects.get(number=invoice_number)
-                except Invoice.DoesNotExist:
-                    self.stderr.write(
-                        '  Skipped row: invoice number "{}" does not exist.'.format(
-                            invoice_number
+            if invoice.lease.is_subject_to_vat:
+                vat = get_vat_for_date(vats, payment_date)
+                if not vat:
+                    self.stdout.write(
+                        "  Lease is subject to VAT but no VAT percent found for payment date {}!".format(
+                            payment_date
                         )
                     )
                     continue
 
-                if invoice.lease.is_subject_to_vat:
-                    vat = Vat.objects.get_for_date(payment_date)
-                    if not vat:
-                        self.stdout.write(
-                            "  Lease is subject to VAT but no VAT percent found for payment date {}!".format(
-                                payment_date
-                            )
-                        )
-                        continue
-
-                    amount_without_vat = Decimal(
-                        100 * amount / (100 + vat.percent)
-                    ).quantize(Decimal(".01"), rounding=ROUND_HALF_UP)
+                amount_without_vat = Decimal(
+                    100 * amount / (100 + vat.percent)
+                ).quantize(Decimal(".01"), rounding=ROUND_HALF_UP)
 
-                    self.stdout.write(
-                        "  Lease is subject to VAT. Amount: {} - VAT {}% = {}".format(
-                            amount, vat.percent, amount_without_vat
-                        )
+                self.stdout.write(
+                    "  Lease is subject to VAT. Amount: {} - VAT {}% = {}".format(
+                        amount, vat.percent, amount_without_vat
                     )
+                )
 
-                    amount = amount_without_vat
+                amount = amount_without_vat
 
-                # If the invoice is paid in parts, the different payments will have the same filing_code.
-                # Avoiding duplicate payments by checking only the filing_code will skip legit payments
-                # so we'll only the skip adding the payments which match on date and amount as well.
-                # NB! It's still possible that someone pays e.g. a 40€ invoice with two separate 20€ payments
-                # ...but that situation is so rare that we'll handle it manually.
-                if invoice.payments.filter(
-                    paid_amount=amount, paid_date=payment_date
-                ).exists():
-                    self.stdout.write(
-                        "  Skipped row: payment with same paid_date and paid_amount exists!"
-                    )
-                    continue
+            # If the invoice is paid in parts, the different payments will have the same filing_code.
+            # Avoiding duplicate payments by checking only the filing_code will skip legit payments
+            # so we'll only the skip adding the payments which match on date and amount as well.
+            # NB! It's still possible that someone pays e.g. a 40€ invoice with two separate 20€ payments
+            # ...but that situation is so rare that we'll handle it manually.
+            payment_key = (invoice.id, amount, payment_date)
+            if payment_key in existing_payments:
+                self.stdout.write(
+                    "  Skipped row: payment with same paid_date and paid_amount exists!"
+                )
+                continue
 
-                invoice_payment = InvoicePayment.objects.create(
+            existing_payments.add(payment_key)
+            invoice_payments.append(
+                InvoicePayment(
                     invoice=invoice,
                     paid_amount=amount,
                     paid_date=payment_date,
-                    filing_code=filing_code,
+                    filing_code=row.filing_code,
                 )
-                laske_payments_log_entry.payments.add(invoice_payment)
-                invoice.update_amounts()
-
-            laske_payments_log_entry.ended_at = timezone.now()
-            laske_payments_log_entry.is_finished = True
-            laske_payments_log_entry.save()
+            )
 
-        self.stdout.write("Done.")
+        return invoice_payments
@@ -0,0 +1,96 @@
+import pytest
+from django.core.exceptions import ValidationError
+
+from laske_export.document.fields import FieldError
+from laske_export.document.sales_order import (
+    BillingParty1,
+    LineItem,
+    OrderParty,
+    Party,
+    SalesOrder,
+)
+
+
+def test_schema_is_compiled_once_per_class():
+    assert SalesOrder.get_schema() is SalesOrder().get_schema()
+    assert OrderParty.get_schema() is not BillingParty1.get_schema()
+    assert OrderParty.get_schema() is not Party.get_schema()
+
+
+def test_schema_fields_are_in_declaration_order():
+    field_names = list(SalesOrder.get_schema().fields)
+
+    assert field_names[:3] == ["sender_id", "reference", "original_order"]
+    assert field_names[-5:] == [
+        "order_party",
+        "billing_party1",
+        "billing_party2",
+        "payer_party",
+        "line_items",
+    ]
+    assert list(OrderParty.get_schema().fields) == list(Party.get_schema().fields)
+
+
+def test_new_instance_values_are_empty():
+    line_item = LineItem()
+    line_item.net_price = "10.00"
+
+    assert LineItem().net_price is None
+    assert all(
+        getattr(LineItem(), field_name) is None
+        for field_name in LineItem.get_schema().fields
+    )
+
+
+def test_validate_collects_field_errors():
+    sales_order = SalesOrder()
+    sales_order.sales_org = "28000"
+    sales_order.reference = "1234567890"
+    sales_order.po_number = "1" * 36
+
+    with pytest.raises(ValidationError) as exc_info:
+        sales_order.validate()
+
+    assert sorted(exc_info.value.message_dict) == ["po_number", "sales_org"]
+
+
+def test_validate_validates_sub_elements():
+    sales_order = SalesOrder()
+    line_item = LineItem()
+    line_item.net_price = "1" * 15
+    sales_order.line_items = [line_item]
+
+    with pytest.raises(ValidationError) as exc_info:
+        sales_order.validate()
+
+    assert list(exc_info.value.message_dict) == ["net_price"]
+
+
+def test_to_etree_raises_on_invalid_value():
+    line_item = LineItem()
+    line_item.net_price = "1" * 15
+
+    with pytest.raises(FieldError):
+        line_item.to_etree()
+
+
+def test_to_etree_writes_fields_in_order():
+    line_item = LineItem()
+    line_item.material = "L12345"
+    line_item.net_price = "10.00"
+
+    element = line_item.to_etree()
+    children = list(element)
+
+    assert element.tag == "LineItem"
+    assert [child.tag for child in children[:6]] == [
+        "GroupingFactor",
+        "Material",
+        "MaterialDescription",
+        "Quantity",
+        "Unit",
+        "NetPrice",
+    ]
+    assert children[1].text == "L12345"
+    assert children[5].text == "10.00"
+    assert children[0].text is None
@@ -0,0 +1,208 @@
+import datetime
+import os
+from decimal import Decimal
+
+import pytest
+from auditlog.models import LogEntry
+from django.conf import settings
+from django.core.management import call_command
+
+from laske_export.management.commands import get_payments_from_laske
+from laske_export.models import LaskePaymentsLog
+from leasing.enums import InvoiceState
+from leasing.models import ReceivableType, Vat
+from leasing.models.invoice import InvoicePayment
+
+
+def _payment_line(invoice_number, amount, payment_date, filing_code="288123"):
+    (euros, cents) = "{:.2f}".format(amount).split(".")
+    line = "3{:20}{:%y%m%d}{:16}{:>20}{:14}{:>08}{:>02}".format(
+        "", payment_date, filing_code, invoice_number, "", euros, cents
+    )
+    return line.ljust(90)
+
+
+def _write_payments_file(name, lines):
+    filename = os.path.join(
+        get_payments_from_laske.get_import_dir(),
+        "MR_OUT_{}_{}".format(settings.LASKE_VALUES["import_id"], name),
+    )
+    with open(filename, "wt", encoding="latin-1") as fp:
+        fp.write("".join("{}\n".format(line) for line in lines))
+
+
+@pytest.fixture
+def import_dir(monkeypatch):
+    os.makedirs(get_payments_from_laske.get_import_dir(), exist_ok=True)
+
+    monkeypatch.setattr(
+        get_payments_from_laske.Command, "download_payments", lambda self: None
+    )
+
+    yield get_payments_from_laske.get_import_dir()
+
+    for filename in os.listdir(get_payments_from_laske.get_import_dir()):
+        os.remove(os.path.join(get_payments_from_laske.get_import_dir(), filename))
+
+
+@pytest.fixture
+def invoices(lease_factory, invoice_factory, invoice_row_factory):
+    invoices = []
+    for (number, is_subject_to_vat) in [(1000001, False), (1000002, True)]:
+        lease = lease_factory(
+            type_id=1,
+            municipality_id=1,
+            district_id=5,
+            notice_period_id=1,
+            is_subject_to_vat=is_subject_to_vat,
+        )
+        invoice = invoice_factory(
+            lease=lease,
+            number=number,
+            total_amount=Decimal("124.00"),
+            billed_amount=Decimal("124.00"),
+            outstanding_amount=Decimal("124.00"),
+        )
+        invoice_row_factory(
+            invoice=invoice,
+            receivable_type=ReceivableType.objects.get(pk=1),
+            amount=Decimal("124.00"),
+        )
+        invoices.append(invoice)
+
+    return invoices
+
+
+def test_parse_payment_line():
+    payment_date = datetime.date(year=2020, month=1, day=31)
+
+    row = get_payments_from_laske.parse_payment_line(
+        _payment_line(1000001, Decimal("12.34"), payment_date)
+    )
+
+    assert row == get_payments_from_laske.PaymentRow(
+        filing_code="288123",
+        invoice_number=1000001,
+        amount=Decimal("12.34"),
+        payment_date=payment_date,
+    )
+
+
+def test_parse_payment_line_with_invalid_filing_code():
+    row = get_payments_from_laske.parse_payment_line(
+        _payment_line(
+            1000001,
+            Decimal("12.34"),
+            datetime.date(year=2020, month=1, day=31),
+            filing_code="123",
+        )
+    )
+
+    assert row == "  Skipped row: filing code (123) should start with 288"
+
+
+def test_get_vat_for_date():
+    vats = [
+        Vat(percent=24, start_date=datetime.date(year=2013, month=1, day=1)),
+        Vat(
+            percent=23,
+            start_date=datetime.date(year=2010, month=7, day=1),
+            end_date=datetime.date(year=2012, month=12, day=31),
+        ),
+    ]
+
+    assert (
+        get_payments_from_laske.get_vat_for_date(
+            vats, datetime.date(year=2020, month=1, day=1)
+        )
+        is vats[0]
+    )
+    assert (
+        get_payments_from_laske.get_vat_for_date(
+            vats, datetime.date(year=2012, month=12, day=31)
+        )
+        is vats[1]
+    )
+    assert (
+        get_payments_from_laske.get_vat_for_date(
+            vats, datetime.date(year=2010, month=6, day=30)
+        )
+        is None
+    )
+
+
+@pytest.mark.django_db
+def test_import_payments(import_dir, invoices):
+    Vat.objects.create(percent=24, start_date=datetime.date(year=2013, month=1, day=1))
+    payment_date = datetime.date(year=2020, month=1, day=31)
+    (invoice, vat_invoice) = invoices
+
+    _write_payments_file(
+        "1",
+        [
+            _payment_line(invoice.number, Decimal("100.00"), payment_date),
+            _payment_line(vat_invoice.number, Decimal("124.00"), payment_date),
+            _payment_line(9999999, Decimal("1.00"), payment_date),
+        ],
+    )
+    _write_payments_file(
+        "2",
+        [
+            # Same as in the first file
+            _payment_line(invoice.number, Decimal("100.00"), payment_date),
+            _payment_line(invoice.number, Decimal("24.00"), payment_date),
+        ],
+    )
+
+    call_command("get_payments_from_laske")
+
+    invoice.refresh_from_db()
+    vat_invoice.refresh_from_db()
+
+    assert sorted(invoice.payments.values_list("paid_amount", flat=True)) == [
+        Decimal("24.00"),
+        Decimal("100.00"),
+    ]
+    assert invoice.outstanding_amount == Decimal(0)
+    assert invoice.state == InvoiceState.PAID
+
+    assert list(vat_invoice.payments.values_list("paid_amount", flat=True)) == [
+        Decimal("100.00")
+    ]
+    assert vat_invoice.outstanding_amount == Decimal("24.00")
+
+    logs = LaskePaymentsLog.objects.order_by("filename")
+    assert [log.is_finished for log in logs] == [True, True]
+    assert [log.payments.count() for log in logs] == [2, 1]
+
+    # The created payments and the changed invoices are in the audit log
+    assert (
+        LogEntry.objects.get_for_model(InvoicePayment)
+        .filter(action=LogEntry.Action.CREATE)
+        .count()
+        == 3
+    )
+    assert (
+        LogEntry.objects.get_for_object(invoice)
+        .filter(action=LogEntry.Action.UPDATE)
+        .exists()
+    )
+
+
+@pytest.mark.django_db
+def test_import_payments_does_not_import_existing_payments(
+    import_dir, invoices, invoice_payment_factory
+):
+    payment_date = datetime.date(year=2020, month=1, day=31)
+    invoice = invoices[0]
+    invoice_payment_factory(
+        invoice=invoice, paid_amount=Decimal("100.00"), paid_date=payment_date
+    )
+
+    _write_payments_file(
+        "1", [_payment_line(invoice.number, Decimal("100.00"), payment_date)]
+    )
+
+    call_command("get_payments_from_laske")
+
+    assert invoice.payments.count() == 1
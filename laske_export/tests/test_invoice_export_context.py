@@ -0,0 +1,148 @@
+import datetime
+from decimal import Decimal
+
+import pytest
+
+from laske_export.document.invoice_export_context import InvoiceExportContext
+from laske_export.document.invoice_sales_order_adapter import InvoiceSalesOrderAdapter
+from laske_export.document.sales_order import SalesOrder
+from leasing.enums import ContactType, DueDatesType, RentCycle, TenantContactType
+from leasing.models import Lease, ReceivableType
+
+
+@pytest.fixture
+def invoices(
+    lease_factory,
+    rent_factory,
+    contact_factory,
+    tenant_factory,
+    tenant_contact_factory,
+    invoice_factory,
+    invoice_row_factory,
+):
+    lease = lease_factory(
+        type_id=1, municipality_id=1, district_id=5, notice_period_id=1
+    )
+    rent_factory(
+        lease=lease,
+        cycle=RentCycle.JANUARY_TO_DECEMBER,
+        due_dates_type=DueDatesType.FIXED,
+        due_dates_per_year=1,
+    )
+
+    tenant = tenant_factory(
+        lease=lease, share_numerator=1, share_denominator=1, reference="reference"
+    )
+    tenant_contact = contact_factory(
+        first_name="First", last_name="Tenant", type=ContactType.PERSON
+    )
+    billing_contact = contact_factory(
+        first_name="First", last_name="Billing", type=ContactType.PERSON
+    )
+    for (contact_type, contact) in [
+        (TenantContactType.TENANT, tenant_contact),
+        (TenantContactType.BILLING, billing_contact),
+    ]:
+        tenant_contact_factory(
+            type=contact_type,
+            tenant=tenant,
+            contact=contact,
+            start_date=datetime.date(year=2000, month=1, day=1),
+        )
+
+    receivable_type = ReceivableType.objects.get(pk=1)
+
+    invoices = []
+    for month in [1, 2]:
+        billing_period_start_date = datetime.date(year=2017, month=month, day=1)
+        billing_period_end_date = datetime.date(year=2017, month=month, day=28)
+
+        invoice = invoice_factory(
+            lease=lease,
+            total_amount=Decimal("123.45"),
+            billed_amount=Decimal("123.45"),
+            outstanding_amount=Decimal("123.45"),
+            recipient=tenant_contact,
+            billing_period_start_date=billing_period_start_date,
+            billing_period_end_date=billing_period_end_date,
+        )
+        invoice_row_factory(
+            invoice=invoice,
+            tenant=tenant,
+            receivable_type=receivable_type,
+            billing_period_start_date=billing_period_start_date,
+            billing_period_end_date=billing_period_end_date,
+            amount=Decimal("123.45"),
+        )
+        invoices.append(invoice)
+
+    return invoices
+
+
+def get_adapter_values(adapter):
+    return {
+        "bill_text": adapter.get_bill_text(),
+        "contact_to_bill": adapter.get_contact_to_bill(),
+        "po_number": adapter.get_po_number(),
+        "line_items": [
+            (x.material, x.net_price, x.line_text_l1, x.line_text_l2)
+            for x in adapter.get_line_items()
+        ],
+    }
+
+
+@pytest.mark.django_db
+def test_adapter_values_are_same_with_export_context(
+    django_db_setup, django_assert_num_queries, invoices
+):
+    receivable_type = ReceivableType.objects.get(pk=1)
+    export_context = InvoiceExportContext()
+    loaded_invoices = export_context.load_invoices(invoices)
+
+    assert [x.id for x in loaded_invoices] == [x.id for x in invoices]
+
+    for (invoice, loaded_invoice) in zip(invoices, loaded_invoices):
+        expected = get_adapter_values(
+            InvoiceSalesOrderAdapter(
+                invoice=invoice,
+                sales_order=SalesOrder(),
+                receivable_type_rent=receivable_type,
+            )
+        )
+
+        adapter = InvoiceSalesOrderAdapter(
+            invoice=loaded_invoice,
+            sales_order=SalesOrder(),
+            receivable_type_rent=receivable_type,
+            export_context=export_context,
+        )
+        # The yearly rent is the only thing that might need to be
+        # calculated, if it was not precalculated
+        adapter.get_year_rent()
+        with django_assert_num_queries(0):
+            result = get_adapter_values(adapter)
+
+        assert result == expected
+        assert result["contact_to_bill"].last_name == "Billing"
+
+
+@pytest.mark.django_db
+def test_export_context_calculates_yearly_rent_once_per_lease_and_year(
+    django_db_setup, monkeypatch, invoices
+):
+    calculated = []
+    calculate_rent_amount_for_year = Lease.calculate_rent_amount_for_year
+
+    def calculate_and_record(lease, year):
+        calculated.append((lease.id, year))
+        return calculate_rent_amount_for_year(lease, year)
+
+    monkeypatch.setattr(Lease, "calculate_rent_amount_for_year", calculate_and_record)
+    export_context = InvoiceExportContext()
+    lease = invoices[0].lease
+
+    first = export_context.get_yearly_rent(lease, 2017)
+    second = export_context.get_yearly_rent(lease, 2017)
+
+    assert first == second
+    assert calculated == [(lease.id, 2017)]
@@ -0,0 +1,118 @@
+import os
+
+import pytest
+from django.core.exceptions import ValidationError
+
+from laske_export.document.sales_order import (
+    LineItem,
+    OrderParty,
+    SalesOrder,
+    SalesOrderContainer,
+)
+from laske_export.document.sales_order_writer import SalesOrderContainerWriter
+
+
+def _create_sales_order(number):
+    sales_order = SalesOrder()
+    sales_order.sender_id = "ID340"
+    sales_order.order_type = "ZTY1"
+    sales_order.sales_org = "2800"
+    sales_order.distribution_channel = "10"
+    sales_order.division = "10"
+    sales_order.sales_office = "2826"
+    sales_order.reference = str(number)
+    sales_order.bill_text_l1 = "Vuokraus ajalle 1.1.2020 - 31.12.2020 & <muut>"
+
+    order_party = OrderParty()
+    order_party.customer_id = "010101-123{}".format(number % 10)
+    order_party.priority_name1 = "Testaaja Åke"
+    sales_order.order_party = order_party
+
+    line_item = LineItem()
+    line_item.net_price = "{}.00".format(number)
+    line_item.material = "L12345"
+    sales_order.line_items = [line_item]
+
+    return sales_order
+
+
+def _read_file(directory, filename):
+    with open(os.path.join(directory, filename), "rb") as fp:
+        return fp.read()
+
+
+def test_writer_output_is_identical_to_container(tmp_path):
+    sales_orders = [_create_sales_order(number) for number in range(1, 4)]
+
+    with SalesOrderContainerWriter(str(tmp_path), "export.xml") as writer:
+        for sales_order in sales_orders:
+            writer.write(sales_order)
+
+    sales_order_container = SalesOrderContainer()
+    sales_order_container.sales_orders = sales_orders
+
+    assert writer.filenames == ["export.xml"]
+    assert (
+        _read_file(str(tmp_path), "export.xml") == sales_order_container.to_xml_string()
+    )
+
+
+def test_writer_does_not_create_file_without_sales_orders(tmp_path):
+    with SalesOrderContainerWriter(str(tmp_path), "export.xml") as writer:
+        pass
+
+    assert writer.filenames == []
+    assert os.listdir(str(tmp_path)) == []
+
+
+def test_writer_does_not_write_invalid_sales_order(tmp_path):
+    invalid_sales_order = _create_sales_order(2)
+    invalid_sales_order.sales_org = "28000"
+
+    with SalesOrderContainerWriter(str(tmp_path), "export.xml") as writer:
+        writer.write(_create_sales_order(1))
+
+        with pytest.raises(ValidationError):
+            writer.write(invalid_sales_order)
+
+    sales_order_container = SalesOrderContainer()
+    sales_order_container.sales_orders = [_create_sales_order(1)]
+
+    assert (
+        _read_file(str(tmp_path), "export.xml") == sales_order_container.to_xml_string()
+    )
+
+
+def test_writer_splits_files_by_size(tmp_path):
+    sales_orders = [_create_sales_order(number) for number in range(1, 6)]
+
+    with SalesOrderContainerWriter(
+        str(tmp_path), "export.xml", max_file_size=1
+    ) as writer:
+        for sales_order in sales_orders:
+            writer.write(sales_order)
+
+    assert writer.filenames == [
+        "export.xml",
+        "export_2.xml",
+        "export_3.xml",
+        "export_4.xml",
+        "export_5.xml",
+    ]
+
+    for (filename, sales_order) in zip(writer.filenames, sales_orders):
+        sales_order_container = SalesOrderContainer()
+        sales_order_container.sales_orders = [sales_order]
+
+        assert (
+            _read_file(str(tmp_path), filename) == sales_order_container.to_xml_string()
+        )
+
+
+def test_writer_removes_files_on_error(tmp_path):
+    with pytest.raises(RuntimeError):
+        with SalesOrderContainerWriter(str(tmp_path), "export.xml") as writer:
+            writer.write(_create_sales_order(1))
+            raise RuntimeError()
+
+    assert os.listdir(str(tmp_path)) == []
@@ -0,0 +1,229 @@
+import datetime
+import os
+import zipfile
+from concurrent.futures import ProcessPoolExecutor
+from decimal import Decimal
+from itertools import groupby
+
+from django.db import connections
+from django.utils.translation import ugettext_lazy as _
+
+from leasing.models.invoice import calculate_penalty_interests
+
+
+class CollectionLetterError(Exception):
+    pass
+
+
+def interest_rates_to_strings(interest_rates):
+    result = []
+    sorted_interest_rates = sorted(interest_rates, key=lambda x: x[0])
+
+    if len(sorted_interest_rates) == 1:
+        return [
+            _("the penalty interest rate is {interest_percent} %").format(
+                interest_percent=sorted_interest_rates[0][2]
+            )
+        ]
+
+    # Squash adjacent equal penalty interest rates
+    squashed_interest_rates = []
+    for k, g in groupby(sorted_interest_rates, key=lambda x: x[2]):
+        rate_group = list(g)
+        if len(rate_group) == 1:
+            squashed_interest_rates.append(rate_group[0])
+        else:
+            squashed_interest_rates.append(
+                (rate_group[0][0], rate_group[-1][1], rate_group[0][2])
+            )
+
+    for i, interest_rate in enumerate(squashed_interest_rates):
+        if i == len(squashed_interest_rates) - 1:
+            # TODO: Might not be strictly accurate
+            result.append(
+                _(
+                    "The penalty interest rate starting on {start_date} is {interest_percent} %"
+                ).format(
+                    start_date=interest_rate[0].strftime("%d.%m.%Y"),
+                    interest_percent=interest_rate[2],
+                )
+            )
+        else:
+            result.append(
+                _(
+                    "The penalty interest rate between {start_date} and {end_date} is {interest_percent} %"
+                ).format(
+                    start_date=interest_rate[0].strftime("%d.%m.%Y"),
+                    end_date=interest_rate[1].strftime("%d.%m.%Y"),
+                    interest_percent=interest_rate[2],
+                )
+            )
+
+    return result
+
+
+def get_collection_letter_template_data(lease, tenants, invoices, today=None):
+    """Returns the data to render a collection letter template with
+
+    The invoices are dicts with the "invoice" and the "collection_charge"
+    keys like in CreateCollectionLetterDocumentSerializer."""
+    if today is None:
+        today = datetime.date.today()
+
+    debt = Decimal(0)
+    debt_strings = []
+    interest_strings = []
+    interest_total = Decimal(0)
+    interest_rates = set()
+    billing_addresses = []
+
+    for tenant in tenants:
+        billing_tenantcontact = tenant.get_billing_tenantcontacts(today, today).first()
+
+        if not billing_tenantcontact or not billing_tenantcontact.contact:
+            raise CollectionLetterError(
+                _("No billing info or billing info does not have a contact address")
+            )
+
+        billing_addresses.append(
+            "<w:br/>".join(
+                [
+                    str(billing_tenantcontact.contact),
+                    billing_tenantcontact.contact.address
+                    if billing_tenantcontact.contact.address
+                    else "",
+                    "{} {}".format(
+                        billing_tenantcontact.contact.postal_code
+                        if billing_tenantcontact.contact.postal_code
+                        else "",
+                        billing_tenantcontact.contact.city
+                        if billing_tenantcontact.contact.city
+                        else "",
+                    ),
+                ]
+            )
+        )
+
+    collection_charge_total = Decimal(0)
+
+    penalty_interests = calculate_penalty_interests(
+        [invoice_datum["invoice"] for invoice_datum in invoices]
+    )
+
+    for (invoice_datum, penalty_interest_data) in zip(invoices, penalty_interests):
+        invoice = invoice_datum["invoice"]
+
+        if penalty_interest_data["total_interest_amount"]:
+            interest_strings.append(
+                _(
+                    "Penalty interest for the invoice with the due date of {due_date} is {interest_amount} euroa"
+                ).format(
+                    due_date=invoice.due_date.strftime("%d.%m.%Y"),
+                    interest_amount=penalty_interest_data["total_interest_amount"],
+                )
+            )
+            interest_total += penalty_interest_data["total_interest_amount"]
+
+        invoice_debt_amount = invoice.outstanding_amount
+        debt += invoice_debt_amount
+
+        if invoice.billing_period_start_date and invoice.billing_period_end_date:
+            debt_strings.append(
+                _(
+                    "{due_date}, {debt_amount} euro (between {start_date} and {end_date})"
+                ).format(
+                    due_date=invoice.due_date.strftime("%d.%m.%Y"),
+                    debt_amount=invoice_debt_amount,
+                    start_date=invoice.billing_period_start_date.strftime("%d.%m.%Y"),
+                    end_date=invoice.billing_period_end_date.strftime("%d.%m.%Y"),
+                )
+            )
+        else:
+            debt_strings.append(
+                _("{due_date}, {debt_amount} euro").format(
+                    due_date=invoice.due_date.strftime("%d.%m.%Y"),
+                    debt_amount=invoice_debt_amount,
+                )
+            )
+
+        for interest_period in penalty_interest_data["interest_periods"]:
+            interest_rate_tuple = (
+                interest_period["start_date"],
+                interest_period["end_date"],
+                interest_period["penalty_rate"],
+            )
+
+            interest_rates.add(interest_rate_tuple)
+
+        collection_charge_total += Decimal(invoice_datum["collection_charge"])
+
+    grand_total = debt + interest_total + collection_charge_total
+
+    return {
+        "lease_details": "<w:br/>".join(lease.get_lease_info_text(tenants=tenants)),
+        "billing_address": "<w:br/><w:br/>".join(billing_addresses),
+        "lease_identifier": str(lease.identifier),
+        "current_date": today.strftime("%d.%m.%Y"),
+        "debts": "<w:br/>".join(debt_strings),
+        "total_debt": debt,
+        "interest_rates": "<w:br/>".join(interest_rates_to_strings(interest_rates)),
+        "interests": "<w:br/>".join(interest_strings),
+        "interest_total": interest_total,
+        "grand_total": grand_total,
+        "collection_charge_total": collection_charge_total,
+        "invoice_count": len(invoices),
+    }
+
+
+def get_collection_letter_filename(lease, template):
+    return "{}_{}".format(
+        str(lease.identifier),
+        os.path.basename(template.file.name.replace("_template", "")),
+    )
+
+
+def render_collection_letter(template_path, template_data):
+    """Renders the collection letter template in the path with the data
+
+    Used as the unit of work when rendering the collection letters in
+    worker processes. Doesn't need a database connection."""
+    # Imports lxml, docx, jinja2 etc.
+    from leasing.docx_template import get_compiled_docx_template
+
+    return get_compiled_docx_template(template_path).render(template_data)
+
+
+def write_collection_letters_to_zip(fp, template, letters, processes=1):
+    """Renders the collection letters and writes them to a zip archive
+
+    The letters are (filename, template data) tuples. The rendered letters
+    are written to the archive in order as soon as they are ready. Returns
+    the number of the letters written."""
+    letters = list(letters)
+    template_path = template.file.path
+    letter_count = 0
+
+    with zipfile.ZipFile(fp, "w", compression=zipfile.ZIP_DEFLATED) as archive:
+        if processes > 1 and len(letters) > 1:
+            # The worker processes must not share the database connections
+            # of this process.
+            connections.close_all()
+
+            with ProcessPoolExecutor(max_workers=processes) as executor:
+                documents = executor.map(
+                    render_collection_letter,
+                    [template_path] * len(letters),
+                    [template_data for (filename, template_data) in letters],
+                )
+
+                for ((filename, template_data), document) in zip(letters, documents):
+                    archive.writestr(filename, document)
+                    letter_count += 1
+        else:
+            for (filename, template_data) in letters:
+                archive.writestr(
+                    filename, render_collection_letter(template_path, template_data)
+                )
+                letter_count += 1
+
+    return letter_count
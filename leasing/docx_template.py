@@ -0,0 +1,71 @@
+import io
+import os
+
+from docxtpl import DocxTemplate
+from jinja2 import Environment
+
+
+class CompilingEnvironment(Environment):
+    """Jinja environment that compiles each template source only once
+
+    DocxTemplate compiles the XML of the document body, the headers and
+    the footers with from_string() on every render. The XML is the same
+    every time the same file is rendered, so the compiled templates can
+    be reused."""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.compiled_templates = {}
+
+    def from_string(self, source, globals=None, template_class=None):
+        if globals is not None or template_class is not None:
+            return super().from_string(
+                source, globals=globals, template_class=template_class
+            )
+
+        template = self.compiled_templates.get(source)
+        if template is None:
+            template = super().from_string(source)
+            self.compiled_templates[source] = template
+
+        return template
+
+
+class CompiledDocxTemplate:
+    """A docx template file read in memory with its compiled Jinja templates"""
+
+    def __init__(self, path):
+        with open(path, "rb") as fp:
+            self.content = fp.read()
+
+        self.jinja_env = CompilingEnvironment()
+
+    def render(self, data):
+        # DocxTemplate.render() modifies the document, so every render
+        # needs its own copy of the document.
+        doc = DocxTemplate(io.BytesIO(self.content))
+        doc.render(data, jinja_env=self.jinja_env)
+        output = io.BytesIO()
+        doc.save(output)
+
+        return output.getvalue()
+
+
+# Compiled templates by the file path. The values are
+# (modification time, CompiledDocxTemplate) tuples.
+_compiled_docx_templates = {}
+
+
+def get_compiled_docx_template(path):
+    """Returns the compiled template of the docx file in the path
+
+    The template is compiled again if the file has been modified since
+    it was compiled."""
+    mtime = os.stat(path).st_mtime_ns
+    cached = _compiled_docx_templates.get(path)
+
+    if cached is None or cached[0] != mtime:
+        cached = (mtime, CompiledDocxTemplate(path))
+        _compiled_docx_templates[path] = cached
+
+    return cached[1]
@@ -164,3 +164,16 @@ class AuditLogSearchForm(forms.Form):
         choices=(("lease", "Lease"), ("contact", "Contact")),
     )
     id = forms.IntegerField(label="Id", required=False)
+
+
+class JobRunLogTailForm(forms.Form):
+    kind = forms.ChoiceField(
+        label="Kind",
+        required=True,
+        choices=(("stdout", "stdout"), ("stderr", "stderr")),
+    )
+    since_line = forms.IntegerField(label="Since line", required=False, min_value=0)
+    since_number = forms.IntegerField(label="Since number", required=False, min_value=0)
+    timeout = forms.IntegerField(
+        label="Timeout", required=False, min_value=0, max_value=30
+    )
@@ -0,0 +1,150 @@
+import datetime
+import os
+from decimal import Decimal
+from itertools import groupby
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db.models import Q
+
+from leasing.collection_letter import (
+    CollectionLetterError,
+    get_collection_letter_filename,
+    get_collection_letter_template_data,
+    write_collection_letters_to_zip,
+)
+from leasing.enums import InvoiceState, TenantContactType
+from leasing.models import CollectionLetterTemplate, Invoice
+
+
+def get_collection_letter_tenants(lease, date):
+    """Returns the tenants of the lease that are tenants on the date"""
+    return list(
+        lease.tenants.filter(
+            Q(tenantcontact__end_date=None) | Q(tenantcontact__end_date__gte=date),
+            Q(tenantcontact__start_date=None) | Q(tenantcontact__start_date__lte=date),
+            tenantcontact__type=TenantContactType.TENANT,
+        ).distinct()
+    )
+
+
+class Command(BaseCommand):
+    help = (
+        "Creates collection letters of the overdue open invoices of the leases "
+        "to a zip file"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "template_id", type=int, help="Id of the collection letter template"
+        )
+        parser.add_argument("output", type=str, help="Path of the zip file to create")
+        parser.add_argument(
+            "--lease",
+            type=int,
+            action="append",
+            dest="lease_ids",
+            help="Create the letter only for this lease. Can be given multiple "
+            "times. Defaults to all of the leases with overdue open invoices.",
+        )
+        parser.add_argument(
+            "--collection-charge",
+            type=Decimal,
+            default=Decimal(0),
+            help="Collection charge per invoice",
+        )
+        parser.add_argument(
+            "--processes",
+            type=int,
+            default=1,
+            help="Render the letters in this many worker processes",
+        )
+
+    def get_overdue_invoices_by_lease(self, today, lease_ids=None):
+        invoices = Invoice.objects.filter(
+            state=InvoiceState.OPEN, outstanding_amount__gt=0, due_date__lt=today
+        )
+        if lease_ids:
+            invoices = invoices.filter(lease__in=lease_ids)
+
+        invoices = invoices.select_related(
+            "lease",
+            "lease__identifier",
+            "lease__identifier__type",
+            "lease__identifier__district",
+            "lease__identifier__municipality",
+        ).order_by("lease_id", "due_date")
+
+        invoices_by_lease = []
+        for (lease_id, lease_invoices) in groupby(
+            invoices, key=lambda invoice: invoice.lease_id
+        ):
+            lease_invoices = list(lease_invoices)
+            invoices_by_lease.append((lease_invoices[0].lease, lease_invoices))
+
+        return invoices_by_lease
+
+    def get_letters(self, template, invoices_by_lease, collection_charge, today):
+        for (lease, invoices) in invoices_by_lease:
+            try:
+                template_data = get_collection_letter_template_data(
+                    lease,
+                    get_collection_letter_tenants(lease, today),
+                    [
+                        {"invoice": invoice, "collection_charge": collection_charge}
+                        for invoice in invoices
+                    ],
+                    today=today,
+                )
+            except CollectionLetterError as err:
+                self.stdout.write(
+                    "Lease #{} {}: Skipped. {}".format(lease.id, lease.identifier, err)
+                )
+                continue
+
+            self.stdout.write(
+                "Lease #{} {}: {} invoices".format(
+                    lease.id, lease.identifier, len(invoices)
+                )
+            )
+
+            yield (get_collection_letter_filename(lease, template), template_data)
+
+    def handle(self, *args, **options):
+        today = datetime.date.today()
+
+        try:
+            template = CollectionLetterTemplate.objects.get(pk=options["template_id"])
+        except CollectionLetterTemplate.DoesNotExist:
+            raise CommandError(
+                "Collection letter template {} does not exist".format(
+                    options["template_id"]
+                )
+            )
+
+        invoices_by_lease = self.get_overdue_invoices_by_lease(
+            today, lease_ids=options["lease_ids"]
+        )
+
+        self.stdout.write(
+            "Creating collection letters for {} leases".format(len(invoices_by_lease))
+        )
+
+        letters = self.get_letters(
+            template, invoices_by_lease, options["collection_charge"], today
+        )
+
+        try:
+            with open(options["output"], "wb") as fp:
+                letter_count = write_collection_letters_to_zip(
+                    fp, template, letters, processes=options["processes"]
+                )
+        except Exception:
+            # Don't leave a partial zip file behind
+            os.remove(options["output"])
+            raise
+
+        self.stdout.write(
+            "{} collection letters written to {}".format(
+                letter_count, options["output"]
+            )
+        )
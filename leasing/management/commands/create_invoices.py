@@ -1,14 +1,185 @@
 import datetime
+from concurrent.futures import ProcessPoolExecutor
 from decimal import Decimal
+from itertools import chain
 
+from auditlog.diff import model_instance_diff
+from auditlog.models import LogEntry
 from dateutil.relativedelta import relativedelta
 from django.core.management.base import BaseCommand, CommandError
-from django.db import transaction
+from django.db import connections, transaction
 from django.db.models import Q
 
 from leasing.enums import InvoiceState
 from leasing.models import Invoice, Lease
 from leasing.models.invoice import InvoiceRow, InvoiceSet
+from leasing.models.rent import (
+    RENT_BILLING_PREFETCH_LOOKUPS,
+    RENT_CALCULATION_PREFETCH_LOOKUPS,
+    get_lease_rent_prefetch_lookups,
+)
+from leasing.models.utils import bulk_create_log_entries
+
+# Fields that are given as model instances in the invoice data
+INVOICE_DATA_RELATION_FIELDS = ("lease", "recipient", "invoiceset")
+
+
+def _get_matching_invoices(invoices, invoice_data):
+    """Finds the invoices that have the same values as the invoice data
+
+    Does the same matching in Python as the Invoice.objects.get(**invoice_data)
+    call in the one-by-one mode."""
+    lookup = {}
+    for field_name, value in invoice_data.items():
+        if field_name == "notes":
+            continue
+
+        if field_name in INVOICE_DATA_RELATION_FIELDS:
+            lookup["{}_id".format(field_name)] = value.id if value else None
+        else:
+            lookup[field_name] = value
+
+    return [
+        invoice
+        for invoice in invoices
+        if all(getattr(invoice, key) == value for key, value in lookup.items())
+    ]
+
+
+def _get_new_invoices_for_lease(
+    lease, existing_invoices, start_date, end_date, invoicing_date, output
+):
+    new_invoices = []
+    new_invoice_rows = []
+
+    period_rents = lease.determine_payable_rents_and_periods(start_date, end_date)
+
+    if not period_rents:
+        return new_invoices, new_invoice_rows
+
+    output.append("Lease #{} {}:".format(lease.id, lease.identifier))
+    for period_invoice_data in lease.calculate_invoices(period_rents):
+        invoiceset = None
+        if len(period_invoice_data) > 1:
+            (invoiceset, created) = InvoiceSet.objects.get_or_create(
+                lease=lease,
+                billing_period_start_date=period_invoice_data[0].get(
+                    "billing_period_start_date"
+                ),
+                billing_period_end_date=period_invoice_data[0].get(
+                    "billing_period_end_date"
+                ),
+            )
+            if not created:
+                output.append("  Invoiceset already exists.")
+
+        for invoice_data in period_invoice_data:
+            invoice_data.pop("explanations")
+            invoice_data.pop("calculation_result")
+            invoice_row_data = invoice_data.pop("rows")
+
+            invoice_data["generated"] = True
+            invoice_data["invoiceset"] = invoiceset
+
+            matching_invoices = _get_matching_invoices(existing_invoices, invoice_data)
+            if len(matching_invoices) > 1:
+                output.append(
+                    "Lease #{} {}: Warning! Found multiple invoices. Not creating a new invoice.".format(
+                        lease.id, lease.identifier
+                    )
+                )
+                continue
+            elif matching_invoices:
+                output.append(
+                    "Lease #{} {}: Invoice already exists. Invoice id {}. Number {}".format(
+                        lease.id,
+                        lease.identifier,
+                        matching_invoices[0].id,
+                        matching_invoices[0].number,
+                    )
+                )
+                continue
+
+            invoice_data["invoicing_date"] = invoicing_date
+            invoice_data["outstanding_amount"] = invoice_data["billed_amount"]
+            # ensure 0€ total invoices get marked as PAID
+            if invoice_data["outstanding_amount"] == Decimal(0):
+                invoice_data["state"] = InvoiceState.PAID
+
+            invoice = Invoice(**invoice_data)
+            new_invoices.append(invoice)
+            new_invoice_rows.extend(
+                [
+                    InvoiceRow(invoice=invoice, **invoice_row_datum)
+                    for invoice_row_datum in invoice_row_data
+                ]
+            )
+
+    output.append("")
+
+    return new_invoices, new_invoice_rows
+
+
+def create_invoices_for_leases(lease_ids, start_date, end_date, invoicing_date):
+    """Creates the invoices for the leases in one transaction
+
+    Used as the unit of work in the chunked mode of the command. Runs in
+    a worker process and returns the output lines, the number of created
+    invoices and the id of the last handled lease."""
+    output = []
+    new_invoices = []
+    new_invoice_rows = []
+
+    with transaction.atomic():
+        leases = (
+            Lease.objects.filter(id__in=lease_ids)
+            .select_related("type", "identifier")
+            .prefetch_related(
+                *get_lease_rent_prefetch_lookups(
+                    {
+                        **RENT_CALCULATION_PREFETCH_LOOKUPS,
+                        **RENT_BILLING_PREFETCH_LOOKUPS,
+                    }
+                )
+            )
+            .order_by("id")
+        )
+        existing_invoices = list(
+            Invoice.objects.filter(
+                lease__in=lease_ids,
+                generated=True,
+                due_date__gte=start_date,
+                due_date__lte=end_date,
+            )
+        )
+
+        for lease in leases:
+            (lease_invoices, lease_invoice_rows) = _get_new_invoices_for_lease(
+                lease, existing_invoices, start_date, end_date, invoicing_date, output
+            )
+            new_invoices.extend(lease_invoices)
+            new_invoice_rows.extend(lease_invoice_rows)
+
+        # The rows get the ids of their invoices when they are saved
+        Invoice.objects.bulk_create(new_invoices)
+        InvoiceRow.objects.bulk_create(new_invoice_rows)
+
+        bulk_create_log_entries(
+            LogEntry.Action.CREATE,
+            [
+                (instance, model_instance_diff(None, instance))
+                for instance in chain(new_invoices, new_invoice_rows)
+            ],
+        )
+
+    for invoice in new_invoices:
+        output.append(
+            "Lease #{}: Invoice created. Invoice id {}.".format(
+                invoice.lease_id, invoice.id
+            )
+        )
+
+    return output, len(new_invoices), max(lease_ids)
 
 
 class Command(BaseCommand):
@@ -18,6 +189,26 @@ class Command(BaseCommand):
         parser.add_argument(
             "override", nargs="?", type=bool
         )  # force run even if it's not the 1st of the month
+        parser.add_argument(
+            "--processes",
+            type=int,
+            default=0,
+            help="Create the invoices in chunks using this many worker processes. "
+            "By default the leases are handled one by one in this process.",
+        )
+        parser.add_argument(
+            "--chunk-size",
+            type=int,
+            default=100,
+            help="Number of leases handled in one transaction in the chunked mode",
+        )
+        parser.add_argument(
+            "--resume-after",
+            type=int,
+            default=None,
+            help="Skip the leases with an id up to this one (e.g. the last "
+            "lease id reported as committed before a crash)",
+        )
 
     def handle(self, *args, **options):  # noqa: C901 TODO
         override = options.get("override", False)
@@ -43,10 +234,24 @@ class Command(BaseCommand):
                 Q(start_date=None) | Q(start_date__lte=end_of_next_month)
             )
         )
+        if options.get("resume_after"):
+            leases = leases.filter(id__gt=options["resume_after"])
+
         self.stdout.write(
             "Found {} leases, starting to create invoices".format(leases.count())
         )
 
+        if options.get("processes"):
+            self.create_invoices_in_chunks(
+                list(leases.order_by("id").values_list("id", flat=True)),
+                start_of_next_month,
+                end_of_next_month,
+                today,
+                processes=options["processes"],
+                chunk_size=options["chunk_size"],
+            )
+            return
+
         invoice_count = 0
 
         for lease in leases:
@@ -131,3 +336,43 @@ class Command(BaseCommand):
             self.stdout.write("")
 
         self.stdout.write("{} invoices created".format(invoice_count))
+
+    def create_invoices_in_chunks(
+        self, lease_ids, start_date, end_date, invoicing_date, processes, chunk_size
+    ):
+        chunks = [
+            lease_ids[i : i + chunk_size] for i in range(0, len(lease_ids), chunk_size)
+        ]
+
+        # The worker processes must not share the database connections of
+        # this process. They will open their own connections when needed.
+        connections.close_all()
+
+        invoice_count = 0
+
+        with ProcessPoolExecutor(max_workers=processes) as executor:
+            futures = [
+                executor.submit(
+                    create_invoices_for_leases,
+                    chunk,
+                    start_date,
+                    end_date,
+                    invoicing_date,
+                )
+                for chunk in chunks
+            ]
+
+            # Report the chunks in order so that the last reported lease id
+            # can be used with --resume-after if the run is interrupted.
+            for future in futures:
+                (output, chunk_invoice_count, last_lease_id) = future.result()
+
+                for line in output:
+                    self.stdout.write(line)
+
+                invoice_count += chunk_invoice_count
+                self.stdout.write(
+                    "Chunk committed. Leases up to #{} handled.".format(last_lease_id)
+                )
+
+        self.stdout.write("{} invoices created".format(invoice_count))
@@ -0,0 +1,56 @@
+import logging
+import sys
+
+from django.core.management.base import BaseCommand
+
+from leasing.models import Rent
+from leasing.models.yearly_rent_amount import (
+    get_yearly_rent_amount_years,
+    process_yearly_rent_amount_refresh_queue,
+    queue_missing_yearly_rent_amounts,
+    queue_yearly_rent_amount_refresh,
+)
+
+logger = logging.getLogger(__name__)
+
+
+class Command(BaseCommand):
+    help = "Recalculates the yearly rent amounts of the changed rents"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--all",
+            action="store_true",
+            help="Recalculate the yearly rent amounts of all of the rents",
+        )
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=500,
+            help="Number of rents recalculated in one transaction",
+        )
+
+    def handle(self, *args, **options):
+        logging.basicConfig(level=logging.INFO, format="%(message)s", stream=sys.stdout)
+
+        verbosity = options.get("verbosity")
+        if verbosity == 0:
+            logger.setLevel(logging.WARNING)
+        elif verbosity >= 2:
+            logger.setLevel(logging.DEBUG)
+
+        years = get_yearly_rent_amount_years()
+        logger.info("Years {} - {}".format(years[0], years[-1]))
+
+        if options["all"]:
+            queue_yearly_rent_amount_refresh(
+                list(Rent.objects.values_list("id", flat=True))
+            )
+        else:
+            queue_missing_yearly_rent_amounts(years)
+
+        rent_count = process_yearly_rent_amount_refresh_queue(
+            batch_size=options["batch_size"]
+        )
+
+        logger.info("Recalculated yearly rent amounts of {} rents".format(rent_count))
@@ -2,7 +2,7 @@ from django.contrib.auth.models import Group, Permission
 from django.contrib.contenttypes.models import ContentType
 from django.core.management.base import BaseCommand
 
-from leasing.report.viewset import ENABLED_REPORTS
+from leasing.report.viewset import ENABLED_REPORTS, get_enabled_report_classes
 
 # 1 Selailija
 # 2 Valmistelija
@@ -28,6 +28,7 @@ DEFAULT_REPORT_PERMS = {
     "lease_statistic": [2, 3, 4, 5, 6, 7],
     "lease_statistic2": [2, 3, 4, 5, 6, 7],
     "open_invoices": [5, 6, 7],
+    "penalty_interest": [5, 6, 7],
     "rent_compare": [2, 3, 4, 5, 6, 7],
     "rent_forecast": [2, 3, 4, 5, 6, 7],
     "rent_type": [2, 3, 4, 5, 6, 7],
@@ -40,7 +41,7 @@ class Command(BaseCommand):
     help = "Sets report generation permissions for the predefined MVJ groups"
 
     def handle(self, *args, **options):
-        report_slugs = set([report_class.slug for report_class in ENABLED_REPORTS])
+        report_slugs = set(ENABLED_REPORTS.keys())
         default_report_perms_keys = set(DEFAULT_REPORT_PERMS.keys())
         difference = default_report_perms_keys.difference(report_slugs)
         if difference:
@@ -54,7 +55,7 @@ class Command(BaseCommand):
             app_label="leasing", model="report"
         )
 
-        for report_class in ENABLED_REPORTS:
+        for report_class in get_enabled_report_classes():
             if report_class.slug not in DEFAULT_REPORT_PERMS.keys():
                 self.stderr.write(
                     "Report {} ({}) not in DEFAULT_REPORT_PERMS. Skipping.".format(
@@ -0,0 +1,134 @@
+# Generated by Django 3.2.13 on 2026-10-17 10:12
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def forwards_func(apps, schema_editor):
+    """Queue all of the existing rents to be calculated"""
+    Rent = apps.get_model("leasing", "Rent")
+    YearlyRentAmountRefresh = apps.get_model("leasing", "YearlyRentAmountRefresh")
+
+    YearlyRentAmountRefresh.objects.bulk_create(
+        [
+            YearlyRentAmountRefresh(rent_id=rent_id)
+            for rent_id in Rent.objects.filter(deleted__isnull=True).values_list(
+                "id", flat=True
+            )
+        ],
+        batch_size=1000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("leasing", "0049_add_translations"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="YearlyRentAmount",
+            fields=[
+                (
+                    "id",
+                    models.AutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("year", models.PositiveSmallIntegerField(verbose_name="Year")),
+                (
+                    "amount",
+                    models.DecimalField(
+                        decimal_places=6, max_digits=16, verbose_name="Amount"
+                    ),
+                ),
+                (
+                    "modified_at",
+                    models.DateTimeField(auto_now=True, verbose_name="Time modified"),
+                ),
+                (
+                    "intended_use",
+                    models.ForeignKey(
+                        blank=True,
+                        null=True,
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="+",
+                        to="leasing.rentintendeduse",
+                        verbose_name="Intended use",
+                    ),
+                ),
+                (
+                    "lease",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="yearly_rent_amounts",
+                        to="leasing.lease",
+                        verbose_name="Lease",
+                    ),
+                ),
+                (
+                    "rent",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="yearly_rent_amounts",
+                        to="leasing.rent",
+                        verbose_name="Rent",
+                    ),
+                ),
+            ],
+            options={
+                "verbose_name": "Yearly rent amount",
+                "verbose_name_plural": "Yearly rent amounts",
+            },
+        ),
+        migrations.CreateModel(
+            name="YearlyRentAmountRefresh",
+            fields=[
+                (
+                    "id",
+                    models.AutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                (
+                    "created_at",
+                    models.DateTimeField(
+                        auto_now_add=True, verbose_name="Time created"
+                    ),
+                ),
+                (
+                    "rent",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="+",
+                        to="leasing.rent",
+                        verbose_name="Rent",
+                    ),
+                ),
+            ],
+            options={
+                "verbose_name": "Yearly rent amount refresh",
+                "verbose_name_plural": "Yearly rent amount refreshes",
+            },
+        ),
+        migrations.AddIndex(
+            model_name="yearlyrentamount",
+            index=models.Index(
+                fields=["lease", "year"], name="leasing_yea_lease_i_d1ce82_idx"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="yearlyrentamount",
+            index=models.Index(
+                fields=["rent", "year"], name="leasing_yea_rent_id_582c30_idx"
+            ),
+        ),
+        migrations.RunPython(forwards_func, migrations.RunPython.noop),
+    ]
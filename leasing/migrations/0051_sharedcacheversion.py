@@ -0,0 +1,36 @@
+# Generated by Django 3.2.13 on 2026-10-17 12:41
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("leasing", "0050_yearlyrentamount"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="SharedCacheVersion",
+            fields=[
+                (
+                    "id",
+                    models.AutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                (
+                    "key",
+                    models.CharField(max_length=255, unique=True, verbose_name="Key"),
+                ),
+                ("version", models.CharField(max_length=32, verbose_name="Version"),),
+            ],
+            options={
+                "verbose_name": "Shared cache version",
+                "verbose_name_plural": "Shared cache versions",
+            },
+        ),
+    ]
@@ -91,9 +91,11 @@ from .rent import (
     RentDueDate,
     RentIntendedUse,
 )
+from .shared_cache import SharedCacheVersion
 from .tenant import Tenant, TenantContact
 from .ui_data import UiData
 from .vat import Vat
+from .yearly_rent_amount import YearlyRentAmount, YearlyRentAmountRefresh
 
 __all__ = [
     "Area",
@@ -184,6 +186,7 @@ __all__ = [
     "RentDueDate",
     "RentIntendedUse",
     "ReservationProcedure",
+    "SharedCacheVersion",
     "SpecialProject",
     "StatisticalUse",
     "SupportiveHousing",
@@ -191,4 +194,6 @@ __all__ = [
     "TenantContact",
     "UiData",
     "Vat",
+    "YearlyRentAmount",
+    "YearlyRentAmountRefresh",
 ]
@@ -1,13 +1,11 @@
-import io
-
 from auditlog.registry import auditlog
 from django.db import models
 from django.utils.translation import pgettext_lazy
 from django.utils.translation import ugettext_lazy as _
-from docxtpl import DocxTemplate
 
 from field_permissions.registry import field_permissions
 from leasing.models.mixins import TimeStampedSafeDeleteModel
+from leasing.models.utils import SharedVersionCache
 from users.models import User
 
 
@@ -75,12 +73,10 @@ class CollectionLetterTemplate(TimeStampedSafeDeleteModel):
         return self.name
 
     def render_document(self, data):
-        doc = DocxTemplate(self.file.path)
-        doc.render(data)
-        output = io.BytesIO()
-        doc.save(output)
+        # Imports lxml, docx, jinja2 etc.
+        from leasing.docx_template import get_compiled_docx_template
 
-        return output.getvalue()
+        return get_compiled_docx_template(self.file.path).render(data)
 
 
 class CollectionNote(TimeStampedSafeDeleteModel):
@@ -183,6 +179,29 @@ class InterestRate(models.Model):
         return "{} - {}".format(self.start_date, self.end_date)
 
 
+class InterestRateTimeline(SharedVersionCache):
+    """Process-wide list of the interest rates ordered by the start date
+
+    The interest rates change only twice a year (see the import_interest_rate
+    command), but they are needed in every penalty interest calculation."""
+
+    version_key = "leasing:interest_rate"
+
+    def load(self):
+        return list(InterestRate.objects.order_by("start_date"))
+
+    def get_rates_starting_in_years(self, first_year, last_year):
+        """Returns the interest rates that start between the years (inclusive)"""
+        return [
+            interest_rate
+            for interest_rate in self.get_data()
+            if first_year <= interest_rate.start_date.year <= last_year
+        ]
+
+
+interest_rate_timeline = InterestRateTimeline()
+
+
 auditlog.register(CollectionLetter)
 auditlog.register(CollectionLetterTemplate)
 auditlog.register(CollectionNote)
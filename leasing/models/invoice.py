@@ -1,21 +1,30 @@
 import calendar
+import copy
 from decimal import ROUND_HALF_UP, Decimal
 from fractions import Fraction
 
+from auditlog.diff import model_instance_diff
+from auditlog.models import LogEntry
 from auditlog.registry import auditlog
 from django.db import models, transaction
-from django.db.models import Sum
+from django.db.models import Exists, OuterRef, Subquery, Sum, Value
+from django.db.models.functions import Coalesce
 from django.utils import timezone
 from django.utils.translation import pgettext_lazy
 from django.utils.translation import ugettext_lazy as _
 from enumfields import EnumField
+from safedelete.managers import SafeDeleteManager
 from sequences import get_next_value
 
 from field_permissions.registry import field_permissions
 from leasing.enums import InvoiceDeliveryMethod, InvoiceState, InvoiceType
 from leasing.models import Contact
 from leasing.models.mixins import TimeStampedSafeDeleteModel
-from leasing.models.utils import get_next_business_day, get_range_overlap
+from leasing.models.utils import (
+    bulk_create_log_entries,
+    get_next_business_days,
+    get_range_overlap,
+)
 
 
 class ReceivableType(models.Model):
@@ -176,6 +185,130 @@ class InvoiceSet(models.Model):
         return credit_invoiceset
 
 
+def _get_sum_subquery(queryset, group_by, field_name):
+    return Coalesce(
+        Subquery(
+            queryset.order_by()
+            .values(group_by)
+            .annotate(sum=Sum(field_name))
+            .values("sum")
+        ),
+        Value(Decimal(0)),
+        output_field=models.DecimalField(max_digits=12, decimal_places=2),
+    )
+
+
+def get_invoice_amount_annotations():
+    """Returns the annotations of the sums that the amounts of an invoice are
+    calculated from
+
+    The sums exclude the deleted rows, payments and credit notes like the
+    default managers do. See Invoice.set_amounts."""
+    rows = InvoiceRow.objects.filter(deleted__isnull=True)
+
+    return {
+        "rows_sum": _get_sum_subquery(
+            rows.filter(invoice=OuterRef("pk")), "invoice", "amount"
+        ),
+        "invoiceset_rows_sum": _get_sum_subquery(
+            rows.filter(
+                invoice__invoiceset=OuterRef("invoiceset"),
+                invoice__type=OuterRef("type"),
+                invoice__deleted__isnull=True,
+            ),
+            "invoice__invoiceset",
+            "amount",
+        ),
+        "payments_total": _get_sum_subquery(
+            InvoicePayment.objects.filter(invoice=OuterRef("pk"), deleted__isnull=True),
+            "invoice",
+            "paid_amount",
+        ),
+        "total_credited_amount": _get_sum_subquery(
+            rows.filter(
+                invoice__credited_invoice=OuterRef("pk"), invoice__deleted__isnull=True,
+            ),
+            "invoice__credited_invoice",
+            "amount",
+        ),
+    }
+
+
+INVOICE_AMOUNT_ANNOTATION_NAMES = (
+    "rows_sum",
+    "invoiceset_rows_sum",
+    "payments_total",
+    "total_credited_amount",
+)
+
+
+class InvoiceManager(SafeDeleteManager):
+    def recalculate_amounts(self, ids):
+        """Updates the amounts and the states of the invoices
+
+        Does the same as calling update_amounts for each of the invoices,
+        but with a fixed number of queries and one audit log entry per
+        changed invoice. Returns the number of the updated invoices."""
+        invoices = list(
+            self.get_queryset()
+            .filter(id__in=ids)
+            .annotate(**get_invoice_amount_annotations())
+        )
+        if not invoices:
+            return 0
+
+        now = timezone.now()
+        old_invoices = {}
+        for invoice in invoices:
+            old_invoices[invoice.id] = copy.copy(invoice)
+            invoice.set_amounts(
+                **{
+                    name: getattr(invoice, name)
+                    for name in INVOICE_AMOUNT_ANNOTATION_NAMES
+                }
+            )
+            invoice.modified_at = now
+
+        invoice_ids = [invoice.id for invoice in invoices]
+        same_type_invoices_in_invoiceset = self.get_queryset().filter(
+            id__in=invoice_ids,
+            invoiceset=OuterRef("invoiceset"),
+            type=OuterRef("type"),
+        )
+
+        with transaction.atomic():
+            self.bulk_update(
+                invoices,
+                [
+                    "billed_amount",
+                    "total_amount",
+                    "outstanding_amount",
+                    "state",
+                    "modified_at",
+                ],
+                batch_size=1000,
+            )
+
+            # bulk_update doesn't send the signals that the audit log uses
+            instance_changes = []
+            for invoice in invoices:
+                changes = model_instance_diff(old_invoices[invoice.id], invoice)
+                if changes and set(changes) - {"modified_at"}:
+                    instance_changes.append((invoice, changes))
+
+            bulk_create_log_entries(LogEntry.Action.UPDATE, instance_changes)
+
+            # Update the total amount to the other same type invoices in the
+            # invoicesets of the invoices
+            self.get_queryset().filter(
+                Exists(same_type_invoices_in_invoiceset), deleted__isnull=True
+            ).exclude(id__in=invoice_ids).update(
+                total_amount=get_invoice_amount_annotations()["invoiceset_rows_sum"]
+            )
+
+        return len(invoices)
+
+
 class Invoice(TimeStampedSafeDeleteModel):
     """
     In Finnish: Lasku
@@ -332,6 +465,8 @@ class Invoice(TimeStampedSafeDeleteModel):
 
     recursive_get_related_skip_relations = ["lease"]
 
+    objects = InvoiceManager()
+
     class Meta:
         verbose_name = pgettext_lazy("Model name", "Invoice")
         verbose_name_plural = pgettext_lazy("Model name", "Invoices")
@@ -352,46 +487,37 @@ class Invoice(TimeStampedSafeDeleteModel):
                 other_invoice.update_amounts()
 
     def update_amounts(self):
-        rows_sum = self.rows.aggregate(sum=Sum("amount"))["sum"]
-        if not rows_sum:
-            rows_sum = Decimal(0)
-
-        self.billed_amount = rows_sum
-
-        if not self.invoiceset:
-            self.total_amount = rows_sum
-        else:
-            # Sum amounts from all of the rows in the same type of invoices in this invoiceset
-            invoiceset_rows_sum = InvoiceRow.objects.filter(
-                invoice__invoiceset=self.invoiceset,
-                invoice__type=self.type,
-                invoice__deleted__isnull=True,
-                deleted__isnull=True,
-            ).aggregate(sum=Sum("amount"))["sum"]
-            if not invoiceset_rows_sum:
-                invoiceset_rows_sum = Decimal(0)
+        amounts = (
+            Invoice.all_objects.filter(pk=self.pk)
+            .annotate(**get_invoice_amount_annotations())
+            .values(*INVOICE_AMOUNT_ANNOTATION_NAMES)
+            .get()
+        )
+        self.set_amounts(**amounts)
 
+        if self.invoiceset:
             # Update sum to all of the same type invoices in this invoiceset
             self.invoiceset.invoices.filter(
                 type=self.type, deleted__isnull=True
-            ).exclude(id=self.id).update(total_amount=invoiceset_rows_sum)
+            ).exclude(id=self.id).update(total_amount=self.total_amount)
 
-            # Need to set self total_amount separately because the
-            # total_amount is not automatically refreshed from the
-            # database
-            self.total_amount = invoiceset_rows_sum
+        self.save()
 
-        payments_total = self.payments.aggregate(sum=Sum("paid_amount"))["sum"]
-        if not payments_total:
-            payments_total = Decimal(0)
+    def set_amounts(
+        self, rows_sum, invoiceset_rows_sum, payments_total, total_credited_amount
+    ):
+        """Sets the amounts and the state of the invoice from the sums of its
+        rows, payments and credit notes
 
-        # Aggregating like this ignores the manager (i.e. includes deleted rows which we don't want):
-        # total_credited_amount = self.credit_invoices.aggregate(sum=Sum("rows__amount"))["sum"]
-        # ... so we have to iterate the rows and tally the sum by hand
-        total_credited_amount = Decimal(0)
-        for credit_inv in self.credit_invoices.all():
-            for row in credit_inv.rows.all():
-                total_credited_amount += row.amount
+        See get_invoice_amount_annotations for how the sums are calculated."""
+        self.billed_amount = rows_sum
+
+        if not self.invoiceset_id:
+            self.total_amount = rows_sum
+        else:
+            # The total amount is the sum of the rows of all of the same type
+            # of invoices in the invoiceset
+            self.total_amount = invoiceset_rows_sum
 
         collection_charge = Decimal(0)
         if self.collection_charge:
@@ -412,8 +538,6 @@ class Invoice(TimeStampedSafeDeleteModel):
         elif self.type == InvoiceType.CHARGE and self.outstanding_amount == Decimal(0):
             self.state = InvoiceState.PAID
 
-        self.save()
-
     def create_credit_invoice(  # noqa C901 TODO
         self, row_ids=None, amount=None, receivable_type=None, notes=""
     ):
@@ -544,75 +668,7 @@ class Invoice(TimeStampedSafeDeleteModel):
         return fraction
 
     def calculate_penalty_interest(self, calculation_date=None):
-        from .debt_collection import InterestRate
-
-        penalty_interest_data = {
-            "interest_start_date": None,
-            "interest_end_date": None,
-            "outstanding_amount": self.outstanding_amount,
-            "total_interest_amount": Decimal(0),
-            "interest_periods": [],
-        }
-        if not calculation_date:
-            calculation_date = timezone.now().date()
-
-        if not self.outstanding_amount:
-            return penalty_interest_data
-
-        interest_start_date = get_next_business_day(self.due_date)
-        interest_end_date = calculation_date
-
-        penalty_interest_data["interest_start_date"] = interest_start_date
-        penalty_interest_data["interest_end_date"] = interest_end_date
-
-        years = range(interest_start_date.year, interest_end_date.year + 1)
-
-        total_interest_amount = Decimal(0)
-
-        for interest_rate in InterestRate.objects.filter(
-            start_date__year__in=years
-        ).order_by("start_date"):
-            overlap = get_range_overlap(
-                interest_rate.start_date,
-                interest_rate.end_date,
-                interest_start_date,
-                interest_end_date,
-            )
-            if not overlap or not overlap[0] or not overlap[1]:
-                continue
-
-            days_between = (overlap[1] - overlap[0]).days + 1  # Inclusive
-
-            # TODO: which divisor to use
-            # divisor = 360
-            if calendar.isleap(interest_rate.start_date.year):
-                divisor = 366
-            else:
-                divisor = 365
-
-            interest_amount = (
-                self.outstanding_amount
-                * (interest_rate.penalty_rate / 100)
-                / divisor
-                * days_between
-            )
-
-            penalty_interest_data["interest_periods"].append(
-                {
-                    "start_date": overlap[0],
-                    "end_date": overlap[1],
-                    "penalty_rate": interest_rate.penalty_rate,
-                    "interest_amount": interest_amount,
-                }
-            )
-
-            total_interest_amount += interest_amount
-
-        penalty_interest_data["total_interest_amount"] = total_interest_amount.quantize(
-            Decimal(".01"), rounding=ROUND_HALF_UP
-        )
-
-        return penalty_interest_data
+        return calculate_penalty_interests([self], calculation_date=calculation_date)[0]
 
     def is_same_recipient_and_tenants(self, invoice):
         """Checks that the self and dict of invoice data have the same recipients
@@ -660,6 +716,110 @@ class Invoice(TimeStampedSafeDeleteModel):
         return self.number
 
 
+def _get_penalty_interest_periods(interest_start_date, interest_end_date):
+    """Returns the (start date, end date, penalty rate, divisor, days) of
+    the interest rate periods between the dates"""
+    from .debt_collection import interest_rate_timeline
+
+    periods = []
+
+    for interest_rate in interest_rate_timeline.get_rates_starting_in_years(
+        interest_start_date.year, interest_end_date.year
+    ):
+        overlap = get_range_overlap(
+            interest_rate.start_date,
+            interest_rate.end_date,
+            interest_start_date,
+            interest_end_date,
+        )
+        if not overlap or not overlap[0] or not overlap[1]:
+            continue
+
+        days_between = (overlap[1] - overlap[0]).days + 1  # Inclusive
+
+        # TODO: which divisor to use
+        # divisor = 360
+        if calendar.isleap(interest_rate.start_date.year):
+            divisor = 366
+        else:
+            divisor = 365
+
+        periods.append(
+            (overlap[0], overlap[1], interest_rate.penalty_rate, divisor, days_between)
+        )
+
+    return periods
+
+
+def calculate_penalty_interests(invoices, calculation_date=None):
+    """Calculates the penalty interests of the outstanding amounts of the
+    invoices until the calculation date
+
+    Returns the penalty interest data of the invoices in the same order.
+    The interest rates and the bank holidays are read from the process-wide
+    caches, and the interest periods are resolved only once per interest
+    start date, so the cost per invoice is only the interest arithmetic."""
+    if not calculation_date:
+        calculation_date = timezone.now().date()
+
+    due_dates = [invoice.due_date for invoice in invoices if invoice.outstanding_amount]
+    interest_start_dates = dict(zip(due_dates, get_next_business_days(due_dates)))
+    periods_by_start_date = {}
+
+    results = []
+    for invoice in invoices:
+        penalty_interest_data = {
+            "interest_start_date": None,
+            "interest_end_date": None,
+            "outstanding_amount": invoice.outstanding_amount,
+            "total_interest_amount": Decimal(0),
+            "interest_periods": [],
+        }
+        results.append(penalty_interest_data)
+
+        if not invoice.outstanding_amount:
+            continue
+
+        interest_start_date = interest_start_dates[invoice.due_date]
+        interest_end_date = calculation_date
+
+        penalty_interest_data["interest_start_date"] = interest_start_date
+        penalty_interest_data["interest_end_date"] = interest_end_date
+
+        if interest_start_date not in periods_by_start_date:
+            periods_by_start_date[interest_start_date] = _get_penalty_interest_periods(
+                interest_start_date, interest_end_date
+            )
+
+        periods = periods_by_start_date[interest_start_date]
+        total_interest_amount = Decimal(0)
+
+        for (start_date, end_date, penalty_rate, divisor, days_between) in periods:
+            interest_amount = (
+                invoice.outstanding_amount
+                * (penalty_rate / 100)
+                / divisor
+                * days_between
+            )
+
+            penalty_interest_data["interest_periods"].append(
+                {
+                    "start_date": start_date,
+                    "end_date": end_date,
+                    "penalty_rate": penalty_rate,
+                    "interest_amount": interest_amount,
+                }
+            )
+
+            total_interest_amount += interest_amount
+
+        penalty_interest_data["total_interest_amount"] = total_interest_amount.quantize(
+            Decimal(".01"), rounding=ROUND_HALF_UP
+        )
+
+    return results
+
+
 class InvoiceNote(TimeStampedSafeDeleteModel):
     """
     In Finnish: Laskun tiedote
@@ -34,6 +34,12 @@ from leasing.models.mixins import (
     TimeStampedModel,
     TimeStampedSafeDeleteModel,
 )
+from leasing.models.rent import (
+    RENT_BILLING_PREFETCH_LOOKUPS,
+    RENT_CALCULATION_PREFETCH_LOOKUPS,
+    BillingPeriodCalendar,
+    rent_calculation_data,
+)
 from leasing.models.utils import (
     fix_amount_for_overlap,
     get_range_overlap_and_remainder,
@@ -855,10 +861,18 @@ class Lease(TimeStampedSafeDeleteModel):
             date_range_start=start_date, date_range_end=end_date
         )
 
-        for rent in self.get_active_rents_on_period(start_date, end_date):
-            calculation_result.combine(
-                rent.get_amount_for_date_range(start_date, end_date)
-            )
+        # Filter the active rents in Python so that prefetched rents are used
+        rents = [
+            rent
+            for rent in self.rents.all()
+            if rent.is_active_on_period(start_date, end_date)
+        ]
+
+        with rent_calculation_data(rents):
+            for rent in rents:
+                calculation_result.combine(
+                    rent.get_amount_for_date_range(start_date, end_date)
+                )
 
         return calculation_result
 
@@ -870,7 +884,7 @@ class Lease(TimeStampedSafeDeleteModel):
             first_day_of_year, last_day_of_year
         )
 
-    def determine_payable_rents_and_periods(  # noqa: TODO
+    def determine_payable_rents_and_periods(
         self, start_date, end_date, dry_run=False, ignore_invoicing_date_after=None
     ):
         """Determines billing periods and rent amounts for them
@@ -885,7 +899,29 @@ class Lease(TimeStampedSafeDeleteModel):
         calculation to only for the due dates that would be invoiced
         before the provided date.
         """
-        lease_due_dates = self.get_due_dates_for_period(start_date, end_date)
+        rents = list(self.rents.all())
+
+        # Load the rows needed in the rent calculations once for all of the
+        # due dates instead of querying them separately for every billing period
+        with rent_calculation_data(
+            rents,
+            {**RENT_CALCULATION_PREFETCH_LOOKUPS, **RENT_BILLING_PREFETCH_LOOKUPS},
+        ):
+            return self._determine_payable_rents_and_periods(
+                rents,
+                start_date,
+                end_date,
+                dry_run=dry_run,
+                ignore_invoicing_date_after=ignore_invoicing_date_after,
+            )
+
+    def _determine_payable_rents_and_periods(  # noqa: TODO
+        self, rents, start_date, end_date, dry_run, ignore_invoicing_date_after
+    ):
+        lease_due_dates = set()
+        for rent in rents:
+            lease_due_dates.update(rent.get_due_dates_for_period(start_date, end_date))
+        lease_due_dates = sorted(lease_due_dates)
 
         if not lease_due_dates:
             # TODO
@@ -893,6 +929,8 @@ class Lease(TimeStampedSafeDeleteModel):
 
         amounts_for_billing_periods = {}
 
+        billing_period_calendar = BillingPeriodCalendar(rents)
+
         for lease_due_date in lease_due_dates:
             if ignore_invoicing_date_after:
                 due_date_invoicing_date = lease_due_date - relativedelta(
@@ -903,8 +941,10 @@ class Lease(TimeStampedSafeDeleteModel):
                 if due_date_invoicing_date > ignore_invoicing_date_after:
                     continue
 
-            for rent in self.rents.all():
-                billing_period = rent.get_billing_period_from_due_date(lease_due_date)
+            for rent in rents:
+                billing_period = billing_period_calendar.get_billing_period_from_due_date(
+                    rent, lease_due_date
+                )
 
                 if not billing_period:
                     continue
@@ -939,7 +979,7 @@ class Lease(TimeStampedSafeDeleteModel):
                     *billing_period, explain=True, dry_run=dry_run
                 )
 
-                if self.is_the_last_billing_period(billing_period):
+                if billing_period_calendar.is_the_last_billing_period(billing_period):
                     amounts_for_billing_periods[billing_period][
                         "last_billing_period"
                     ] = True
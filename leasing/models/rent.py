@@ -1,12 +1,14 @@
 import datetime
 import logging
+from bisect import bisect_right
+from contextlib import contextmanager
 from decimal import ROUND_HALF_UP, Decimal
 
 from auditlog.registry import auditlog
 from dateutil.relativedelta import relativedelta
 from django.core.validators import MaxValueValidator, MinValueValidator
 from django.db import models
-from django.db.models import Q
+from django.db.models import prefetch_related_objects
 from django.utils.translation import pgettext_lazy
 from django.utils.translation import ugettext_lazy as _
 from enumfields import EnumField
@@ -35,6 +37,8 @@ from leasing.enums import (
 )
 from leasing.models.utils import (
     DayMonth,
+    SharedVersionCache,
+    filter_items_by_date_range,
     fix_amount_for_overlap,
     get_billing_periods_for_year,
     get_date_range_amount_from_monthly_amount,
@@ -83,6 +87,129 @@ FIXED_DUE_DATES = {
 
 logger = logging.getLogger(__name__)
 
+# Relations of Rent that are needed when calculating the rent amount
+RENT_CALCULATION_PREFETCH_LOOKUPS = {
+    "fixed_initial_year_rents": ["fixed_initial_year_rents__intended_use"],
+    "contract_rents": ["contract_rents__intended_use"],
+    "rent_adjustments": ["rent_adjustments__intended_use"],
+}
+
+# Relations of Rent that are needed when determining the billing periods
+RENT_BILLING_PREFETCH_LOOKUPS = {"due_dates": []}
+
+
+def get_lease_rent_prefetch_lookups(lookups=None):
+    """Returns the lookups for prefetching the rents of leases and the given
+    relations of the rents in a Lease queryset"""
+    if lookups is None:
+        lookups = RENT_CALCULATION_PREFETCH_LOOKUPS
+
+    prefetch_lookups = ["rents"]
+    for relation_name, sub_lookups in lookups.items():
+        prefetch_lookups.extend(
+            ["rents__{}".format(lookup) for lookup in [relation_name] + sub_lookups]
+        )
+
+    return prefetch_lookups
+
+
+@contextmanager
+def rent_calculation_data(rents, lookups=None):
+    """Loads the rows needed in the rent calculation for all of the rents at once
+
+    Relations that are already prefetched (e.g. by the queryset the rents
+    came from) are used as is. The relations loaded here are dropped from
+    the rents when the context exits so that later calculations on the same
+    instances don't use stale data."""
+    if lookups is None:
+        lookups = RENT_CALCULATION_PREFETCH_LOOKUPS
+
+    rents = [rent for rent in rents if rent is not None]
+    loaded = []
+
+    for relation_name, sub_lookups in lookups.items():
+        unprefetched_rents = [
+            rent
+            for rent in rents
+            if relation_name not in getattr(rent, "_prefetched_objects_cache", {})
+        ]
+        if not unprefetched_rents:
+            continue
+
+        prefetch_related_objects(unprefetched_rents, relation_name, *sub_lookups)
+        loaded.extend([(rent, relation_name) for rent in unprefetched_rents])
+
+    try:
+        yield rents
+    finally:
+        for rent, relation_name in loaded:
+            rent._prefetched_objects_cache.pop(relation_name, None)
+
+
+class BillingPeriodCalendar:
+    """Memoised billing periods of the rents of a lease
+
+    Meant to be built once per calculation run so that the billing periods
+    of every rent are determined only once per year instead of once per
+    due date."""
+
+    def __init__(self, rents):
+        self.rents = list(rents)
+        self._billing_periods_by_due_date = {}
+        self._billing_periods_for_year = {}
+
+    def _get_billing_periods_by_due_date(self, rent, year):
+        key = (rent.pk, year)
+        if key not in self._billing_periods_by_due_date:
+            self._billing_periods_by_due_date[
+                key
+            ] = rent.get_billing_periods_by_due_date_for_year(year)
+
+        return self._billing_periods_by_due_date[key]
+
+    def get_billing_period_from_due_date(self, rent, due_date):
+        if not due_date:
+            return None
+
+        return self._get_billing_periods_by_due_date(rent, due_date.year).get(due_date)
+
+    def get_all_billing_periods_for_year(self, year):
+        """Same as Lease.get_all_billing_periods_for_year"""
+        if year not in self._billing_periods_for_year:
+            date_range_start = datetime.date(year, 1, 1)
+            date_range_end = datetime.date(year, 12, 31)
+
+            billing_periods = set()
+            for rent in self.rents:
+                if not rent.is_active_on_period(date_range_start, date_range_end):
+                    continue
+
+                billing_periods_by_due_date = self._get_billing_periods_by_due_date(
+                    rent, year
+                )
+                billing_periods.update(
+                    [
+                        billing_periods_by_due_date.get(due_date)
+                        for due_date in rent.get_due_dates_for_period(
+                            date_range_start, date_range_end
+                        )
+                    ]
+                )
+
+            self._billing_periods_for_year[year] = sorted(billing_periods)
+
+        return self._billing_periods_for_year[year]
+
+    def is_the_last_billing_period(self, billing_period):
+        """Same as Lease.is_the_last_billing_period"""
+        billing_periods = self.get_all_billing_periods_for_year(billing_period[0].year)
+
+        return bool(billing_periods) and billing_periods[-1] == billing_period
+
+
+def _intended_use_matches(item, intended_use):
+    return item.intended_use_id == (intended_use.id if intended_use else None)
+
 
 class RentIntendedUse(NameModel):
     """
@@ -297,19 +424,23 @@ class Rent(TimeStampedSafeDeleteModel):
     def get_intended_uses_for_date_range(self, date_range_start, date_range_end):
         intended_uses = set()
 
-        range_filtering = Q(
-            Q(Q(end_date=None) | Q(end_date__gte=date_range_start))
-            & Q(Q(start_date=None) | Q(start_date__lte=date_range_end))
-        )
-
         intended_uses.update(
             [
                 fiyr.intended_use
-                for fiyr in self.fixed_initial_year_rents.filter(range_filtering)
+                for fiyr in filter_items_by_date_range(
+                    self.fixed_initial_year_rents.all(),
+                    date_range_start,
+                    date_range_end,
+                )
             ]
         )
         intended_uses.update(
-            [cr.intended_use for cr in self.contract_rents.filter(range_filtering)]
+            [
+                cr.intended_use
+                for cr in filter_items_by_date_range(
+                    self.contract_rents.all(), date_range_start, date_range_end
+                )
+            ]
         )
 
         return intended_uses
@@ -392,13 +523,13 @@ class Rent(TimeStampedSafeDeleteModel):
     def fixed_initial_year_rent_amount_for_date_range(
         self, intended_use, date_range_start, date_range_end, dry_run=False
     ):
-        fixed_initial_year_rents = self.fixed_initial_year_rents.filter(
-            Q(
-                Q(Q(end_date=None) | Q(end_date__gte=date_range_start))
-                & Q(Q(start_date=None) | Q(start_date__lte=date_range_end))
+        fixed_initial_year_rents = [
+            fiyr
+            for fiyr in filter_items_by_date_range(
+                self.fixed_initial_year_rents.all(), date_range_start, date_range_end
             )
-            & Q(intended_use=intended_use)
-        )
+            if _intended_use_matches(fiyr, intended_use)
+        ]
 
         calculation_result = FixedInitialYearRentCalculationResult(
             date_range_start=date_range_start, date_range_end=date_range_end
@@ -442,13 +573,13 @@ class Rent(TimeStampedSafeDeleteModel):
             date_range_start=date_range_start, date_range_end=date_range_end
         )
 
-        contract_rents = self.contract_rents.filter(
-            Q(
-                Q(Q(end_date=None) | Q(end_date__gte=date_range_start))
-                & Q(Q(start_date=None) | Q(start_date__lte=date_range_end))
+        contract_rents = [
+            contract_rent
+            for contract_rent in filter_items_by_date_range(
+                self.contract_rents.all(), date_range_start, date_range_end
             )
-            & Q(intended_use=intended_use)
-        )
+            if _intended_use_matches(contract_rent, intended_use)
+        ]
 
         for contract_rent in contract_rents:
             (contract_overlap, _remainder) = get_range_overlap_and_remainder(
@@ -563,46 +694,49 @@ class Rent(TimeStampedSafeDeleteModel):
             date_range_start, date_range_end
         )
 
-        # Calculate rent separately for every intended use
-        for intended_use in self.get_intended_uses_for_date_range(
-            clamped_date_range_start, clamped_date_range_end
-        ):
-            fixed_initial_year_rent_calculation_result = self.fixed_initial_year_rent_amount_for_date_range(
-                intended_use,
-                clamped_date_range_start,
-                clamped_date_range_end,
-                dry_run=dry_run,
-            )
+        # Load the rows needed in the calculation only once instead of
+        # querying them again for every intended use and date range
+        with rent_calculation_data([self]):
+            # Calculate rent separately for every intended use
+            for intended_use in self.get_intended_uses_for_date_range(
+                clamped_date_range_start, clamped_date_range_end
+            ):
+                fixed_initial_year_rent_calculation_result = self.fixed_initial_year_rent_amount_for_date_range(
+                    intended_use,
+                    clamped_date_range_start,
+                    clamped_date_range_end,
+                    dry_run=dry_run,
+                )
 
-            calculation_result.combine(fixed_initial_year_rent_calculation_result)
+                calculation_result.combine(fixed_initial_year_rent_calculation_result)
 
-            # Fixed initial year rent overrides contract rent. Therefore
-            # if there are fixed initial year rents for the whole date range,
-            # there is no need to calculate the contract rents.
-            if fixed_initial_year_rent_calculation_result.is_range_fully_applied():
-                continue
+                # Fixed initial year rent overrides contract rent. Therefore
+                # if there are fixed initial year rents for the whole date range,
+                # there is no need to calculate the contract rents.
+                if fixed_initial_year_rent_calculation_result.is_range_fully_applied():
+                    continue
 
-            # Otherwise calculate contract rents for the remaining date ranges
-            # or for the whole range
-            if fixed_initial_year_rent_calculation_result.applied_ranges:
-                date_ranges = (
-                    fixed_initial_year_rent_calculation_result.remaining_ranges
-                )
-            else:
-                date_ranges = [(clamped_date_range_start, clamped_date_range_end)]
+                # Otherwise calculate contract rents for the remaining date ranges
+                # or for the whole range
+                if fixed_initial_year_rent_calculation_result.applied_ranges:
+                    date_ranges = (
+                        fixed_initial_year_rent_calculation_result.remaining_ranges
+                    )
+                else:
+                    date_ranges = [(clamped_date_range_start, clamped_date_range_end)]
 
-            # We may need to calculate multiple separate ranges if the rent
-            # type is index or manual because the index number could be different
-            # in different years.
-            if self.type in [RentType.INDEX, RentType.MANUAL]:
-                date_ranges = self.split_ranges_by_cycle(date_ranges)
+                # We may need to calculate multiple separate ranges if the rent
+                # type is index or manual because the index number could be different
+                # in different years.
+                if self.type in [RentType.INDEX, RentType.MANUAL]:
+                    date_ranges = self.split_ranges_by_cycle(date_ranges)
 
-            for (range_start, range_end) in date_ranges:
-                contract_rent_calculation_result = self.contract_rent_amount_for_date_range(
-                    intended_use, range_start, range_end, dry_run=dry_run
-                )
+                for (range_start, range_end) in date_ranges:
+                    contract_rent_calculation_result = self.contract_rent_amount_for_date_range(
+                        intended_use, range_start, range_end, dry_run=dry_run
+                    )
 
-                calculation_result.combine(contract_rent_calculation_result)
+                    calculation_result.combine(contract_rent_calculation_result)
 
         return calculation_result
 
@@ -611,13 +745,10 @@ class Rent(TimeStampedSafeDeleteModel):
     ):
         applicable_adjustments = []
 
-        range_filtering = Q(
-            Q(Q(end_date=None) | Q(end_date__gte=date_range_start))
-            & Q(Q(start_date=None) | Q(start_date__lte=date_range_end))
-        )
-
-        for rent_adjustment in self.rent_adjustments.filter(range_filtering):
-            if rent_adjustment.intended_use != intended_use:
+        for rent_adjustment in filter_items_by_date_range(
+            self.rent_adjustments.all(), date_range_start, date_range_end
+        ):
+            if not _intended_use_matches(rent_adjustment, intended_use):
                 continue
 
             (
@@ -638,8 +769,10 @@ class Rent(TimeStampedSafeDeleteModel):
         if self.due_dates_type != DueDatesType.CUSTOM:
             return set()
 
+        # Sorted in Python so that prefetched due dates are used
         return [
-            dd.as_daymonth() for dd in self.due_dates.all().order_by("month", "day")
+            dd.as_daymonth()
+            for dd in sorted(self.due_dates.all(), key=lambda dd: (dd.month, dd.day))
         ]
 
     def get_due_dates_as_daymonths(self):
@@ -673,66 +806,76 @@ class Rent(TimeStampedSafeDeleteModel):
 
         return due_dates
 
-    def get_billing_period_from_due_date(self, due_date):
-        if not due_date:
-            return None
+    def get_billing_periods_by_due_date_for_year(self, year):
+        """Returns a dict of the due dates in the year and their billing periods"""
+        billing_periods_by_due_date = {}
 
         # Non-seasonal rent
         if not self.is_seasonal():
             due_dates_per_year = self.get_due_dates_for_period(
-                datetime.date(year=due_date.year, month=1, day=1),
-                datetime.date(year=due_date.year, month=12, day=31),
+                datetime.date(year=year, month=1, day=1),
+                datetime.date(year=year, month=12, day=31),
+            )
+            billing_periods = get_billing_periods_for_year(
+                year, len(due_dates_per_year)
             )
 
-            try:
-                due_date_index = due_dates_per_year.index(due_date)
+            # TODO: better error handling for the due dates without a period
+            for due_date, billing_period in zip(due_dates_per_year, billing_periods):
+                billing_periods_by_due_date.setdefault(due_date, billing_period)
 
-                return get_billing_periods_for_year(
-                    due_date.year, len(due_dates_per_year)
-                )[due_date_index]
-            except (ValueError, IndexError):
-                # TODO: better error handling
-                return None
+            return billing_periods_by_due_date
 
         # Seasonal rent
         seasonal_period_start = datetime.date(
-            year=due_date.year,
-            month=self.seasonal_start_month,
-            day=self.seasonal_start_day,
+            year=year, month=self.seasonal_start_month, day=self.seasonal_start_day,
         )
         seasonal_period_end = datetime.date(
-            year=due_date.year, month=self.seasonal_end_month, day=self.seasonal_end_day
+            year=year, month=self.seasonal_end_month, day=self.seasonal_end_day
         )
 
-        if seasonal_period_start > due_date or seasonal_period_end < due_date:
-            return None
-
         due_dates_in_period = self.get_due_dates_for_period(
             seasonal_period_start, seasonal_period_end
         )
         if not due_dates_in_period:
-            return None
-        elif len(due_dates_in_period) == 1 and due_dates_in_period[0] == due_date:
-            return seasonal_period_start, seasonal_period_end
+            return billing_periods_by_due_date
+        elif len(due_dates_in_period) == 1:
+            billing_periods_by_due_date[due_dates_in_period[0]] = (
+                seasonal_period_start,
+                seasonal_period_end,
+            )
         else:
-            try:
-                due_date_index = due_dates_in_period.index(due_date)
-            except ValueError:
-                return None
-
-            return split_date_range(
+            billing_periods = split_date_range(
                 (seasonal_period_start, seasonal_period_end), len(due_dates_in_period)
-            )[due_date_index]
+            )
+
+            for due_date, billing_period in zip(due_dates_in_period, billing_periods):
+                billing_periods_by_due_date.setdefault(due_date, billing_period)
+
+        return billing_periods_by_due_date
+
+    def get_billing_period_from_due_date(self, due_date):
+        if not due_date:
+            return None
+
+        return self.get_billing_periods_by_due_date_for_year(due_date.year).get(
+            due_date
+        )
 
     def get_all_billing_periods_for_year(self, year):
         date_range_start = datetime.date(year, 1, 1)
         date_range_end = datetime.date(year, 12, 31)
 
-        billing_periods = []
-        for due_date in self.get_due_dates_for_period(date_range_start, date_range_end):
-            billing_periods.append(self.get_billing_period_from_due_date(due_date))
+        billing_periods_by_due_date = self.get_billing_periods_by_due_date_for_year(
+            year
+        )
 
-        return billing_periods
+        return [
+            billing_periods_by_due_date.get(due_date)
+            for due_date in self.get_due_dates_for_period(
+                date_range_start, date_range_end
+            )
+        ]
 
     def is_the_last_billing_period(self, billing_period):
         billing_periods = self.get_all_billing_periods_for_year(billing_period[0].year)
@@ -1370,30 +1513,49 @@ class EqualizedRent(models.Model):
         verbose_name_plural = pgettext_lazy("Model name", "Equalized rents")
 
 
+class YearAverageIndexCache(SharedVersionCache):
+    """Process-wide lookup of the year average indexes by year
+
+    The indexes change only about once a year (see the import_index command),
+    but they are needed in every index rent calculation."""
+
+    version_key = "leasing:year_average_index"
+
+    def load(self):
+        indexes_by_year = {
+            index.year: index for index in Index.objects.filter(month__isnull=True)
+        }
+
+        return sorted(indexes_by_year), indexes_by_year
+
+    def get_latest_for_year(self, year):
+        """Returns the latest year average index before the year"""
+        (years, indexes_by_year) = self.get_data()
+
+        position = bisect_right(years, year - 1)
+        if not position:
+            return None
+
+        return indexes_by_year[years[position - 1]]
+
+
+year_average_index_cache = YearAverageIndexCache()
+
+
 class IndexManager(models.Manager):
     def get_latest_for_date(self, the_date=None):
         """Returns the latest year average index"""
         if the_date is None:
             the_date = datetime.date.today()
 
-        return (
-            self.get_queryset()
-            .filter(year__lte=the_date.year - 1, month__isnull=True)
-            .order_by("-year")
-            .first()
-        )
+        return year_average_index_cache.get_latest_for_year(the_date.year)
 
     def get_latest_for_year(self, year=None):
         """Returns the latest year average index for year"""
         if year is None:
             year = datetime.date.today().year
 
-        return (
-            self.get_queryset()
-            .filter(year__lte=year - 1, month__isnull=True)
-            .order_by("-year")
-            .first()
-        )
+        return year_average_index_cache.get_latest_for_year(year)
 
 
 class Index(models.Model):
@@ -0,0 +1,21 @@
+from django.db import models
+from django.utils.translation import pgettext_lazy
+from django.utils.translation import ugettext_lazy as _
+
+
+class SharedCacheVersion(models.Model):
+    """Version of the data cached in the processes by a SharedVersionCache
+
+    The version is changed after the cached data has been changed in the
+    database. Every process compares the version to the version of the
+    data it has loaded."""
+
+    key = models.CharField(verbose_name=_("Key"), max_length=255, unique=True)
+    version = models.CharField(verbose_name=_("Version"), max_length=32)
+
+    class Meta:
+        verbose_name = pgettext_lazy("Model name", "Shared cache version")
+        verbose_name_plural = pgettext_lazy("Model name", "Shared cache versions")
+
+    def __str__(self):
+        return self.key
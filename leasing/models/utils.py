@@ -1,14 +1,22 @@
 import datetime
+import json
 import re
+import time
+import uuid
 from collections import OrderedDict, defaultdict, namedtuple
 from datetime import date
 from decimal import Decimal
 
+from auditlog.models import LogEntry
 from dateutil.relativedelta import relativedelta
 from django.contrib.contenttypes.models import ContentType
+from django.db import transaction
 from django.db.models import Manager, Model
+from django.db.models.signals import pre_save
+from django.utils.encoding import smart_str
 
 from leasing.enums import PeriodType
+from leasing.models.shared_cache import SharedCacheVersion
 
 
 def get_range_overlap(start1, end1, start2, end2):
@@ -311,6 +319,20 @@ def _get_date_range_from_item(item, fill_min_max_values=True):
     return start_date, end_date
 
 
+def filter_items_by_date_range(items, date_range_start, date_range_end):
+    """Returns the items whose start_date and end_date overlap the date range
+
+    Equivalent to filtering a queryset with the usual
+    `(end_date=None | end_date__gte=start) & (start_date=None | start_date__lte=end)`
+    condition, but works on already loaded (e.g. prefetched) items."""
+    return [
+        item
+        for item in items
+        if (item.end_date is None or item.end_date >= date_range_start)
+        and (item.start_date is None or item.start_date <= date_range_end)
+    ]
+
+
 def group_items_in_period_by_date_range(items, min_date, max_date):
     grouped_items = {}
 
@@ -368,6 +390,140 @@ def get_monthly_amount_by_period_type(amount, period_type):
         )
 
 
+class SharedVersionCache:
+    """Base class for process-wide caches of rarely changing data
+
+    The data is loaded once per process with `load` and loaded again only
+    after the version of the data in the SharedCacheVersion table has
+    changed. The version is checked at most once in
+    `version_check_interval` seconds.
+
+    Calling `invalidate` changes the version so that every process reloads
+    the data. It must be called only after the changes have been committed,
+    because otherwise another process could load the old data with the new
+    version. `invalidate_on_commit` does that (e.g. in a model signal).
+
+    The data is not cached in a transaction that has changed it, so the
+    uncommitted data is never kept if the transaction is rolled back."""
+
+    version_key = None
+    version_check_interval = 10
+
+    def __init__(self):
+        # (version, time checked, data) replaced as a whole to keep the reads
+        # thread safe
+        self._state = None
+        # The invalidate callbacks waiting for the commit by connection
+        self._uncommitted_changes = defaultdict(list)
+
+    def load(self):
+        raise NotImplementedError
+
+    def get_version(self):
+        return (
+            SharedCacheVersion.objects.filter(key=self.version_key)
+            .values_list("version", flat=True)
+            .first()
+        )
+
+    def get_data(self):
+        if self._has_uncommitted_changes():
+            return self.load()
+
+        state = self._state
+        now = time.monotonic()
+
+        if state is not None and now - state[1] < self.version_check_interval:
+            return state[2]
+
+        # The version must be read before the data. The data is then at least
+        # as new as the version.
+        version = self.get_version()
+
+        if state is None or state[0] != version:
+            state = (version, now, self.load())
+        else:
+            state = (version, now, state[2])
+
+        self._state = state
+
+        return state[2]
+
+    def clear(self):
+        """Drops the data loaded in this process"""
+        self._state = None
+
+    def invalidate(self):
+        """Makes every process reload the data"""
+        self.clear()
+        SharedCacheVersion.objects.update_or_create(
+            key=self.version_key, defaults={"version": uuid.uuid4().hex}
+        )
+
+    def invalidate_on_commit(self):
+        """Makes every process reload the data after the current transaction
+        has been committed
+
+        Until then the data is loaded without caching it in the transaction."""
+        connection = transaction.get_connection()
+
+        def invalidate():
+            self.invalidate()
+
+        transaction.on_commit(invalidate)
+
+        if connection.in_atomic_block:
+            self._uncommitted_changes[connection].append(invalidate)
+
+    def _has_uncommitted_changes(self):
+        connection = transaction.get_connection()
+        if connection not in self._uncommitted_changes:
+            return False
+
+        # The callbacks are dropped from run_on_commit when the transaction
+        # (or the savepoint) is rolled back and when they have been run on
+        # commit
+        pending_callbacks = {callback[1] for callback in connection.run_on_commit}
+        uncommitted_changes = [
+            invalidate
+            for invalidate in self._uncommitted_changes[connection]
+            if invalidate in pending_callbacks
+        ]
+        if uncommitted_changes:
+            self._uncommitted_changes[connection] = uncommitted_changes
+            return True
+
+        # The transaction has been committed or rolled back
+        self._uncommitted_changes.pop(connection, None)
+        self.clear()
+
+        return False
+
+
+class BankHolidayCalendar(SharedVersionCache):
+    """The bank holidays bucketed by year"""
+
+    version_key = "leasing:bank_holiday"
+
+    def load(self):
+        from leasing.models import BankHoliday
+
+        holidays_by_year = defaultdict(set)
+        for day in BankHoliday.objects.values_list("day", flat=True):
+            holidays_by_year[day.year].add(day)
+
+        return {year: frozenset(days) for year, days in holidays_by_year.items()}
+
+    def is_holiday(self, the_date):
+        if isinstance(the_date, datetime.datetime):
+            the_date = the_date.date()
+
+        return the_date in self.get_data().get(the_date.year, ())
+
+
+bank_holiday_calendar = BankHolidayCalendar()
+
+
 def is_business_day(the_date):
     if not the_date or not isinstance(the_date, datetime.date):
         raise ValueError("the_date must be an instance of datetime.date")
@@ -375,14 +531,7 @@ def is_business_day(the_date):
     if the_date.weekday() > 4:
         return False
 
-    from leasing.models import BankHoliday
-
-    try:
-        BankHoliday.objects.get(day=the_date)
-
-        return False
-    except BankHoliday.DoesNotExist:
-        return True
+    return not bank_holiday_calendar.is_holiday(the_date)
 
 
 def get_next_business_day(the_date):
@@ -397,6 +546,20 @@ def get_next_business_day(the_date):
     return next_day
 
 
+def get_next_business_days(dates):
+    """Returns the next business day for every date in the same order
+
+    Resolves every distinct date only once and uses the bank holiday
+    calendar loaded once for all of the dates."""
+    next_business_days = {}
+
+    for the_date in dates:
+        if the_date not in next_business_days:
+            next_business_days[the_date] = get_next_business_day(the_date)
+
+    return [next_business_days[the_date] for the_date in dates]
+
+
 def is_date_on_first_quarter(the_date):
     if not the_date or not isinstance(the_date, datetime.date):
         raise ValueError("the_date must be an instance of datetime.date")
@@ -575,3 +738,40 @@ def is_instance_empty(instance, skip_fields=None):
             return False
 
     return True
+
+
+def bulk_create_log_entries(action, instance_changes, batch_size=1000):
+    """Writes the audit log entries of instances saved in bulk
+
+    bulk_create and bulk_update don't send the signals that the audit log
+    uses. The instance_changes are (instance, changes) tuples where the
+    changes are like the result of auditlog.diff.model_instance_diff. The
+    entries get the same values as with LogEntry.objects.log_create, but
+    are inserted with one query per batch."""
+    log_entries = []
+    for instance, changes in instance_changes:
+        log_entry = LogEntry(
+            content_type=ContentType.objects.get_for_model(instance),
+            object_pk=smart_str(instance.pk),
+            object_id=instance.pk if isinstance(instance.pk, int) else None,
+            object_repr=smart_str(instance),
+            action=action,
+            changes=json.dumps(changes),
+        )
+
+        get_additional_data = getattr(instance, "get_additional_data", None)
+        if callable(get_additional_data):
+            log_entry.additional_data = get_additional_data()
+
+        # AuditlogMiddleware sets the actor and the remote address in the
+        # pre_save signal, which bulk_create doesn't send
+        pre_save.send(
+            sender=LogEntry,
+            instance=log_entry,
+            raw=False,
+            using=instance._state.db,
+            update_fields=None,
+        )
+        log_entries.append(log_entry)
+
+    LogEntry.objects.bulk_create(log_entries, batch_size=batch_size)
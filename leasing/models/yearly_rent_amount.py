@@ -0,0 +1,311 @@
+import datetime
+import logging
+from collections import defaultdict
+from decimal import Decimal
+
+from django.db import models, transaction
+from django.db.models import Sum
+from django.utils.translation import pgettext_lazy
+from django.utils.translation import ugettext_lazy as _
+
+from leasing.enums import RentType
+
+from .rent import (
+    RENT_CALCULATION_PREFETCH_LOOKUPS,
+    Rent,
+    RentIntendedUse,
+    rent_calculation_data,
+)
+
+logger = logging.getLogger(__name__)
+
+# The yearly rent amounts are kept up to date for this many years before and
+# after the current year. Other years are calculated when they are needed.
+YEARLY_RENT_AMOUNT_PAST_YEARS = 5
+YEARLY_RENT_AMOUNT_FUTURE_YEARS = 10
+
+
+def get_yearly_rent_amount_years(today=None):
+    if today is None:
+        today = datetime.date.today()
+
+    return range(
+        today.year - YEARLY_RENT_AMOUNT_PAST_YEARS,
+        today.year + YEARLY_RENT_AMOUNT_FUTURE_YEARS + 1,
+    )
+
+
+class YearlyRentAmount(models.Model):
+    """Precalculated yearly rent amount of a rent by intended use
+
+    A rent that is active during the year but doesn't have any amounts
+    (e.g. a free rent) has one row with no intended use and zero amount.
+    A rent that has no rows for a year hasn't been calculated for the year.
+    """
+
+    lease = models.ForeignKey(
+        "leasing.Lease",
+        verbose_name=_("Lease"),
+        related_name="yearly_rent_amounts",
+        on_delete=models.CASCADE,
+    )
+
+    rent = models.ForeignKey(
+        Rent,
+        verbose_name=_("Rent"),
+        related_name="yearly_rent_amounts",
+        on_delete=models.CASCADE,
+    )
+
+    intended_use = models.ForeignKey(
+        RentIntendedUse,
+        verbose_name=_("Intended use"),
+        related_name="+",
+        null=True,
+        blank=True,
+        on_delete=models.CASCADE,
+    )
+
+    year = models.PositiveSmallIntegerField(verbose_name=_("Year"))
+
+    # The amount is not rounded so that the sums of the amounts match
+    # the sums calculated from the calculation results
+    amount = models.DecimalField(
+        verbose_name=_("Amount"), max_digits=16, decimal_places=6
+    )
+
+    modified_at = models.DateTimeField(auto_now=True, verbose_name=_("Time modified"))
+
+    recursive_get_related_skip_relations = ["lease", "rent"]
+
+    class Meta:
+        verbose_name = pgettext_lazy("Model name", "Yearly rent amount")
+        verbose_name_plural = pgettext_lazy("Model name", "Yearly rent amounts")
+        indexes = [
+            models.Index(fields=["lease", "year"]),
+            models.Index(fields=["rent", "year"]),
+        ]
+
+
+class YearlyRentAmountRefresh(models.Model):
+    """Queue of the rents whose yearly rent amounts need to be recalculated
+
+    The same rent can be in the queue multiple times. Only the entries that
+    were read before the rent was recalculated are removed, so a change made
+    during the recalculation is not lost."""
+
+    rent = models.ForeignKey(
+        Rent, verbose_name=_("Rent"), related_name="+", on_delete=models.CASCADE,
+    )
+
+    created_at = models.DateTimeField(auto_now_add=True, verbose_name=_("Time created"))
+
+    class Meta:
+        verbose_name = pgettext_lazy("Model name", "Yearly rent amount refresh")
+        verbose_name_plural = pgettext_lazy(
+            "Model name", "Yearly rent amount refreshes"
+        )
+
+
+def queue_yearly_rent_amount_refresh(rent_ids):
+    """Adds the rents to the yearly rent amount refresh queue
+
+    Soft deleted rents are queued too so that their amounts are removed."""
+    rent_ids = Rent.all_objects.filter(id__in=rent_ids).values_list("id", flat=True)
+
+    YearlyRentAmountRefresh.objects.bulk_create(
+        [YearlyRentAmountRefresh(rent_id=rent_id) for rent_id in rent_ids]
+    )
+
+
+def queue_index_rents_for_yearly_rent_amount_refresh():
+    """Adds the rents that depend on the index to the refresh queue"""
+    queue_yearly_rent_amount_refresh(
+        Rent.objects.filter(type=RentType.INDEX).values_list("id", flat=True)
+    )
+
+
+def calculate_yearly_rent_amounts(rent, years):
+    """Returns unsaved YearlyRentAmount instances of the rent for the years"""
+    yearly_rent_amounts = []
+
+    for year in years:
+        first_day_of_year = datetime.date(year=year, month=1, day=1)
+        last_day_of_year = datetime.date(year=year, month=12, day=31)
+
+        if not rent.is_active_on_period(first_day_of_year, last_day_of_year):
+            continue
+
+        try:
+            calculation_result = rent.get_amount_for_date_range(
+                first_day_of_year, last_day_of_year, dry_run=True
+            )
+        except NotImplementedError:
+            # The rent doesn't have an index defined. Leave the year
+            # uncalculated so that it will be calculated when it's needed.
+            continue
+
+        # Sum the totals of the top level amounts like
+        # CalculationResult.get_total_amount does
+        totals = defaultdict(Decimal)
+        for amount in calculation_result.amounts:
+            intended_use = amount.item.intended_use
+            totals[
+                intended_use.id if intended_use else None
+            ] += amount.get_total_amount()
+
+        if not totals:
+            totals[None] = Decimal(0)
+
+        yearly_rent_amounts.extend(
+            [
+                YearlyRentAmount(
+                    lease_id=rent.lease_id,
+                    rent=rent,
+                    intended_use_id=intended_use_id,
+                    year=year,
+                    amount=total,
+                )
+                for intended_use_id, total in totals.items()
+            ]
+        )
+
+    return yearly_rent_amounts
+
+
+def refresh_yearly_rent_amounts(rent_ids, years=None):
+    """Recalculates the yearly rent amounts of the rents"""
+    if years is None:
+        years = get_yearly_rent_amount_years()
+
+    rents = list(Rent.objects.filter(id__in=rent_ids).select_related("lease"))
+
+    yearly_rent_amounts = []
+    with rent_calculation_data(rents, RENT_CALCULATION_PREFETCH_LOOKUPS):
+        for rent in rents:
+            try:
+                yearly_rent_amounts.extend(calculate_yearly_rent_amounts(rent, years))
+            except Exception as e:
+                logger.exception(
+                    "Failed to calculate yearly rent amounts (%s): %s"
+                    % (rent.id, str(e))
+                )
+
+    with transaction.atomic():
+        # The amounts of the years that are not recalculated anymore are
+        # removed too, because they won't be kept up to date
+        YearlyRentAmount.objects.filter(rent_id__in=rent_ids).delete()
+        YearlyRentAmount.objects.bulk_create(yearly_rent_amounts)
+
+    return len(rents)
+
+
+def queue_missing_yearly_rent_amounts(years=None):
+    """Adds the rents that haven't been calculated for the last year to the
+    refresh queue. This happens when the years move forward."""
+    if years is None:
+        years = get_yearly_rent_amount_years()
+
+    last_year = years[-1]
+    first_day_of_year = datetime.date(year=last_year, month=1, day=1)
+    last_day_of_year = datetime.date(year=last_year, month=12, day=31)
+
+    rent_ids = (
+        Rent.objects.filter(
+            models.Q(start_date__isnull=True)
+            | models.Q(start_date__lte=last_day_of_year)
+        )
+        .filter(
+            models.Q(end_date__isnull=True) | models.Q(end_date__gte=first_day_of_year)
+        )
+        .exclude(yearly_rent_amounts__year=last_year)
+        .exclude(
+            id__in=YearlyRentAmountRefresh.objects.values_list("rent_id", flat=True)
+        )
+        .values_list("id", flat=True)
+    )
+
+    queue_yearly_rent_amount_refresh(list(rent_ids))
+
+
+def process_yearly_rent_amount_refresh_queue(batch_size=500):
+    """Recalculates the yearly rent amounts of the queued rents in batches
+
+    Returns the number of the recalculated rents."""
+    rent_count = 0
+
+    while True:
+        entries = list(
+            YearlyRentAmountRefresh.objects.order_by("id").values_list("id", "rent_id")[
+                :batch_size
+            ]
+        )
+        if not entries:
+            break
+
+        with transaction.atomic():
+            rent_count += refresh_yearly_rent_amounts(
+                {rent_id for (entry_id, rent_id) in entries}
+            )
+            YearlyRentAmountRefresh.objects.filter(
+                id__in=[entry_id for (entry_id, rent_id) in entries]
+            ).delete()
+
+    return rent_count
+
+
+def get_yearly_rent_amount_totals(lease_ids, years):
+    """Returns the precalculated rent totals of the leases by year
+
+    The result is {lease id: {year: total}}. A year is included only if all
+    of the rents of the lease that are active during the year have been
+    calculated for the year and none of them is waiting to be recalculated.
+    The missing years need to be calculated with
+    Lease.calculate_rent_amount_for_year."""
+    rents_by_lease = defaultdict(list)
+    for rent in Rent.objects.filter(lease_id__in=lease_ids).only(
+        "id", "lease_id", "start_date", "end_date"
+    ):
+        rents_by_lease[rent.lease_id].append(rent)
+
+    queued_rent_ids = set(
+        YearlyRentAmountRefresh.objects.filter(
+            rent__lease_id__in=lease_ids
+        ).values_list("rent_id", flat=True)
+    )
+
+    rent_year_totals = {
+        (row["rent_id"], row["year"]): row["total"]
+        for row in YearlyRentAmount.objects.filter(
+            lease_id__in=lease_ids, year__in=years
+        )
+        .values("rent_id", "year")
+        .annotate(total=Sum("amount"))
+        .order_by()
+    }
+
+    totals = defaultdict(dict)
+    for lease_id, rents in rents_by_lease.items():
+        if any(rent.id in queued_rent_ids for rent in rents):
+            continue
+
+        for year in years:
+            first_day_of_year = datetime.date(year=year, month=1, day=1)
+            last_day_of_year = datetime.date(year=year, month=12, day=31)
+
+            rent_totals = [
+                rent_year_totals.get((rent.id, year))
+                for rent in rents
+                if rent.is_active_on_period(first_day_of_year, last_day_of_year)
+            ]
+            if None in rent_totals:
+                continue
+
+            totals[lease_id][year] = sum(rent_totals, Decimal(0))
+
+    # Leases without any rents don't have any rent
+    for lease_id in set(lease_ids) - set(rents_by_lease.keys()):
+        for year in years:
+            totals[lease_id][year] = Decimal(0)
+
+    return totals
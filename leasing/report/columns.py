@@ -0,0 +1,148 @@
+import copy
+from collections import OrderedDict
+
+from django.utils.translation import ugettext_lazy as _
+from rest_framework.fields import ChoiceField, Field, SkipField, get_attribute
+
+from leasing.report.excel import FormatType
+
+
+def _format_date(value):
+    return value, FormatType.DATE
+
+
+def _format_percentage(value):
+    # The percentage format in Excel expects a fraction
+    if value:
+        value /= 100
+
+    return value, FormatType.PERCENTAGE
+
+
+def _format_money(value):
+    return value, FormatType.MONEY if value != 0 else None
+
+
+def _format_boolean(value):
+    return str(_("Yes")) if value else str(_("No")), None
+
+
+def _format_default(value):
+    return value, None
+
+
+EXCEL_VALUE_FORMATTERS = {
+    "date": _format_date,
+    "percentage": _format_percentage,
+    "money": _format_money,
+    "boolean": _format_boolean,
+}
+
+
+class ReportColumn:
+    """One output field of a report with its value getter and Excel formatter
+    resolved ahead of time"""
+
+    __slots__ = ("field_name", "get_value", "format_excel_value")
+
+    def __init__(self, field_name, output_field):
+        self.field_name = field_name
+        self.get_value = self._compile_value_getter(field_name, output_field)
+        self.format_excel_value = self._compile_excel_value_formatter(output_field)
+
+    @staticmethod
+    def _compile_value_getter(field_name, output_field):
+        """Returns a function that returns the value of the field from the
+        report data row the same way ReportOutputSerializer would
+
+        The function raises SkipField if the row doesn't have the field."""
+        serializer_field = output_field.get("serializer_field")
+        if serializer_field and isinstance(serializer_field, Field):
+            # The field must be a copy because DRF modifies the field
+            serializer_field = copy.deepcopy(serializer_field)
+            source_attrs = [field_name]
+
+            def get_serializer_field_value(row):
+                try:
+                    value = get_attribute(row, source_attrs)
+                except (KeyError, AttributeError):
+                    raise SkipField()
+
+                return (
+                    None if value is None else serializer_field.to_representation(value)
+                )
+
+            return get_serializer_field_value
+
+        source = output_field.get("source")
+        if callable(source):
+            return source
+
+        source_attrs = (source if source is not None else field_name).split(".")
+
+        def get_source_value(row):
+            try:
+                return get_attribute(row, source_attrs)
+            except (KeyError, AttributeError):
+                raise SkipField()
+
+        return get_source_value
+
+    @staticmethod
+    def _compile_excel_value_formatter(output_field):
+        """Returns a function that returns the value to write in the Excel cell
+        and the FormatType of the cell"""
+        value_formatter = EXCEL_VALUE_FORMATTERS.get(
+            output_field.get("format"), _format_default
+        )
+
+        serializer_field = output_field.get("serializer_field")
+        if not isinstance(serializer_field, ChoiceField):
+            return value_formatter
+
+        choices = serializer_field.choices
+
+        def format_choice_value(value):
+            (value, format_type) = value_formatter(value)
+
+            return str(choices.get(value)) if value else "", format_type
+
+        return format_choice_value
+
+
+class ReportColumnPlan:
+    """The output fields of a report compiled to columns
+
+    Compiled once per report class (see ReportBase.get_column_plan) and used
+    to serialize the report data rows and to format them for Excel."""
+
+    def __init__(self, output_fields):
+        self.columns = tuple(
+            ReportColumn(field_name, output_field)
+            for field_name, output_field in output_fields.items()
+        )
+        self.columns_by_field_name = {
+            column.field_name: column for column in self.columns
+        }
+
+    def serialize_row(self, row):
+        serialized_row = OrderedDict()
+        for column in self.columns:
+            try:
+                serialized_row[column.field_name] = column.get_value(row)
+            except SkipField:
+                continue
+
+        return serialized_row
+
+    def format_excel_row(self, row):
+        """Yields the values and the FormatTypes of the cells of a serialized
+        data row"""
+        columns_by_field_name = self.columns_by_field_name
+
+        for field_name, value in row.items():
+            column = columns_by_field_name.get(field_name)
+            if column is None:
+                yield value, None
+            else:
+                yield column.format_excel_value(value)
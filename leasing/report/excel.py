@@ -1,7 +1,5 @@
 from enum import Enum
 
-from xlsxwriter.utility import xl_range, xl_rowcol_to_cell
-
 
 class FormatType(Enum):
     BOLD = "bold"
@@ -47,6 +45,8 @@ class PreviousRowsSumCell(ExcelCell):
         self.count = count
 
     def get_value(self):
+        from xlsxwriter.utility import xl_rowcol_to_cell
+
         return "=SUM({}:{})".format(
             xl_rowcol_to_cell(self.row - self.count, self.column),
             xl_rowcol_to_cell(self.row - 1, self.column),
@@ -66,6 +66,8 @@ class SumCell(ExcelCell):
         self.target_ranges.append(range)
 
     def get_value(self):
+        from xlsxwriter.utility import xl_range
+
         return "=SUM({})".format(
             ",".join(
                 [
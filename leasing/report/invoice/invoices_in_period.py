@@ -101,16 +101,13 @@ class InvoicesInPeriodReport(ReportBase):
 
         return qs
 
-    def get_response(self, request):
-        report_data = self.get_data(self.get_input_data(request))
-        serialized_report_data = self.serialize_data(report_data)
-
-        if request.accepted_renderer.format != "xlsx":
-            return Response(serialized_report_data)
+    def get_excel_rows(self, serialized_report_data):
+        invoice_count = 0
+        for invoice in serialized_report_data:
+            yield invoice
+            invoice_count += 1
 
         # Add totals row to xlsx output
-        invoice_count = len(serialized_report_data)
-
         totals_row = ExcelRow()
         totals_row.cells.append(ExcelCell(column=0, value=str(_("Total"))))
         totals_row.cells.append(
@@ -122,6 +119,14 @@ class InvoicesInPeriodReport(ReportBase):
         totals_row.cells.append(
             SumCell(column=7, target_ranges=[(0, 7, invoice_count - 1, 7)])
         )
-        serialized_report_data.append(totals_row)
+        yield totals_row
 
-        return Response(serialized_report_data)
+    def get_response(self, request):
+        report_data = self.get_data(self.get_input_data(request))
+
+        if request.accepted_renderer.format != "xlsx":
+            return Response(self.serialize_data(report_data))
+
+        return self.get_excel_response(
+            self.get_excel_rows(self.iter_serialized_data(report_data))
+        )
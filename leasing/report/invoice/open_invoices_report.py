@@ -81,23 +81,15 @@ class OpenInvoicesReport(ReportBase):
             .order_by("lease__identifier__type__identifier", "due_date")
         )
 
-    def get_response(self, request):
-        report_data = self.get_data(self.get_input_data(request))
-        serialized_report_data = self.serialize_data(report_data)
-
-        if request.accepted_renderer.format != "xlsx":
-            return Response(serialized_report_data)
-
-        # Custom processing for xlsx output
+    def get_excel_rows(self, serialized_report_data):
         grouped_data = groupby(serialized_report_data, itemgetter("lease_type"))
 
-        result = []
         totals_row_nums = []
         data_row_num = 0
         for lease_type, invoices in grouped_data:
             invoice_count = 0
             for invoice in invoices:
-                result.append(invoice)
+                yield invoice
                 invoice_count += 1
                 data_row_num += 1
 
@@ -108,7 +100,7 @@ class OpenInvoicesReport(ReportBase):
             totals_row.cells.append(PreviousRowsSumCell(column=4, count=invoice_count))
             totals_row.cells.append(PreviousRowsSumCell(column=5, count=invoice_count))
             totals_row.cells.append(PreviousRowsSumCell(column=6, count=invoice_count))
-            result.append(totals_row)
+            yield totals_row
             totals_row_nums.append(data_row_num)
 
             data_row_num += 1
@@ -133,6 +125,15 @@ class OpenInvoicesReport(ReportBase):
         totals_row.cells.append(total_amount_sum_cell)
         totals_row.cells.append(billed_amount_sum_cell)
         totals_row.cells.append(outstanding_amount_sum_cell)
-        result.append(totals_row)
+        yield totals_row
 
-        return Response(result)
+    def get_response(self, request):
+        report_data = self.get_data(self.get_input_data(request))
+
+        if request.accepted_renderer.format != "xlsx":
+            return Response(self.serialize_data(report_data))
+
+        # Custom processing for xlsx output
+        return self.get_excel_response(
+            self.get_excel_rows(self.iter_serialized_data(report_data))
+        )
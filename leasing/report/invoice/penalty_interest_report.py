@@ -0,0 +1,88 @@
+import datetime
+
+from django import forms
+from django.utils.translation import ugettext_lazy as _
+
+from leasing.enums import InvoiceState
+from leasing.models import Invoice
+from leasing.models.invoice import calculate_penalty_interests
+from leasing.report.report_base import ReportBase
+
+
+class PenaltyInterestReport(ReportBase):
+    name = _("Penalty interests")
+    description = _(
+        "Show the penalty interest of the outstanding amount of the overdue open "
+        "invoices of a lease or of all of the leases"
+    )
+    slug = "penalty_interest"
+    input_fields = {
+        "lease_id": forms.IntegerField(label=_("Lease"), required=False),
+        "calculation_date": forms.DateField(
+            label=_("Calculation date"), required=False
+        ),
+    }
+    output_fields = {
+        "lease_id": {"label": _("Lease id")},
+        "number": {"label": _("Number")},
+        "due_date": {"label": _("Due date"), "format": "date"},
+        "outstanding_amount": {
+            "label": _("Outstanding amount"),
+            "format": "money",
+            "width": 13,
+        },
+        "interest_start_date": {"label": _("Interest start date"), "format": "date"},
+        "interest_end_date": {"label": _("Interest end date"), "format": "date"},
+        "total_interest_amount": {
+            "label": _("Penalty interest"),
+            "format": "money",
+            "width": 13,
+        },
+        "recipient_name": {"label": _("Recipient name"), "width": 50},
+    }
+
+    def get_data(self, input_data):
+        calculation_date = input_data["calculation_date"] or datetime.date.today()
+
+        invoices = Invoice.objects.filter(
+            state=InvoiceState.OPEN,
+            outstanding_amount__gt=0,
+            due_date__lt=calculation_date,
+        )
+        if input_data["lease_id"]:
+            invoices = invoices.filter(lease=input_data["lease_id"])
+
+        invoices = list(
+            invoices.select_related(
+                "lease",
+                "lease__identifier",
+                "lease__identifier__type",
+                "lease__identifier__district",
+                "lease__identifier__municipality",
+                "recipient",
+            ).order_by(
+                "lease__identifier__type__identifier",
+                "lease__identifier__municipality__identifier",
+                "lease__identifier__district__identifier",
+                "lease__identifier__sequence",
+                "due_date",
+            )
+        )
+
+        penalty_interests = calculate_penalty_interests(
+            invoices, calculation_date=calculation_date
+        )
+
+        return [
+            {
+                "lease_id": invoice.lease.get_identifier_string(),
+                "number": invoice.number,
+                "due_date": invoice.due_date,
+                "outstanding_amount": invoice.outstanding_amount,
+                "interest_start_date": penalty_interest_data["interest_start_date"],
+                "interest_end_date": penalty_interest_data["interest_end_date"],
+                "total_interest_amount": penalty_interest_data["total_interest_amount"],
+                "recipient_name": invoice.recipient.get_name(),
+            }
+            for (invoice, penalty_interest_data) in zip(invoices, penalty_interests)
+        ]
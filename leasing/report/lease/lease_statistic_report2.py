@@ -436,6 +436,5 @@ class LeaseStatisticReport2(AsyncReportBase):
 
     def generate_report(self, user, input_data):
         report_data = self.get_data(input_data)
-        serialized_report_data = self.serialize_data(report_data)
 
-        return self.data_as_excel(serialized_report_data)
+        return self.save_data_as_excel(self.iter_serialized_data(report_data))
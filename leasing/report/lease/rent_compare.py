@@ -6,6 +6,7 @@ from django.db.models import Q
 from django.utils.translation import ugettext_lazy as _
 
 from leasing.models import Lease
+from leasing.models.yearly_rent_amount import get_yearly_rent_amount_totals
 from leasing.report.report_base import AsyncReportBase
 
 
@@ -91,8 +92,14 @@ class RentCompareReport(AsyncReportBase):
             )
         )
 
+        yearly_rent_amount_totals = get_yearly_rent_amount_totals(
+            [lease.id for lease in leases], [first_year, second_year]
+        )
+
         results = []
         for lease in leases:
+            lease_totals = yearly_rent_amount_totals.get(lease.id, {})
+
             result = {
                 "lease_id": lease.get_identifier_string(),
                 "first_year": None,
@@ -102,6 +109,10 @@ class RentCompareReport(AsyncReportBase):
 
             for year in [first_year, second_year]:
                 year_key = "first_year" if year == first_year else "second_year"
+                if year in lease_totals:
+                    result[year_key] = lease_totals[year]
+                    continue
+
                 try:
                     rent_amount = lease.calculate_rent_amount_for_year(year)
 
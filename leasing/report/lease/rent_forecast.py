@@ -3,11 +3,13 @@ from collections import defaultdict
 from decimal import ROUND_HALF_UP, Decimal
 
 from django import forms
-from django.db.models import Q
+from django.db.models import Q, prefetch_related_objects
 from django.utils.translation import ugettext_lazy as _
 
 from leasing.enums import LeaseState
 from leasing.models import Lease
+from leasing.models.rent import get_lease_rent_prefetch_lookups
+from leasing.models.yearly_rent_amount import get_yearly_rent_amount_totals
 from leasing.report.excel import (
     ExcelCell,
     ExcelRow,
@@ -31,6 +33,62 @@ INTERNAL_LEASE_TYPES = [
     "Y9",
 ]
 
+# Number of leases whose rents are prefetched and calculated at once
+RENT_FORECAST_CHUNK_SIZE = 200
+
+
+def calculate_rent_sums_for_leases(lease_ids, years):
+    """Calculates the yearly rent sums by lease type for the leases
+
+    The precalculated yearly rent amounts are used when they are available.
+    For the rest of the leases the rents and the rows needed in the rent
+    calculation are prefetched for all of the leases at once and shared
+    between the years. Returns the sums as
+    {"internal"|"external": {year: {lease type: sum}}}."""
+    rent_sums = {
+        "internal": defaultdict(lambda: defaultdict(Decimal)),
+        "external": defaultdict(lambda: defaultdict(Decimal)),
+    }
+
+    yearly_rent_amount_totals = get_yearly_rent_amount_totals(lease_ids, years)
+
+    leases = list(Lease.objects.filter(id__in=lease_ids).select_related("type"))
+
+    prefetch_related_objects(
+        [
+            lease
+            for lease in leases
+            if len(yearly_rent_amount_totals.get(lease.id, {})) < len(years)
+        ],
+        *get_lease_rent_prefetch_lookups()
+    )
+
+    for lease in leases:
+        rent_sums_key = "external"
+        if lease.type.identifier in INTERNAL_LEASE_TYPES:
+            rent_sums_key = "internal"
+
+        lease_totals = yearly_rent_amount_totals.get(lease.id, {})
+
+        for year in years:
+            try:
+                if year in lease_totals:
+                    total_amount = lease_totals[year]
+                else:
+                    total_amount = lease.calculate_rent_amount_for_year(
+                        year
+                    ).get_total_amount()
+
+                rent_sums[rent_sums_key][year][lease.type.identifier] += total_amount
+            except NotImplementedError:
+                # Ignore the rent if the rent doesn't have an index defined
+                pass
+
+    return {
+        key: {year: dict(type_sums) for year, type_sums in year_sums.items()}
+        for key, year_sums in rent_sums.items()
+    }
+
 
 class RentForecastReport(AsyncReportBase):
     name = _("Rent forecast")
@@ -50,48 +108,46 @@ class RentForecastReport(AsyncReportBase):
         "rent": {"label": _("Rent"), "format": "money", "width": 13},
     }
 
+    async_task_timeout = 60 * 30  # 30 minutes
+
+    def calculate_rent_sums(self, lease_ids, years):
+        """Yields the rent sums of the leases chunk by chunk
+
+        Only the rents of one chunk of leases are kept in memory at a time."""
+        for i in range(0, len(lease_ids), RENT_FORECAST_CHUNK_SIZE):
+            yield calculate_rent_sums_for_leases(
+                lease_ids[i : i + RENT_FORECAST_CHUNK_SIZE], years
+            )
+
     def get_data(self, input_data):  # NOQA C901
         start_date = datetime.date(year=input_data["start_year"], month=1, day=1)
         end_date = datetime.date(year=input_data["end_year"], month=12, day=31)
 
-        leases = (
-            Lease.objects.filter(
-                (Q(start_date__isnull=True) | Q(start_date__lte=end_date))
-                & (Q(end_date__isnull=True) | Q(end_date__gte=start_date))
-            )
-            .filter(
-                state__in=[
-                    LeaseState.LEASE,
-                    LeaseState.SHORT_TERM_LEASE,
-                    LeaseState.LONG_TERM_LEASE,
-                    LeaseState.RYA,
-                ]
-            )
-            .select_related("type")
+        leases = Lease.objects.filter(
+            (Q(start_date__isnull=True) | Q(start_date__lte=end_date))
+            & (Q(end_date__isnull=True) | Q(end_date__gte=start_date))
+        ).filter(
+            state__in=[
+                LeaseState.LEASE,
+                LeaseState.SHORT_TERM_LEASE,
+                LeaseState.LONG_TERM_LEASE,
+                LeaseState.RYA,
+            ]
         )
 
-        years = range(input_data["start_year"], input_data["end_year"] + 1)
+        lease_ids = list(leases.order_by("id").values_list("id", flat=True))
+        years = list(range(input_data["start_year"], input_data["end_year"] + 1))
 
         rent_sums = {
             "internal": defaultdict(lambda: defaultdict(Decimal)),
             "external": defaultdict(lambda: defaultdict(Decimal)),
         }
 
-        for lease in leases:
-            for year in years:
-                try:
-                    rent_amount = lease.calculate_rent_amount_for_year(year)
-
-                    rent_sums_key = "external"
-                    if lease.type.identifier in INTERNAL_LEASE_TYPES:
-                        rent_sums_key = "internal"
-
-                    rent_sums[rent_sums_key][year][
-                        lease.type.identifier
-                    ] += rent_amount.get_total_amount()
-                except NotImplementedError:
-                    # Ignore the rent if the rent doesn't have an index defined
-                    pass
+        for chunk_rent_sums in self.calculate_rent_sums(lease_ids, years):
+            for rent_sums_key, year_sums in chunk_rent_sums.items():
+                for year, type_sums in year_sums.items():
+                    for lease_type, amount in type_sums.items():
+                        rent_sums[rent_sums_key][year][lease_type] += amount
 
         result = []
         data_row_num = 0
@@ -3,9 +3,11 @@ import json
 from django.core.serializers.json import DjangoJSONEncoder
 from rest_framework import renderers
 
+from leasing.report.report_base import XLSX_CONTENT_TYPE
+
 
 class XLSXRenderer(renderers.BaseRenderer):
-    media_type = "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
+    media_type = XLSX_CONTENT_TYPE
     format = "xlsx"
     charset = "utf-8"
     render_style = "binary"
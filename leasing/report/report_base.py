@@ -1,23 +1,47 @@
-from io import BytesIO
+import os
+import tempfile
+from itertools import chain, islice
 
-import xlsxwriter
 from django.conf import settings
 from django.core.mail import EmailMessage
-from django.db.models import Model
+from django.db.models import Model, QuerySet, prefetch_related_objects
 from django.forms.models import ModelChoiceIteratorValue
+from django.http import FileResponse
 from django.utils import timezone
 from django.utils.translation import ugettext
 from django.utils.translation import ugettext_lazy as _
 from django_q.conf import Conf
 from django_q.tasks import async_task
 from rest_framework.exceptions import ValidationError
-from rest_framework.fields import ChoiceField
 from rest_framework.response import Response
 
+from leasing.report.columns import ReportColumnPlan
 from leasing.report.excel import ExcelRow, FormatType
 from leasing.report.forms import ReportFormBase
 from leasing.report.serializers import ReportOutputSerializer
 
+XLSX_CONTENT_TYPE = "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
+
+
+def iterate_queryset_in_chunks(queryset, chunk_size=2000):
+    """Iterates the queryset without loading all of the objects at once
+
+    QuerySet.iterator ignores prefetch_related, so the related objects are
+    prefetched here for one chunk of objects at a time."""
+    lookups = queryset._prefetch_related_lookups
+    if not lookups:
+        yield from queryset.iterator(chunk_size=chunk_size)
+        return
+
+    iterator = queryset.prefetch_related(None).iterator(chunk_size=chunk_size)
+    while True:
+        chunk = list(islice(iterator, chunk_size))
+        if not chunk:
+            break
+
+        prefetch_related_objects(chunk, *lookups)
+        yield from chunk
+
 
 class ReportBase:
     # Name is returned in the report list and in the metadata
@@ -121,16 +145,46 @@ class ReportBase:
 
         return input_form.cleaned_data
 
+    @classmethod
+    def get_column_plan(cls):
+        """Returns the output fields compiled to a ReportColumnPlan
+
+        The output fields are the same for every instance of the report,
+        so the plan is compiled only once per report class."""
+        if "_column_plan" not in cls.__dict__:
+            cls._column_plan = ReportColumnPlan(cls.output_fields)
+
+        return cls._column_plan
+
     def serialize_data(self, report_data):
+        return list(self.iter_serialized_data(report_data))
+
+    def iter_serialized_data(self, report_data):
+        """Serializes the report data one row at a time
+
+        Same as serialize_data, but doesn't build the whole list in memory.
+        Querysets are read in chunks."""
+        if isinstance(report_data, QuerySet):
+            report_data = iterate_queryset_in_chunks(report_data)
+
         serializer_class = self.get_serializer_class()
-        serializer = serializer_class(
-            report_data, output_fields=self.output_fields, many=True
-        )
+        if serializer_class is ReportOutputSerializer:
+            # The column plan gives the same result as the default serializer
+            serialize_row = self.get_column_plan().serialize_row
+        else:
+            serialize_row = serializer_class(
+                output_fields=self.output_fields
+            ).to_representation
 
-        return serializer.data
+        for row in report_data:
+            yield serialize_row(row)
 
     def get_response(self, request):
         report_data = self.get_data(self.get_input_data(request))
+
+        if request.accepted_renderer.format == "xlsx":
+            return self.get_excel_response(self.iter_serialized_data(report_data))
+
         serialized_report_data = self.serialize_data(report_data)
 
         return Response(serialized_report_data)
@@ -156,16 +210,8 @@ class ReportBase:
 
         return value
 
-    def data_as_excel(  # NOQA C901 'ReportBase.data_as_excel' is too complex
-        self, data
-    ):
-        report = self
-
-        output = BytesIO()
-        workbook = xlsxwriter.Workbook(output)
-        worksheet = workbook.add_worksheet()
-
-        formats = {
+    def get_excel_formats(self, workbook):
+        return {
             FormatType.BOLD: workbook.add_format({"bold": True}),
             FormatType.DATE: workbook.add_format({"num_format": "dd.mm.yyyy"}),
             FormatType.MONEY: workbook.add_format({"num_format": "#,##0.00 €"}),
@@ -175,18 +221,10 @@ class ReportBase:
             FormatType.PERCENTAGE: workbook.add_format({"num_format": "0.0 %"}),
         }
 
-        row_num = 0
-
-        # On the first row print the report name
-        worksheet.write(row_num, 0, str(report.name), formats[FormatType.BOLD])
-
-        # On the second row print the report description
-        row_num += 1
-        worksheet.write(row_num, 0, str(report.description))
-
-        # On the fourth row forwards print the input fields and their values
-        row_num += 2
-        for input_field_name, input_field in report.form.fields.items():
+    def write_excel_input_fields(self, worksheet, formats, row_num):
+        """Writes the input fields and their values starting from the row
+        row_num. Returns the number of the next row."""
+        for input_field_name, input_field in self.form.fields.items():
             worksheet.write(
                 row_num, 0, "{}:".format(input_field.label), formats[FormatType.BOLD]
             )
@@ -194,7 +232,7 @@ class ReportBase:
             if input_field.__class__.__name__ == "DateField":
                 field_format = formats[FormatType.DATE]
 
-            input_value = report.form.cleaned_data[input_field_name]
+            input_value = self.form.cleaned_data[input_field_name]
             if hasattr(input_field, "choices"):
                 for choice_value, choice_label in input_field.choices:
                     if choice_value == input_value:
@@ -213,76 +251,78 @@ class ReportBase:
             worksheet.write(row_num, 1, input_value, field_format)
             row_num += 1
 
+        return row_num
+
+    def write_excel_data_row(self, worksheet, formats, row_num, row):
+        for column, (value, format_type) in enumerate(
+            self.get_column_plan().format_excel_row(row)
+        ):
+            worksheet.write(
+                row_num, column, value, formats[format_type] if format_type else None
+            )
+
+    def write_excel(self, data, output):
+        """Writes the report data as an XLSX file to the output
+
+        The data can be any iterable, e.g. a generator. The workbook is
+        written in the xlsxwriter's constant memory mode, which flushes every
+        row to a temporary file when the next row is started, so the memory
+        use doesn't depend on the number of rows."""
+        import xlsxwriter  # Not needed until a report is written
+
+        workbook = xlsxwriter.Workbook(output, {"constant_memory": True})
+        worksheet = workbook.add_worksheet()
+        formats = self.get_excel_formats(workbook)
+
+        row_num = 0
+
+        # On the first row print the report name
+        worksheet.write(row_num, 0, str(self.name), formats[FormatType.BOLD])
+
+        # On the second row print the report description
+        row_num += 1
+        worksheet.write(row_num, 0, str(self.description))
+
+        # On the fourth row forwards print the input fields and their values
+        row_num = self.write_excel_input_fields(worksheet, formats, row_num + 2)
+
         # Set column widths
-        for index, field_name in enumerate(report.output_fields.keys()):
+        for index, field_name in enumerate(self.output_fields.keys()):
             worksheet.set_column(
                 index,
                 index,
-                report.get_output_field_attr(field_name, "width", default=10),
+                self.get_output_field_attr(field_name, "width", default=10),
             )
 
-        # Labels from the first non-ExcelRow row
-        if report.automatic_excel_column_labels:
+        rows = iter(data)
+
+        # Labels from the first non-ExcelRow row. The ExcelRows before it
+        # are kept aside until the labels have been written.
+        if self.automatic_excel_column_labels:
             row_num += 1
 
-            lookup_row_num = 0
-            while (
-                lookup_row_num < len(data)
-                and lookup_row_num in data
-                and isinstance(data[lookup_row_num], ExcelRow)
-            ):
-                lookup_row_num += 1
-
-            if len(data) > lookup_row_num:
-                for index, field_name in enumerate(data[lookup_row_num].keys()):
-                    field_label = report.get_output_field_attr(
-                        field_name, "label", default=field_name
-                    )
+            leading_rows = []
+            for row in rows:
+                leading_rows.append(row)
+                if not isinstance(row, ExcelRow):
+                    for index, field_name in enumerate(row.keys()):
+                        field_label = self.get_output_field_attr(
+                            field_name, "label", default=field_name
+                        )
 
-                    worksheet.write(
-                        row_num, index, str(field_label), formats[FormatType.BOLD]
-                    )
+                        worksheet.write(
+                            row_num, index, str(field_label), formats[FormatType.BOLD]
+                        )
+                    break
+
+            rows = chain(leading_rows, rows)
 
         # The data itself
         row_num += 1
         first_data_row_num = row_num
-        for row in data:
+        for row in rows:
             if isinstance(row, dict):
-                column = 0
-                for field_name, field_value in row.items():
-                    field_format = None
-
-                    field_format_name = report.get_output_field_attr(
-                        field_name, "format"
-                    )
-
-                    if field_format_name == "date":
-                        field_format = formats[FormatType.DATE]
-                    if field_format_name == "percentage":
-                        field_format = formats[FormatType.PERCENTAGE]
-                        if field_value:
-                            field_value /= 100
-                    elif field_format_name == "money":
-                        if field_value != 0:
-                            field_format = formats[FormatType.MONEY]
-                    elif field_format_name == "boolean":
-                        if field_value:
-                            field_value = str(_("Yes"))
-                        else:
-                            field_value = str(_("No"))
-
-                    field_serializer_field = report.get_output_field_attr(
-                        field_name, "serializer_field"
-                    )
-                    if isinstance(field_serializer_field, ChoiceField):
-                        field_value = (
-                            str(field_serializer_field.choices.get(field_value))
-                            if field_value
-                            else ""
-                        )
-
-                    worksheet.write(row_num, column, field_value, field_format)
-                    column += 1
+                self.write_excel_data_row(worksheet, formats, row_num, row)
             elif isinstance(row, ExcelRow):
                 for cell in row.cells:
                     cell.set_row(row_num)
@@ -300,7 +340,28 @@ class ReportBase:
 
         workbook.close()
 
-        return output.getvalue()
+    def data_as_excel_file(self, data):
+        """Returns the report data as an XLSX file in a temporary file
+
+        The file is deleted when it's closed."""
+        excel_file = tempfile.TemporaryFile(suffix=".xlsx")
+        self.write_excel(data, excel_file)
+        excel_file.seek(0)
+
+        return excel_file
+
+    def data_as_excel(self, data):
+        with self.data_as_excel_file(data) as excel_file:
+            return excel_file.read()
+
+    def get_excel_response(self, data):
+        """Returns a response that streams the report data as an XLSX file"""
+        return FileResponse(
+            self.data_as_excel_file(data),
+            as_attachment=True,
+            filename=self.get_filename("xlsx"),
+            content_type=XLSX_CONTENT_TYPE,
+        )
 
 
 class AsyncReportBase(ReportBase):
@@ -308,10 +369,26 @@ class AsyncReportBase(ReportBase):
     def get_output_fields_metadata(cls):
         return {"message": {"label": _("Message")}}
 
+    def save_data_as_excel(self, data):
+        """Writes the report data as an XLSX file on the disk and returns the
+        path of the file
+
+        The path is returned as the result of the async task instead of the
+        file contents, so the file doesn't need to be kept in memory or stored
+        in the task result. send_report removes the file."""
+        with tempfile.NamedTemporaryFile(suffix=".xlsx", delete=False) as excel_file:
+            try:
+                self.write_excel(data, excel_file)
+            except Exception:
+                os.remove(excel_file.name)
+                raise
+
+        return excel_file.name
+
     def generate_report(self, user, input_data):
         report_data = self.get_data(input_data)
 
-        return self.data_as_excel(report_data)
+        return self.save_data_as_excel(report_data)
 
     def send_report(self, task):
         user = task.kwargs["user"]
@@ -321,11 +398,14 @@ class AsyncReportBase(ReportBase):
         if task.success:
             message.subject = _('Report "{}" successfully generated').format(self.name)
             message.body = _("Generated report attached")
-            message.attach(
-                self.get_filename("xlsx"),
-                task.result,
-                "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
-            )
+
+            try:
+                with open(task.result, "rb") as excel_file:
+                    message.attach(
+                        self.get_filename("xlsx"), excel_file.read(), XLSX_CONTENT_TYPE
+                    )
+            finally:
+                os.remove(task.result)
         else:
             message.subject = _('Failed to generate report "{}"').format(self.name)
             message.body = _("Please try again")
@@ -1,4 +1,5 @@
 from django.forms.models import ModelChoiceIteratorValue
+from django.utils.module_loading import import_string
 from django.utils.translation import ugettext_lazy as _
 from rest_framework import status
 from rest_framework.exceptions import NotFound, PermissionDenied
@@ -9,51 +10,45 @@ from rest_framework.reverse import reverse
 from rest_framework.viewsets import ViewSet
 
 from leasing.renderers import BrowsableAPIRendererWithoutForms
-from leasing.report.invoice.collaterals_report import CollateralsReport
-from leasing.report.invoice.invoice_payments import InvoicePaymentsReport
-from leasing.report.invoice.invoices_in_period import InvoicesInPeriodReport
-from leasing.report.invoice.invoicing_review import InvoicingReviewReport
-from leasing.report.invoice.laske_invoice_count_report import LaskeInvoiceCountReport
-from leasing.report.invoice.open_invoices_report import OpenInvoicesReport
-from leasing.report.invoice.rents_paid_by_contact import RentsPaidByContactReport
-from leasing.report.lease.contact_rents import ContactRentsReport
-from leasing.report.lease.decision_conditions_report import DecisionConditionsReport
-from leasing.report.lease.extra_city_rent import ExtraCityRentReport
-from leasing.report.lease.index_adjusted_rents import IndexAdjustedRentChangeReport
-from leasing.report.lease.index_types import IndexTypesReport
-from leasing.report.lease.invoicing_disabled_report import LeaseInvoicingDisabledReport
-from leasing.report.lease.lease_count_report import LeaseCountReport
-from leasing.report.lease.lease_statistic_report import LeaseStatisticReport
-from leasing.report.lease.lease_statistic_report2 import LeaseStatisticReport2
-from leasing.report.lease.rent_compare import RentCompareReport
-from leasing.report.lease.rent_forecast import RentForecastReport
-from leasing.report.lease.rent_type import RentTypeReport
-from leasing.report.lease.reservations import ReservationsReport
 from leasing.report.renderers import XLSXRenderer
 from leasing.report.report_base import AsyncReportBase
 
-ENABLED_REPORTS = [
-    CollateralsReport,
-    ContactRentsReport,
-    DecisionConditionsReport,
-    ExtraCityRentReport,
-    IndexAdjustedRentChangeReport,
-    IndexTypesReport,
-    InvoicePaymentsReport,
-    InvoicesInPeriodReport,
-    InvoicingReviewReport,
-    LaskeInvoiceCountReport,
-    LeaseCountReport,
-    LeaseInvoicingDisabledReport,
-    LeaseStatisticReport,
-    LeaseStatisticReport2,
-    OpenInvoicesReport,
-    RentCompareReport,
-    RentForecastReport,
-    RentTypeReport,
-    RentsPaidByContactReport,
-    ReservationsReport,
-]
+#: Dotted paths of the enabled report classes by their slugs.  The
+#: report modules are imported only when the report is used.
+ENABLED_REPORTS = {
+    "collaterals": "leasing.report.invoice.collaterals_report.CollateralsReport",
+    "contact_rents": "leasing.report.lease.contact_rents.ContactRentsReport",
+    "decision_conditions": "leasing.report.lease.decision_conditions_report.DecisionConditionsReport",
+    "extra_city_rent": "leasing.report.lease.extra_city_rent.ExtraCityRentReport",
+    "index_adjusted_rent_change": "leasing.report.lease.index_adjusted_rents.IndexAdjustedRentChangeReport",
+    "index_types": "leasing.report.lease.index_types.IndexTypesReport",
+    "invoice_payments": "leasing.report.invoice.invoice_payments.InvoicePaymentsReport",
+    "invoices_in_period": "leasing.report.invoice.invoices_in_period.InvoicesInPeriodReport",
+    "invoicing_review": "leasing.report.invoice.invoicing_review.InvoicingReviewReport",
+    "laske_invoice_count": "leasing.report.invoice.laske_invoice_count_report.LaskeInvoiceCountReport",
+    "lease_count": "leasing.report.lease.lease_count_report.LeaseCountReport",
+    "lease_invoicing_disabled": "leasing.report.lease.invoicing_disabled_report.LeaseInvoicingDisabledReport",
+    "lease_statistic": "leasing.report.lease.lease_statistic_report.LeaseStatisticReport",
+    "lease_statistic2": "leasing.report.lease.lease_statistic_report2.LeaseStatisticReport2",
+    "open_invoices": "leasing.report.invoice.open_invoices_report.OpenInvoicesReport",
+    "penalty_interest": "leasing.report.invoice.penalty_interest_report.PenaltyInterestReport",
+    "rent_compare": "leasing.report.lease.rent_compare.RentCompareReport",
+    "rent_forecast": "leasing.report.lease.rent_forecast.RentForecastReport",
+    "rent_type": "leasing.report.lease.rent_type.RentTypeReport",
+    "rents_paid_contact": "leasing.report.invoice.rents_paid_by_contact.RentsPaidByContactReport",
+    "reservations": "leasing.report.lease.reservations.ReservationsReport",
+}
+
+
+def get_report_class(slug):
+    """Returns the class of the enabled report with the slug
+
+    Raises KeyError if there is no such report."""
+    return import_string(ENABLED_REPORTS[slug])
+
+
+def get_enabled_report_classes():
+    return [get_report_class(slug) for slug in ENABLED_REPORTS]
 
 
 class ReportViewSet(ViewSet):
@@ -64,10 +59,6 @@ class ReportViewSet(ViewSet):
     def __init__(self, **kwargs):
         super().__init__(**kwargs)
 
-        self.report_classes_by_slug = {}
-        for report_class in ENABLED_REPORTS:
-            self.report_classes_by_slug[report_class.slug] = report_class
-
         self.report = None
 
     # The "format" parameter is not used here, but is passed by DRF if using
@@ -75,11 +66,12 @@ class ReportViewSet(ViewSet):
     def list(self, request, format=None):
         reports = {}
 
-        for report_class in ENABLED_REPORTS:
-            codename = "leasing.can_generate_report_{}".format(report_class.slug)
+        for slug in ENABLED_REPORTS:
+            codename = "leasing.can_generate_report_{}".format(slug)
             if not request.user.has_perm(codename):
                 continue
 
+            report_class = get_report_class(slug)
             reports[report_class.slug] = {
                 "name": report_class.name,
                 "description": report_class.description,
@@ -97,15 +89,15 @@ class ReportViewSet(ViewSet):
     # The "format" parameter is not used here, but is passed by DRF if using
     # the ".format" suffix.
     def retrieve(self, request, report_type=None, format=None):
-        if report_type not in self.report_classes_by_slug.keys():
+        if report_type not in ENABLED_REPORTS:
             raise NotFound(_("Report type not found"))
 
-        self.report = self.report_classes_by_slug[report_type]()
-
         codename = "leasing.can_generate_report_{}".format(report_type)
         if not request.user.has_perm(codename) and not request.user.is_superuser:
             raise PermissionDenied(_("No permission to generate report"))
 
+        self.report = get_report_class(report_type)()
+
         return self.report.get_response(request)
 
     def finalize_response(self, request, response, *args, **kwargs):
@@ -127,11 +119,8 @@ class ReportViewSet(ViewSet):
         metadata = metadata_class.determine_metadata(request, self)
         metadata["actions"] = {"GET": {}}
 
-        if (
-            "report_type" in kwargs
-            and kwargs["report_type"] in self.report_classes_by_slug
-        ):
-            report_class = self.report_classes_by_slug[kwargs["report_type"]]
+        if "report_type" in kwargs and kwargs["report_type"] in ENABLED_REPORTS:
+            report_class = get_report_class(kwargs["report_type"])
             metadata["name"] = report_class.name
             metadata["description"] = report_class.description
 
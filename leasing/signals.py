@@ -0,0 +1,69 @@
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from leasing.models import (
+    BankHoliday,
+    ContractRent,
+    FixedInitialYearRent,
+    Index,
+    InterestRate,
+    Rent,
+    RentAdjustment,
+)
+from leasing.models.debt_collection import interest_rate_timeline
+from leasing.models.rent import year_average_index_cache
+from leasing.models.utils import bank_holiday_calendar
+from leasing.models.yearly_rent_amount import (
+    queue_index_rents_for_yearly_rent_amount_refresh,
+    queue_yearly_rent_amount_refresh,
+)
+
+
+@receiver(post_save, sender=Index)
+@receiver(post_delete, sender=Index)
+def invalidate_year_average_index_cache(sender, instance, **kwargs):
+    year_average_index_cache.invalidate_on_commit()
+
+
+@receiver(post_save, sender=BankHoliday)
+@receiver(post_delete, sender=BankHoliday)
+def invalidate_bank_holiday_calendar(sender, instance, **kwargs):
+    bank_holiday_calendar.invalidate_on_commit()
+
+
+@receiver(post_save, sender=InterestRate)
+@receiver(post_delete, sender=InterestRate)
+def invalidate_interest_rate_timeline(sender, instance, **kwargs):
+    interest_rate_timeline.invalidate_on_commit()
+
+
+# The rents are queued after the transaction has been committed, because
+# a rent might be deleted later in the same transaction.
+
+
+@receiver(post_save, sender=Rent)
+def queue_rent_yearly_rent_amount_refresh(sender, instance, **kwargs):
+    rent_ids = [instance.id]
+    transaction.on_commit(lambda: queue_yearly_rent_amount_refresh(rent_ids))
+
+
+@receiver(post_save, sender=ContractRent)
+@receiver(post_delete, sender=ContractRent)
+@receiver(post_save, sender=FixedInitialYearRent)
+@receiver(post_delete, sender=FixedInitialYearRent)
+@receiver(post_save, sender=RentAdjustment)
+@receiver(post_delete, sender=RentAdjustment)
+def queue_rent_row_yearly_rent_amount_refresh(sender, instance, **kwargs):
+    rent_ids = [instance.rent_id]
+    transaction.on_commit(lambda: queue_yearly_rent_amount_refresh(rent_ids))
+
+
+@receiver(post_save, sender=Index)
+@receiver(post_delete, sender=Index)
+def queue_index_rents_yearly_rent_amount_refresh(sender, instance, **kwargs):
+    # Only the year average indexes are used in the rent calculation
+    if instance.month is not None:
+        return
+
+    transaction.on_commit(queue_index_rents_for_yearly_rent_amount_refresh)
@@ -0,0 +1,100 @@
+import io
+import zipfile
+from datetime import date
+from decimal import Decimal
+
+import pytest
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from docx import Document
+
+from leasing.enums import ContactType, InvoiceState, TenantContactType
+from leasing.models import CollectionLetterTemplate
+
+
+@pytest.fixture
+def collection_letter_template(settings, tmp_path):
+    settings.MEDIA_ROOT = str(tmp_path)
+
+    document = Document()
+    document.add_paragraph("Vuokraus {{ lease_identifier }}")
+    document.add_paragraph("Yhteensä {{ grand_total }} euroa")
+    document.add_paragraph("Erät {{ debts }}")
+    output = io.BytesIO()
+    document.save(output)
+
+    return CollectionLetterTemplate.objects.create(
+        name="Perintäkirje",
+        file=SimpleUploadedFile("collection_letter_template.docx", output.getvalue()),
+    )
+
+
+@pytest.mark.django_db
+def test_create_collection_letters(
+    django_db_setup,
+    tmp_path,
+    collection_letter_template,
+    lease_factory,
+    tenant_factory,
+    contact_factory,
+    tenant_contact_factory,
+    invoice_factory,
+):
+    leases = []
+    # The invoice of the second lease doesn't have a billing period
+    for (district_id, billing_period) in [
+        (1, (date(year=2017, month=1, day=1), date(year=2017, month=12, day=31))),
+        (5, (None, None)),
+    ]:
+        lease = lease_factory(
+            type_id=1,
+            municipality_id=1,
+            district_id=district_id,
+            notice_period_id=1,
+            start_date=date(year=2000, month=1, day=1),
+        )
+        tenant = tenant_factory(lease=lease, share_numerator=1, share_denominator=1)
+        contact = contact_factory(
+            first_name="First name", last_name="Last name", type=ContactType.PERSON
+        )
+        tenant_contact_factory(
+            type=TenantContactType.TENANT,
+            tenant=tenant,
+            contact=contact,
+            start_date=date(year=2000, month=1, day=1),
+        )
+        invoice_factory(
+            lease=lease,
+            state=InvoiceState.OPEN,
+            total_amount=Decimal(500),
+            billed_amount=Decimal(500),
+            outstanding_amount=Decimal(100),
+            due_date=date(year=2017, month=1, day=1),
+            recipient=contact,
+            billing_period_start_date=billing_period[0],
+            billing_period_end_date=billing_period[1],
+        )
+        leases.append(lease)
+
+    output_path = str(tmp_path / "collection_letters.zip")
+
+    call_command(
+        "create_collection_letters",
+        collection_letter_template.id,
+        output_path,
+        "--lease={}".format(leases[0].id),
+        "--lease={}".format(leases[1].id),
+        stdout=io.StringIO(),
+    )
+
+    with zipfile.ZipFile(output_path) as archive:
+        assert archive.namelist() == [
+            "{}_collection_letter.docx".format(lease.identifier) for lease in leases
+        ]
+
+        for (lease, filename) in zip(leases, archive.namelist()):
+            with zipfile.ZipFile(io.BytesIO(archive.read(filename))) as document:
+                document_xml = document.read("word/document.xml").decode("utf-8")
+
+            assert "Vuokraus {}".format(lease.identifier) in document_xml
+            assert "Erät 01.01.2017, 100.00 euro" in document_xml
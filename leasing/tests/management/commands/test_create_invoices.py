@@ -0,0 +1,102 @@
+from datetime import date
+from decimal import Decimal
+
+import pytest
+from auditlog.models import LogEntry
+
+from leasing.enums import (
+    ContactType,
+    DueDatesType,
+    PeriodType,
+    RentCycle,
+    RentType,
+    TenantContactType,
+)
+from leasing.management.commands.create_invoices import create_invoices_for_leases
+from leasing.models import Invoice
+
+
+@pytest.mark.django_db
+def test_create_invoices_for_leases(
+    django_db_setup,
+    lease_factory,
+    tenant_factory,
+    contact_factory,
+    tenant_contact_factory,
+    tenant_rent_share_factory,
+    rent_factory,
+    contract_rent_factory,
+):
+    lease = lease_factory(
+        type_id=1,
+        municipality_id=1,
+        district_id=1,
+        notice_period_id=1,
+        start_date=date(year=2000, month=1, day=1),
+        is_invoicing_enabled=True,
+    )
+
+    tenant = tenant_factory(lease=lease, share_numerator=1, share_denominator=1)
+    tenant_rent_share_factory(
+        tenant=tenant, intended_use_id=1, share_numerator=1, share_denominator=1
+    )
+    contact = contact_factory(
+        first_name="First name", last_name="Last name", type=ContactType.PERSON
+    )
+    tenant_contact_factory(
+        type=TenantContactType.TENANT,
+        tenant=tenant,
+        contact=contact,
+        start_date=date(year=2000, month=1, day=1),
+    )
+
+    rent = rent_factory(
+        lease=lease,
+        type=RentType.FIXED,
+        cycle=RentCycle.JANUARY_TO_DECEMBER,
+        due_dates_type=DueDatesType.FIXED,
+        due_dates_per_year=12,
+    )
+    contract_rent_factory(
+        rent=rent,
+        intended_use_id=1,
+        amount=1200,
+        period=PeriodType.PER_YEAR,
+        base_amount=1200,
+        base_amount_period=PeriodType.PER_YEAR,
+    )
+
+    start_date = date(year=2017, month=2, day=1)
+    end_date = date(year=2017, month=2, day=28)
+    invoicing_date = date(year=2017, month=1, day=1)
+
+    (output, invoice_count, last_lease_id) = create_invoices_for_leases(
+        [lease.id], start_date, end_date, invoicing_date
+    )
+
+    assert invoice_count == 1
+    assert last_lease_id == lease.id
+
+    invoice = Invoice.objects.get(lease=lease)
+    assert invoice.recipient == contact
+    assert invoice.billed_amount == Decimal(100)
+    assert invoice.outstanding_amount == Decimal(100)
+    assert invoice.invoicing_date == invoicing_date
+    assert invoice.rows.count() == 1
+    assert invoice.rows.first().tenant == tenant
+
+    # The auditlog entries are written for the created invoice and rows
+    assert LogEntry.objects.get_for_object(invoice).get().action == (
+        LogEntry.Action.CREATE
+    )
+    assert LogEntry.objects.get_for_object(invoice.rows.first()).get().action == (
+        LogEntry.Action.CREATE
+    )
+
+    # Running the same chunk again doesn't create the invoices again
+    (output, invoice_count, last_lease_id) = create_invoices_for_leases(
+        [lease.id], start_date, end_date, invoicing_date
+    )
+
+    assert invoice_count == 0
+    assert Invoice.objects.filter(lease=lease).count() == 1
@@ -3,12 +3,15 @@ import json
 from decimal import Decimal
 
 import pytest
+from auditlog.models import LogEntry
 from django.core.serializers.json import DjangoJSONEncoder
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
 
 from leasing.enums import ContactType, InvoiceState, InvoiceType
 from leasing.models import Invoice, ReceivableType
-from leasing.models.invoice import InvoiceSet
+from leasing.models.invoice import InvoiceSet, calculate_penalty_interests
 from leasing.models.tenant import TenantContactType
 
 
@@ -1672,6 +1675,53 @@ def test_calculate_penalty_amount(
     assert len(penalty_interest_data["interest_periods"]) == 4
 
 
+@pytest.mark.django_db
+def test_calculate_penalty_interests(
+    django_db_setup, lease_factory, contact_factory, invoice_factory
+):
+    calculation_date = datetime.date(year=2018, month=9, day=6)
+
+    lease = lease_factory(
+        type_id=1, municipality_id=1, district_id=5, notice_period_id=1
+    )
+
+    contact = contact_factory(
+        first_name="First name", last_name="Last name", type=ContactType.PERSON
+    )
+
+    invoices = [
+        invoice_factory(
+            lease=lease,
+            total_amount=Decimal(500),
+            billed_amount=Decimal(500),
+            outstanding_amount=outstanding_amount,
+            due_date=due_date,
+            recipient=contact,
+            billing_period_start_date=datetime.date(year=2017, month=1, day=1),
+            billing_period_end_date=datetime.date(year=2017, month=12, day=31),
+        )
+        for (due_date, outstanding_amount) in [
+            (datetime.date(year=2017, month=1, day=1), Decimal(100)),
+            (datetime.date(year=2017, month=1, day=1), Decimal("250.50")),
+            (datetime.date(year=2017, month=6, day=30), Decimal(100)),
+            (datetime.date(year=2018, month=2, day=28), Decimal("0.99")),
+        ]
+    ]
+
+    penalty_interests = calculate_penalty_interests(
+        invoices, calculation_date=calculation_date
+    )
+
+    assert len(penalty_interests) == len(invoices)
+    assert penalty_interests[0]["total_interest_amount"].compare(Decimal("11.76")) == 0
+
+    for (invoice, penalty_interest_data) in zip(invoices, penalty_interests):
+        assert penalty_interest_data == invoice.calculate_penalty_interest(
+            calculation_date=calculation_date
+        )
+        assert penalty_interest_data["interest_end_date"] == calculation_date
+
+
 @pytest.mark.django_db
 def test_is_same_recipient_and_tenants(django_db_setup, invoices_test_data):
     assert invoices_test_data["invoice1"].is_same_recipient_and_tenants(
@@ -1901,3 +1951,141 @@ def test_create_invoice_zero_row_sum_is_set_to_status_paid(
     assert invoice.total_amount == Decimal(0)
     assert invoice.outstanding_amount == Decimal(0)
     assert invoice.state == InvoiceState.PAID
+
+
+@pytest.mark.django_db
+def test_recalculate_amounts(
+    django_db_setup,
+    lease_factory,
+    contact_factory,
+    invoice_factory,
+    invoice_row_factory,
+    invoice_payment_factory,
+):
+    lease = lease_factory(
+        type_id=1, municipality_id=1, district_id=5, notice_period_id=1
+    )
+
+    contact = contact_factory(
+        first_name="First name", last_name="Last name", type=ContactType.PERSON
+    )
+
+    receivable_type = ReceivableType.objects.get(pk=1)
+    invoiceset = InvoiceSet.objects.create(lease=lease)
+
+    invoices = []
+    for (paid_amount, credited_amount, in_invoiceset) in [
+        (Decimal(0), Decimal(0), False),
+        (Decimal(50), Decimal(0), False),
+        (Decimal(200), Decimal(0), False),
+        (Decimal(0), Decimal(200), False),
+        (Decimal(150), Decimal(50), False),
+        (Decimal(20), Decimal(0), True),
+        (Decimal(0), Decimal(0), True),
+    ]:
+        invoice = invoice_factory(
+            lease=lease,
+            total_amount=Decimal(200),
+            billed_amount=Decimal(200),
+            outstanding_amount=Decimal(200),
+            recipient=contact,
+            invoiceset=invoiceset if in_invoiceset else None,
+        )
+        invoice_row_factory(
+            invoice=invoice, receivable_type=receivable_type, amount=Decimal(200)
+        )
+        if paid_amount:
+            invoice_payment_factory(
+                invoice=invoice,
+                paid_amount=paid_amount,
+                paid_date=datetime.date(year=2018, month=1, day=1),
+            )
+        if credited_amount:
+            credit_note = invoice_factory(
+                lease=lease,
+                type=InvoiceType.CREDIT_NOTE,
+                total_amount=credited_amount,
+                billed_amount=credited_amount,
+                outstanding_amount=Decimal(0),
+                recipient=contact,
+                credited_invoice=invoice,
+            )
+            invoice_row_factory(
+                invoice=credit_note,
+                receivable_type=receivable_type,
+                amount=credited_amount,
+            )
+        invoices.append(invoice)
+
+    recalculated_invoices = invoices[:-1]
+    count = Invoice.objects.recalculate_amounts(
+        [invoice.id for invoice in recalculated_invoices]
+    )
+    assert count == len(recalculated_invoices)
+
+    amount_fields = ("billed_amount", "total_amount", "outstanding_amount", "state")
+    bulk_amounts = [
+        Invoice.objects.filter(id=invoice.id).values(*amount_fields).get()
+        for invoice in invoices
+    ]
+
+    # The total amount of the other invoice in the invoiceset is updated too
+    assert bulk_amounts[-1]["total_amount"] == Decimal(400)
+
+    # The changes are written to the audit log like when saving the invoices
+    paid_invoice_log_entry = LogEntry.objects.get_for_object(invoices[2]).get(
+        action=LogEntry.Action.UPDATE
+    )
+    assert paid_invoice_log_entry.changes_dict["state"] == [
+        str(InvoiceState.OPEN),
+        str(InvoiceState.PAID),
+    ]
+
+    for invoice in recalculated_invoices:
+        invoice.update_amounts()
+
+    assert bulk_amounts == [
+        Invoice.objects.filter(id=invoice.id).values(*amount_fields).get()
+        for invoice in invoices
+    ]
+    assert [amounts["outstanding_amount"] for amounts in bulk_amounts[:6]] == [
+        Decimal(200),
+        Decimal(150),
+        Decimal(0),
+        Decimal(0),
+        Decimal(0),
+        Decimal(180),
+    ]
+    assert [amounts["state"] for amounts in bulk_amounts[:6]] == [
+        InvoiceState.OPEN,
+        InvoiceState.OPEN,
+        InvoiceState.PAID,
+        InvoiceState.REFUNDED,
+        InvoiceState.PAID,
+        InvoiceState.OPEN,
+    ]
+
+    # The number of the queries doesn't grow with the number of the changed
+    # invoices
+    update_log_entries = LogEntry.objects.get_for_model(Invoice).filter(
+        action=LogEntry.Action.UPDATE
+    )
+    query_counts = []
+    log_entry_counts = []
+    for invoice_ids in [
+        [invoices[2].id],
+        [invoice.id for invoice in recalculated_invoices],
+    ]:
+        Invoice.objects.filter(id__in=invoice_ids).update(
+            outstanding_amount=Decimal(200), state=InvoiceState.OPEN
+        )
+        log_entry_count = update_log_entries.count()
+
+        with CaptureQueriesContext(connection) as context:
+            Invoice.objects.recalculate_amounts(invoice_ids)
+
+        query_counts.append(len(context.captured_queries))
+        log_entry_counts.append(update_log_entries.count() - log_entry_count)
+
+    assert log_entry_counts == [1, 5]
+    assert query_counts[0] == query_counts[1]
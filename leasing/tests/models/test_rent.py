@@ -12,7 +12,8 @@ from leasing.enums import (
     RentCycle,
     RentType,
 )
-from leasing.models import Index, RentAdjustment, RentDueDate
+from leasing.models import Index, Rent, RentAdjustment, RentDueDate
+from leasing.models.rent import RENT_CALCULATION_PREFETCH_LOOKUPS, BillingPeriodCalendar
 from leasing.models.utils import DayMonth
 
 
@@ -377,6 +378,19 @@ def test_index_get_latest_for_year(year, expected):
         assert index.number == expected
 
 
+@pytest.mark.django_db
+def test_index_get_latest_for_year_cached(django_assert_num_queries):
+    Index.objects.get_latest_for_year(2018)
+
+    with django_assert_num_queries(0):
+        assert Index.objects.get_latest_for_year(2018).number == 1927
+        assert Index.objects.get_latest_for_date(date(year=2017, month=1, day=1))
+
+    Index.objects.create(year=2018, number=1950)
+
+    assert Index.objects.get_latest_for_year(2019).number == 1950
+
+
 @pytest.mark.django_db
 def test_get_amount_for_date_range_empty(lease_test_data, rent_factory):
     lease = lease_test_data["lease"]
@@ -1098,6 +1112,70 @@ def test_get_amount_for_date_range_contract_with_adjustment(
     assert calculation_result.get_total_amount() == expected
 
 
+@pytest.mark.django_db
+def test_get_amount_for_date_range_prefetched(
+    django_assert_num_queries,
+    lease_test_data,
+    rent_factory,
+    contract_rent_factory,
+    rent_adjustment_factory,
+):
+    lease = lease_test_data["lease"]
+
+    rent = rent_factory(
+        lease=lease,
+        type=RentType.FIXED,
+        cycle=RentCycle.JANUARY_TO_DECEMBER,
+        due_dates_type=DueDatesType.FIXED,
+        due_dates_per_year=1,
+    )
+
+    contract_rent = contract_rent_factory(
+        rent=rent,
+        intended_use_id=1,
+        amount=Decimal(100),
+        period=PeriodType.PER_YEAR,
+        base_amount=Decimal(100),
+        base_amount_period=PeriodType.PER_YEAR,
+    )
+
+    rent_adjustment_factory(
+        rent=rent,
+        intended_use=contract_rent.intended_use,
+        type=RentAdjustmentType.DISCOUNT,
+        start_date=date(year=2018, month=1, day=1),
+        end_date=date(year=2018, month=6, day=30),
+        amount_type=RentAdjustmentAmountType.PERCENT_PER_YEAR,
+        full_amount=50,
+    )
+
+    range_start = date(year=2018, month=1, day=1)
+    range_end = date(year=2018, month=12, day=31)
+
+    expected = rent.get_amount_for_date_range(range_start, range_end)
+
+    prefetch_lookups = [
+        lookup
+        for relation_name, sub_lookups in RENT_CALCULATION_PREFETCH_LOOKUPS.items()
+        for lookup in [relation_name] + sub_lookups
+    ]
+    prefetched_rent = Rent.objects.prefetch_related(*prefetch_lookups).get(pk=rent.id)
+
+    with django_assert_num_queries(0):
+        calculation_result = prefetched_rent.get_amount_for_date_range(
+            range_start, range_end
+        )
+
+    assert calculation_result.get_total_amount() == expected.get_total_amount()
+    assert [
+        (amount.item, amount.date_range_start, amount.date_range_end, amount.amount)
+        for amount in calculation_result.get_all_amounts()
+    ] == [
+        (amount.item, amount.date_range_start, amount.date_range_end, amount.amount)
+        for amount in expected.get_all_amounts()
+    ]
+
+
 @pytest.mark.django_db
 def test_get_amount_for_date_range_contract_with_adjustment_different_intended_use(
     lease_test_data, rent_factory, contract_rent_factory, rent_adjustment_factory
@@ -2815,3 +2893,34 @@ def test_is_the_last_billing_period(
     rent.save()
 
     assert rent.is_the_last_billing_period(billing_period) == expected
+
+
+@pytest.mark.django_db
+def test_billing_period_calendar(lease_test_data, rent_factory):
+    lease = lease_test_data["lease"]
+
+    rent = rent_factory(
+        lease=lease,
+        cycle=RentCycle.APRIL_TO_MARCH,
+        start_date=date(year=2000, month=1, day=1),
+        end_date=date(year=2030, month=1, day=1),
+        due_dates_type=DueDatesType.FIXED,
+        due_dates_per_year=2,
+    )
+
+    billing_period_calendar = BillingPeriodCalendar([rent])
+
+    for due_date in [date(year=2017, month=1, day=2), date(year=2017, month=7, day=1)]:
+        assert billing_period_calendar.get_billing_period_from_due_date(
+            rent, due_date
+        ) == rent.get_billing_period_from_due_date(due_date)
+
+    assert billing_period_calendar.get_all_billing_periods_for_year(
+        2017
+    ) == rent.get_all_billing_periods_for_year(2017)
+    assert billing_period_calendar.is_the_last_billing_period(
+        (date(year=2017, month=7, day=1), date(year=2017, month=12, day=31))
+    )
+    assert not billing_period_calendar.is_the_last_billing_period(
+        (date(year=2017, month=1, day=1), date(year=2017, month=6, day=30))
+    )
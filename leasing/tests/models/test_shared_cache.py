@@ -0,0 +1,106 @@
+import datetime
+from decimal import Decimal
+
+import pytest
+from django.db import transaction
+from django.test import TestCase
+
+from leasing.models import BankHoliday, Index, InterestRate, SharedCacheVersion
+from leasing.models.debt_collection import InterestRateTimeline
+from leasing.models.rent import YearAverageIndexCache, year_average_index_cache
+from leasing.models.utils import BankHolidayCalendar
+
+
+@pytest.mark.django_db
+def test_year_average_index_cache_reloads_after_commit(django_db_setup):
+    index_cache = YearAverageIndexCache()
+    index_cache.version_check_interval = 0
+    previous_index = index_cache.get_latest_for_year(3001)
+
+    with TestCase.captureOnCommitCallbacks(execute=True):
+        with transaction.atomic():
+            index = Index.objects.create(number=2000, year=3000)
+
+        # The version is changed only after the commit
+        assert not SharedCacheVersion.objects.filter(
+            key=YearAverageIndexCache.version_key
+        ).exists()
+        assert index_cache.get_latest_for_year(3001) == previous_index
+
+    assert index_cache.get_latest_for_year(3001) == index
+
+
+@pytest.mark.django_db
+def test_year_average_index_cache_drops_rolled_back_index(
+    django_db_setup, django_assert_num_queries
+):
+    previous_index = year_average_index_cache.get_latest_for_year(3001)
+
+    with transaction.atomic():
+        Index.objects.create(number=2000, year=3000)
+
+        # The transaction sees its own index, but it is not cached
+        assert year_average_index_cache.get_latest_for_year(3001).year == 3000
+
+        transaction.set_rollback(True)
+
+    assert year_average_index_cache.get_latest_for_year(3001) == previous_index
+
+    # The data is cached again after the rollback
+    with django_assert_num_queries(0):
+        assert year_average_index_cache.get_latest_for_year(3001) == previous_index
+
+
+@pytest.mark.django_db
+def test_shared_cache_checks_version_at_interval(django_db_setup):
+    index_cache = YearAverageIndexCache()
+    previous_index = index_cache.get_latest_for_year(3001)
+
+    Index.objects.create(number=2000, year=3000)
+    YearAverageIndexCache().invalidate()
+
+    # The version is not checked again before the interval has passed
+    assert index_cache.get_latest_for_year(3001) == previous_index
+
+    index_cache.version_check_interval = 0
+
+    assert index_cache.get_latest_for_year(3001).year == 3000
+
+
+@pytest.mark.django_db
+def test_bank_holiday_calendar_reloads_after_commit(django_db_setup):
+    holiday = datetime.date(year=3000, month=1, day=1)
+    calendar = BankHolidayCalendar()
+    calendar.version_check_interval = 0
+
+    assert not calendar.is_holiday(holiday)
+
+    with TestCase.captureOnCommitCallbacks(execute=True):
+        with transaction.atomic():
+            BankHoliday.objects.create(day=holiday)
+
+        assert not calendar.is_holiday(holiday)
+
+    assert calendar.is_holiday(holiday)
+
+
+@pytest.mark.django_db
+def test_interest_rate_timeline_reloads_after_commit(django_db_setup):
+    # The signal invalidates the global timeline, not this one
+    other_timeline = InterestRateTimeline()
+    other_timeline.version_check_interval = 0
+
+    assert other_timeline.get_rates_starting_in_years(3000, 3000) == []
+
+    with TestCase.captureOnCommitCallbacks(execute=True):
+        with transaction.atomic():
+            interest_rate = InterestRate.objects.create(
+                start_date=datetime.date(year=3000, month=1, day=1),
+                end_date=datetime.date(year=3000, month=6, day=30),
+                reference_rate=Decimal("0.5"),
+                penalty_rate=Decimal("7.5"),
+            )
+
+        assert other_timeline.get_rates_starting_in_years(3000, 3000) == []
+
+    assert other_timeline.get_rates_starting_in_years(3000, 3000) == [interest_rate]
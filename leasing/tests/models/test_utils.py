@@ -10,11 +10,13 @@ from leasing.enums import (
     RentCycle,
     RentType,
 )
+from leasing.models import BankHoliday
 from leasing.models.utils import (
     combine_ranges,
     fix_amount_for_overlap,
     get_billing_periods_for_year,
     get_next_business_day,
+    get_next_business_days,
     get_range_overlap_and_remainder,
     group_items_in_period_by_date_range,
     is_business_day,
@@ -590,6 +592,37 @@ def test_get_next_business_day(the_day, expected):
         assert get_next_business_day(the_day) == expected
 
 
+@pytest.mark.django_db
+def test_get_next_business_days(django_assert_max_num_queries):
+    dates = [
+        date(2019, 12, 6),
+        date(2017, 12, 25),
+        date(2021, 6, 30),
+        date(2019, 12, 6),
+    ]
+
+    with django_assert_max_num_queries(1):
+        assert get_next_business_days(dates) == [
+            date(2019, 12, 9),
+            date(2017, 12, 27),
+            date(2021, 7, 1),
+            date(2019, 12, 9),
+        ]
+
+
+@pytest.mark.django_db
+def test_is_business_day_after_bank_holiday_change():
+    assert is_business_day(date(2021, 6, 30)) is True
+
+    bank_holiday = BankHoliday.objects.create(day=date(2021, 6, 30))
+
+    assert is_business_day(date(2021, 6, 30)) is False
+
+    bank_holiday.delete()
+
+    assert is_business_day(date(2021, 6, 30)) is True
+
+
 @pytest.mark.django_db
 @pytest.mark.parametrize(
     "the_day, expected",
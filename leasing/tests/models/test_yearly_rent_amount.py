@@ -0,0 +1,52 @@
+from decimal import Decimal
+
+import pytest
+
+from leasing.enums import PeriodType, RentCycle, RentType
+from leasing.models import YearlyRentAmount, YearlyRentAmountRefresh
+from leasing.models.yearly_rent_amount import (
+    get_yearly_rent_amount_totals,
+    process_yearly_rent_amount_refresh_queue,
+    queue_yearly_rent_amount_refresh,
+    refresh_yearly_rent_amounts,
+)
+
+
+@pytest.mark.django_db
+def test_yearly_rent_amounts(
+    django_db_setup, lease_factory, rent_factory, contract_rent_factory
+):
+    lease = lease_factory(
+        type_id=1, municipality_id=1, district_id=1, notice_period_id=1
+    )
+    rent = rent_factory(
+        lease=lease, type=RentType.FIXED, cycle=RentCycle.JANUARY_TO_DECEMBER
+    )
+    contract_rent_factory(
+        rent=rent,
+        intended_use_id=1,
+        amount=1200,
+        period=PeriodType.PER_YEAR,
+        base_amount=1200,
+        base_amount_period=PeriodType.PER_YEAR,
+    )
+
+    # Not calculated yet
+    assert get_yearly_rent_amount_totals([lease.id], [2020]) == {}
+
+    refresh_yearly_rent_amounts([rent.id], years=[2020, 2021])
+
+    assert YearlyRentAmount.objects.filter(rent=rent).count() == 2
+    totals = get_yearly_rent_amount_totals([lease.id], [2020, 2021, 2022])
+    assert totals[lease.id] == {
+        2020: lease.calculate_rent_amount_for_year(2020).get_total_amount(),
+        2021: Decimal(1200),
+    }
+
+    # Queued rents are not used until they have been recalculated
+    queue_yearly_rent_amount_refresh([rent.id])
+    assert get_yearly_rent_amount_totals([lease.id], [2020]) == {}
+
+    assert process_yearly_rent_amount_refresh_queue() == 1
+    assert YearlyRentAmountRefresh.objects.count() == 0
+    assert lease.id in get_yearly_rent_amount_totals([lease.id], [2022])
@@ -1,3 +1,4 @@
+from decimal import Decimal
 from multiprocessing import Event, Value
 
 import pytest
@@ -5,13 +6,25 @@ from django.contrib.auth.models import Permission
 from django.contrib.contenttypes.models import ContentType
 from django.core import mail
 from django.urls import reverse
+from django.utils.module_loading import import_string
 from django_q.brokers import get_broker
 from django_q.cluster import monitor, pusher, worker
 from django_q.queues import Queue
 from django_q.tasks import queue_size
+from enumfields.drf import EnumField
+from openpyxl import load_workbook
 
+from leasing.enums import InvoiceState, PeriodType, RentCycle, RentType
+from leasing.report.columns import ReportColumnPlan
+from leasing.report.excel import ExcelCell, ExcelRow, FormatType
 from leasing.report.lease.lease_statistic_report import LeaseStatisticReport
-from leasing.report.viewset import ENABLED_REPORTS
+from leasing.report.lease.rent_forecast import (
+    INTERNAL_LEASE_TYPES,
+    calculate_rent_sums_for_leases,
+)
+from leasing.report.report_base import AsyncReportBase, ReportBase
+from leasing.report.serializers import ReportOutputSerializer
+from leasing.report.viewset import ENABLED_REPORTS, get_enabled_report_classes
 
 
 def _add_report_permission(user, reports):
@@ -78,8 +91,15 @@ def test_simple_async_report_send(rf, admin_user):
     assert len(mail.outbox[0].attachments) == 1
 
 
+@pytest.mark.parametrize("slug,report_class_path", ENABLED_REPORTS.items())
+def test_enabled_report_slug_matches_report_class(slug, report_class_path):
+    report_class = import_string(report_class_path)
+
+    assert report_class.slug == slug
+
+
 @pytest.mark.django_db
-@pytest.mark.parametrize("report", ENABLED_REPORTS)
+@pytest.mark.parametrize("report", get_enabled_report_classes())
 def test_report_options_respond_with_ok(admin_client, report):
     url = reverse("report-detail", kwargs={"report_type": report.slug})
 
@@ -90,7 +110,7 @@ def test_report_options_respond_with_ok(admin_client, report):
 
 
 @pytest.mark.django_db
-@pytest.mark.parametrize("report", ENABLED_REPORTS)
+@pytest.mark.parametrize("report", get_enabled_report_classes())
 def test_can_generate_report_permission(client, user, report):
     client.force_login(user)
 
@@ -117,7 +137,7 @@ def test_report_list(client, user):
     assert response.status_code == 200
     assert len(data) == 0
 
-    _add_report_permission(user, ENABLED_REPORTS[-3:])
+    _add_report_permission(user, get_enabled_report_classes()[-3:])
 
     response = client.get(url)
     data = response.json()
@@ -125,4 +145,124 @@ def test_report_list(client, user):
     assert response.status_code == 200
     assert len(data) == 3
 
-    assert {r.slug for r in ENABLED_REPORTS[-3:]} == set(data.keys())
+    assert set(list(ENABLED_REPORTS)[-3:]) == set(data.keys())
+
+
+@pytest.mark.django_db
+def test_rent_forecast_calculate_rent_sums_for_leases(
+    django_db_setup, lease_factory, rent_factory, contract_rent_factory
+):
+    lease = lease_factory(
+        type_id=1, municipality_id=1, district_id=1, notice_period_id=1
+    )
+    rent = rent_factory(
+        lease=lease, type=RentType.FIXED, cycle=RentCycle.JANUARY_TO_DECEMBER
+    )
+    contract_rent_factory(
+        rent=rent,
+        intended_use_id=1,
+        amount=1200,
+        period=PeriodType.PER_YEAR,
+        base_amount=1200,
+        base_amount_period=PeriodType.PER_YEAR,
+    )
+
+    rent_sums = calculate_rent_sums_for_leases([lease.id], [2020, 2021])
+
+    rent_sums_key = "external"
+    if lease.type.identifier in INTERNAL_LEASE_TYPES:
+        rent_sums_key = "internal"
+
+    for year in [2020, 2021]:
+        assert rent_sums[rent_sums_key][year][lease.type.identifier] == 1200
+
+
+def test_data_as_excel_from_generator():
+    class GeneratorReport(ReportBase):
+        name = "Generator report"
+        description = "Report with a generator as data"
+        slug = "generator_report"
+        output_fields = {"number": {"label": "Number"}}
+
+    report = GeneratorReport()
+    report.get_form({})
+
+    def get_rows():
+        yield ExcelRow([ExcelCell(column=0, value="Before the data")])
+        for i in range(1000):
+            yield {"number": i}
+
+    with report.data_as_excel_file(get_rows()) as excel_file:
+        worksheet = load_workbook(excel_file).active
+
+    # Labels are taken from the first data row
+    assert worksheet.cell(row=5, column=1).value == "Number"
+    assert worksheet.cell(row=6, column=1).value == "Before the data"
+    assert worksheet.cell(row=7, column=1).value == 0
+    assert worksheet.max_row == 1006
+
+
+def test_save_data_as_excel_removes_file_on_error(tmp_path, monkeypatch):
+    class FailingReport(AsyncReportBase):
+        name = "Failing report"
+        description = "Report that fails while writing the data"
+        slug = "failing_report"
+        output_fields = {"number": {"label": "Number"}}
+
+    report = FailingReport()
+    report.get_form({})
+
+    def get_rows():
+        yield {"number": 1}
+        raise ValueError("Failed")
+
+    monkeypatch.setattr("tempfile.tempdir", str(tmp_path))
+
+    with pytest.raises(ValueError):
+        report.save_data_as_excel(get_rows())
+
+    assert list(tmp_path.iterdir()) == []
+
+
+def test_report_column_plan():
+    output_fields = {
+        "lease": {"source": "lease.identifier", "label": "Lease"},
+        "amount": {"label": "Amount", "format": "money"},
+        "double": {"source": lambda row: row["amount"] * 2, "label": "Double"},
+        "share": {"label": "Share", "format": "percentage"},
+        "is_paid": {"label": "Paid", "format": "boolean"},
+        "state": {"label": "State", "serializer_field": EnumField(enum=InvoiceState)},
+    }
+    rows = [
+        {
+            "lease": {"identifier": "A1111-1"},
+            "amount": Decimal(10),
+            "share": Decimal(50),
+            "is_paid": True,
+            "state": InvoiceState.OPEN,
+        },
+        {"lease": {"identifier": "A1111-2"}, "amount": Decimal(0), "state": None},
+    ]
+
+    plan = ReportColumnPlan(output_fields)
+    serialized_rows = [plan.serialize_row(row) for row in rows]
+
+    assert (
+        serialized_rows
+        == ReportOutputSerializer(rows, output_fields=output_fields, many=True).data
+    )
+
+    assert list(plan.format_excel_row(serialized_rows[0])) == [
+        ("A1111-1", None),
+        (Decimal(10), FormatType.MONEY),
+        (Decimal(20), None),
+        (Decimal("0.5"), FormatType.PERCENTAGE),
+        ("Yes", None),
+        (str(InvoiceState.OPEN.label), None),
+    ]
+    assert list(plan.format_excel_row(serialized_rows[1])) == [
+        ("A1111-2", None),
+        (Decimal(0), None),
+        (Decimal(0), None),
+        ("", None),
+    ]
@@ -0,0 +1,66 @@
+import io
+import os
+import zipfile
+
+import pytest
+from docx import Document
+from docxtpl import DocxTemplate
+
+from leasing.docx_template import CompilingEnvironment, get_compiled_docx_template
+
+
+@pytest.fixture
+def template_path(tmp_path):
+    path = str(tmp_path / "collection_letter_template.docx")
+
+    document = Document()
+    document.add_paragraph("Vuokraus {{ lease_identifier }}")
+    document.add_paragraph("Yhteensä {{ grand_total }} euroa")
+    document.save(path)
+
+    return path
+
+
+def _get_document_xml(docx_content):
+    with zipfile.ZipFile(io.BytesIO(docx_content)) as archive:
+        return archive.read("word/document.xml")
+
+
+def test_compiled_template_renders_like_docx_template(template_path):
+    data = {"lease_identifier": "A1104-1", "grand_total": "123.45"}
+
+    doc = DocxTemplate(template_path)
+    doc.render(data)
+    output = io.BytesIO()
+    doc.save(output)
+
+    compiled_template = get_compiled_docx_template(template_path)
+
+    assert _get_document_xml(compiled_template.render(data)) == _get_document_xml(
+        output.getvalue()
+    )
+    # Rendering again must not be affected by the previous render
+    assert b"A1104-2" in _get_document_xml(
+        compiled_template.render({"lease_identifier": "A1104-2", "grand_total": "1"})
+    )
+
+
+def test_compiled_template_is_cached_until_file_is_modified(template_path):
+    compiled_template = get_compiled_docx_template(template_path)
+
+    assert get_compiled_docx_template(template_path) is compiled_template
+
+    stat = os.stat(template_path)
+    os.utime(template_path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1000000000))
+
+    assert get_compiled_docx_template(template_path) is not compiled_template
+
+
+def test_compiling_environment_compiles_source_once():
+    env = CompilingEnvironment()
+
+    template = env.from_string("{{ value }}")
+
+    assert env.from_string("{{ value }}") is template
+    assert env.from_string("{{ other_value }}") is not template
+    assert template.render(value="test") == "test"
@@ -14,9 +14,6 @@ from rest_framework.decorators import api_view, permission_classes
 from rest_framework.exceptions import APIException
 from rest_framework.permissions import IsAuthenticated
 from rest_framework.views import APIView
-from zeep import Client, Settings
-from zeep.helpers import serialize_object
-from zeep.transports import Transport
 
 from leasing.permissions import PerMethodPermission
 
@@ -197,6 +194,11 @@ class VirreProxy(APIView):
         if service not in known_services.keys():
             raise APIException(_("service parameter is not valid"))
 
+        # zeep is slow to import, so it's imported only when it's needed
+        from zeep import Client, Settings
+        from zeep.helpers import serialize_object
+        from zeep.transports import Transport
+
         session = Session()
         session.auth = HTTPBasicAuth(settings.VIRRE_USERNAME, settings.VIRRE_PASSWORD)
         soap_settings = Settings(strict=False)
@@ -1,8 +1,13 @@
 from django_filters.rest_framework import DjangoFilterBackend
-from rest_framework import viewsets
+from rest_framework import status, viewsets
+from rest_framework.decorators import action
 from rest_framework.filters import OrderingFilter
+from rest_framework.response import Response
 
 from batchrun import models
+from batchrun.enums import LogEntryKind
+from batchrun.log_tailing import tail_log
+from leasing.forms import JobRunLogTailForm
 from leasing.serializers.batchrun import (
     JobRunLogEntrySerializer,
     JobRunSerializer,
@@ -26,6 +31,38 @@ class JobRunViewSet(viewsets.ReadOnlyModelViewSet):
     filterset_fields = ["exit_code"]
     ordering = ("-started_at",)
 
+    @action(methods=["get"], detail=True)
+    def log_tail(self, request, pk=None):
+        """Returns the log entries of the given kind after the line and number
+        given in since_line and since_number. Waits at most timeout seconds for
+        new entries if there are none yet.
+
+        The returned since_line and since_number should be passed to the next
+        request. "finished" is true when the run has stopped and all of the
+        entries have been returned."""
+        job_run = self.get_object()
+
+        tail_form = JobRunLogTailForm(request.query_params)
+        if not tail_form.is_valid():
+            return Response(tail_form.errors, status=status.HTTP_400_BAD_REQUEST)
+
+        log_tail = tail_log(
+            job_run,
+            LogEntryKind[tail_form.cleaned_data["kind"].upper()],
+            since_line=tail_form.cleaned_data["since_line"] or 0,
+            since_number=tail_form.cleaned_data["since_number"] or 0,
+            timeout=tail_form.cleaned_data["timeout"] or 0,
+        )
+
+        return Response(
+            {
+                "entries": JobRunLogEntrySerializer(log_tail.entries, many=True).data,
+                "since_line": log_tail.line_number,
+                "since_number": log_tail.number,
+                "finished": log_tail.finished,
+            }
+        )
+
 
 class JobViewSet(viewsets.ReadOnlyModelViewSet):
     queryset = models.Job.objects.all()
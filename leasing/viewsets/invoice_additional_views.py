@@ -3,13 +3,15 @@ from decimal import Decimal, InvalidOperation
 
 from dateutil import parser
 from django.utils.translation import ugettext_lazy as _
-from paramiko import SSHException
-from pysftp import ConnectionException, CredentialException, HostKeysException
 from rest_framework.exceptions import APIException, ValidationError
 from rest_framework.response import Response
 from rest_framework.views import APIView
 
-from laske_export.exporter import LaskeExporter, LaskeExporterException
+from laske_export.exporter import (
+    LaskeExporter,
+    LaskeExporterException,
+    get_sftp_exception_classes,
+)
 from leasing.models import Invoice, ReceivableType
 from leasing.models.invoice import InvoiceRow, InvoiceSet
 from leasing.permissions import PerMethodPermission
@@ -236,13 +238,7 @@ class InvoiceExportToLaskeView(APIView):
         try:
             exporter = LaskeExporter()
             exporter.export_invoices(invoice)
-        except (
-            LaskeExporterException,
-            ConnectionException,
-            CredentialException,
-            SSHException,
-            HostKeysException,
-        ) as e:
+        except (LaskeExporterException, *get_sftp_exception_classes()) as e:
             raise APIException(str(e))
 
         return Response({"success": True})
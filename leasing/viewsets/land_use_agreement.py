@@ -3,8 +3,6 @@ from decimal import Decimal, InvalidOperation
 from django.utils.translation import ugettext_lazy as _
 from django_filters.rest_framework import DjangoFilterBackend
 from django_filters.widgets import BooleanWidget
-from paramiko import SSHException
-from pysftp import ConnectionException, CredentialException, HostKeysException
 from rest_framework.exceptions import APIException, ValidationError
 from rest_framework.filters import OrderingFilter, SearchFilter
 from rest_framework.response import Response
@@ -13,7 +11,11 @@ from rest_framework.viewsets import ReadOnlyModelViewSet
 from rest_framework_gis.filters import InBBoxFilter
 
 from field_permissions.viewsets import FieldPermissionsViewsetMixin
-from laske_export.exporter import LaskeExporter, LaskeExporterException
+from laske_export.exporter import (
+    LaskeExporter,
+    LaskeExporterException,
+    get_sftp_exception_classes,
+)
 from leasing.enums import InvoiceState, InvoiceType
 from leasing.filters import (
     CoalesceOrderingFilter,
@@ -434,13 +436,7 @@ class LandUseAgreementInvoiceExportToLaskeView(APIView):
         try:
             exporter = LaskeExporter()
             exporter.export_invoices(invoice)
-        except (
-            LaskeExporterException,
-            ConnectionException,
-            CredentialException,
-            SSHException,
-            HostKeysException,
-        ) as e:
+        except (LaskeExporterException, *get_sftp_exception_classes()) as e:
             raise APIException(str(e))
 
         return Response({"success": True})
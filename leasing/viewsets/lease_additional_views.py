@@ -1,7 +1,4 @@
 import datetime
-import os
-from decimal import Decimal
-from itertools import groupby
 
 from dateutil import parser
 from dateutil.relativedelta import relativedelta
@@ -13,6 +10,11 @@ from rest_framework.exceptions import APIException, ValidationError
 from rest_framework.response import Response
 from rest_framework.views import APIView
 
+from leasing.collection_letter import (
+    CollectionLetterError,
+    get_collection_letter_filename,
+    get_collection_letter_template_data,
+)
 from leasing.models import Lease, PlanUnit, Plot
 from leasing.models.utils import get_billing_periods_for_year
 from leasing.permissions import PerMethodPermission
@@ -44,53 +46,6 @@ class LeaseCreateChargeViewSet(AtomicTransactionMixin, viewsets.GenericViewSet):
         return Response(serializer.data, status=status.HTTP_201_CREATED)
 
 
-def interest_rates_to_strings(interest_rates):
-    result = []
-    sorted_interest_rates = sorted(interest_rates, key=lambda x: x[0])
-
-    if len(sorted_interest_rates) == 1:
-        return [
-            _("the penalty interest rate is {interest_percent} %").format(
-                interest_percent=sorted_interest_rates[0][2]
-            )
-        ]
-
-    # Squash adjacent equal penalty interest rates
-    squashed_interest_rates = []
-    for k, g in groupby(sorted_interest_rates, key=lambda x: x[2]):
-        rate_group = list(g)
-        if len(rate_group) == 1:
-            squashed_interest_rates.append(rate_group[0])
-        else:
-            squashed_interest_rates.append(
-                (rate_group[0][0], rate_group[-1][1], rate_group[0][2])
-            )
-
-    for i, interest_rate in enumerate(squashed_interest_rates):
-        if i == len(squashed_interest_rates) - 1:
-            # TODO: Might not be strictly accurate
-            result.append(
-                _(
-                    "The penalty interest rate starting on {start_date} is {interest_percent} %"
-                ).format(
-                    start_date=interest_rate[0].strftime("%d.%m.%Y"),
-                    interest_percent=interest_rate[2],
-                )
-            )
-        else:
-            result.append(
-                _(
-                    "The penalty interest rate between {start_date} and {end_date} is {interest_percent} %"
-                ).format(
-                    start_date=interest_rate[0].strftime("%d.%m.%Y"),
-                    end_date=interest_rate[1].strftime("%d.%m.%Y"),
-                    interest_percent=interest_rate[2],
-                )
-            )
-
-    return result
-
-
 class LeaseCreateCollectionLetterDocumentViewSet(
     AtomicTransactionMixin, viewsets.GenericViewSet
 ):
@@ -102,112 +57,22 @@ class LeaseCreateCollectionLetterDocumentViewSet(
         return _("Create collection letter document")
 
     def create(self, request, *args, **kwargs):
-        today = datetime.date.today()
-
         serializer = CreateCollectionLetterDocumentSerializer(data=request.data)
         serializer.is_valid(raise_exception=True)
 
-        invoices = serializer.validated_data["invoices"]
-        debt = Decimal(0)
-        debt_strings = []
-        interest_strings = []
-        interest_total = Decimal(0)
-        interest_rates = set()
-        billing_addresses = []
-
-        for tenant in serializer.validated_data["tenants"]:
-            billing_tenantcontact = tenant.get_billing_tenantcontacts(
-                today, today
-            ).first()
-
-            if not billing_tenantcontact or not billing_tenantcontact.contact:
-                raise APIException(
-                    _("No billing info or billing info does not have a contact address")
-                )
-
-            billing_addresses.append(
-                "<w:br/>".join(
-                    [
-                        str(billing_tenantcontact.contact),
-                        billing_tenantcontact.contact.address
-                        if billing_tenantcontact.contact.address
-                        else "",
-                        "{} {}".format(
-                            billing_tenantcontact.contact.postal_code
-                            if billing_tenantcontact.contact.postal_code
-                            else "",
-                            billing_tenantcontact.contact.city
-                            if billing_tenantcontact.contact.city
-                            else "",
-                        ),
-                    ]
-                )
-            )
+        lease = serializer.validated_data["lease"]
+        template = serializer.validated_data["template"]
 
-        collection_charge_total = Decimal(0)
-
-        for invoice_datum in invoices:
-            invoice = invoice_datum["invoice"]
-            penalty_interest_data = invoice.calculate_penalty_interest()
-
-            if penalty_interest_data["total_interest_amount"]:
-                interest_strings.append(
-                    _(
-                        "Penalty interest for the invoice with the due date of {due_date} is {interest_amount} euroa"
-                    ).format(
-                        due_date=invoice.due_date.strftime("%d.%m.%Y"),
-                        interest_amount=penalty_interest_data["total_interest_amount"],
-                    )
-                )
-                interest_total += penalty_interest_data["total_interest_amount"]
-
-            invoice_debt_amount = invoice.outstanding_amount
-            debt += invoice_debt_amount
-
-            debt_strings.append(
-                _(
-                    "{due_date}, {debt_amount} euro (between {start_date} and {end_date})"
-                ).format(
-                    due_date=invoice.due_date.strftime("%d.%m.%Y"),
-                    debt_amount=invoice_debt_amount,
-                    start_date=invoice.billing_period_start_date.strftime("%d.%m.%Y"),
-                    end_date=invoice.billing_period_end_date.strftime("%d.%m.%Y"),
-                )
+        try:
+            template_data = get_collection_letter_template_data(
+                lease,
+                serializer.validated_data["tenants"],
+                serializer.validated_data["invoices"],
             )
+        except CollectionLetterError as err:
+            raise APIException(str(err))
 
-            for interest_period in penalty_interest_data["interest_periods"]:
-                interest_rate_tuple = (
-                    interest_period["start_date"],
-                    interest_period["end_date"],
-                    interest_period["penalty_rate"],
-                )
-
-                interest_rates.add(interest_rate_tuple)
-
-            collection_charge_total += Decimal(invoice_datum["collection_charge"])
-
-        grand_total = debt + interest_total + collection_charge_total
-
-        lease = serializer.validated_data["lease"]
-
-        template_data = {
-            "lease_details": "<w:br/>".join(
-                lease.get_lease_info_text(tenants=serializer.validated_data["tenants"])
-            ),
-            "billing_address": "<w:br/><w:br/>".join(billing_addresses),
-            "lease_identifier": str(lease.identifier),
-            "current_date": today.strftime("%d.%m.%Y"),
-            "debts": "<w:br/>".join(debt_strings),
-            "total_debt": debt,
-            "interest_rates": "<w:br/>".join(interest_rates_to_strings(interest_rates)),
-            "interests": "<w:br/>".join(interest_strings),
-            "interest_total": interest_total,
-            "grand_total": grand_total,
-            "collection_charge_total": collection_charge_total,
-            "invoice_count": len(invoices),
-        }
-
-        doc = serializer.validated_data["template"].render_document(template_data)
+        doc = template.render_document(template_data)
 
         if not doc:
             raise ValidationError(_("Error creating the document from the template"))
@@ -217,11 +82,8 @@ class LeaseCreateCollectionLetterDocumentViewSet(
             content_type="application/vnd.openxmlformats-officedocument.wordprocessingml.document",
         )
 
-        response["Content-Disposition"] = "attachment; filename={}_{}".format(
-            str(lease.identifier),
-            os.path.basename(
-                serializer.validated_data["template"].file.name.replace("_template", "")
-            ),
+        response["Content-Disposition"] = "attachment; filename={}".format(
+            get_collection_letter_filename(lease, template)
         )
 
         return response
@@ -77,6 +77,8 @@ env = environ.Env(
     ASIAKASTIETO_USER_ID=(str, ""),
     ASIAKASTIETO_PASSWORD=(str, ""),
     ASIAKASTIETO_KEY=(str, ""),
+    BATCHRUN_MAX_CONCURRENT_RUNS=(int, 0),
+    BATCHRUN_FORK_SERVER=(bool, False),
 )
 
 env_file = project_root(".env")
@@ -261,6 +263,13 @@ Q_CLUSTER = {
     "orm": "default",
 }
 
+# Maximum number of batchrun jobs running at the same time. 0 means no limit.
+BATCHRUN_MAX_CONCURRENT_RUNS = env.int("BATCHRUN_MAX_CONCURRENT_RUNS")
+
+# Launch the batchrun jobs from a fork server which has Django already
+# set up, instead of starting new Python processes for them.
+BATCHRUN_FORK_SERVER = env.bool("BATCHRUN_FORK_SERVER")
+
 KTJ_PRINT_ROOT_URL = env.str("KTJ_PRINT_ROOT_URL")
 KTJ_PRINT_USERNAME = env.str("KTJ_PRINT_USERNAME")
 KTJ_PRINT_PASSWORD = env.str("KTJ_PRINT_PASSWORD")
@@ -297,6 +306,10 @@ LASKE_VALUES = {
 
 LASKE_EXPORT_ROOT = project_root("laske_export_files")
 
+# Maximum size of a Laske export file in bytes. The sales orders that don't
+# fit in the file are written to the next file. None means no limit.
+LASKE_EXPORT_MAX_FILE_SIZE = None
+
 LASKE_DUE_DATE_OFFSET_DAYS = 17
 
 LASKE_SERVERS = {
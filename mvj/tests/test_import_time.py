@@ -0,0 +1,61 @@
+import os
+import subprocess
+import sys
+
+import pytest
+from django.conf import settings
+
+#: Maximum total time in seconds that importing the modules may take on
+#: start up, i.e. when running ``manage.py check``.  Can be adjusted for
+#: slow machines with the MVJ_IMPORT_TIME_BUDGET environment variable.
+IMPORT_TIME_BUDGET = float(os.environ.get("MVJ_IMPORT_TIME_BUDGET", "10"))
+
+#: Modules which are slow to import and needed only by a few views or
+#: jobs, so they must be imported only when they are used
+LAZILY_IMPORTED_MODULES = [
+    "docxtpl",
+    "leasing.report.invoice.invoicing_review",
+    "leasing.report.lease.rent_forecast",
+    "paramiko",
+    "pysftp",
+    "xlsxwriter",
+    "zeep",
+]
+
+
+@pytest.fixture(scope="module")
+def import_times():
+    """Import times of the modules imported by ``manage.py check``
+
+    The times are parsed from the output of ``python -X importtime`` and
+    are returned as a dict of the module names and their own (i.e. not
+    cumulative) import times in seconds."""
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", settings.BASE_DIR("manage.py"), "check"],
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.PIPE,
+        universal_newlines=True,
+        check=True,
+    )
+
+    times = {}
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:"):
+            continue
+        (self_us, _cumulative_us, module_name) = line[12:].split("|")
+        if self_us.strip().isdigit():
+            times[module_name.strip()] = int(self_us) / 1000000
+
+    return times
+
+
+def test_import_time_is_within_budget(import_times):
+    total = sum(import_times.values())
+    slowest = sorted(import_times.items(), key=lambda x: x[1], reverse=True)[:10]
+
+    assert total <= IMPORT_TIME_BUDGET, "Slowest imports: {}".format(slowest)
+
+
+@pytest.mark.parametrize("module_name", LAZILY_IMPORTED_MODULES)
+def test_module_is_not_imported_on_start_up(import_times, module_name):
+    assert module_name not in import_times